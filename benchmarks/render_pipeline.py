@@ -0,0 +1,508 @@
+"""
+Micro-benchmarks of the render pipeline.
+
+Measures the stages of the rendering separately: the escaping of the template text,
+the compilation of the DoT.js templates, the execution of a template in the worker
+function, the round trip to the JS worker process and the whole render_reports call.
+
+The transport benchmarks measure the round trip of one template with details of
+growing sizes passed as Python objects, as JSON through the task pipe and as JSON
+through shared memory, and report the smallest size at which each JSON transport is
+faster than passing the Python objects.
+
+The parse benchmarks measure the validation of the request by the models and by
+the lightweight validation of the /rendered_reports/light endpoint, and the memory
+kept by the parsed request of each.
+
+The serialization benchmarks measure the JSON of responses with the numbers of rendered
+reports given by --response-sizes built as the response model and serialized by
+the response_model path of FastAPI, and built as plain dictionaries and encoded
+directly as /rendered_reports does.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.render_pipeline --output results.json
+    python -m benchmarks.render_pipeline --baseline results.json --threshold 0.2
+
+The results are written as JSON. With a baseline, the median of each benchmark is
+compared with the baseline one and the exit code is 1 if any of them is slower by more
+than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from benchmarks.synthetic import (
+    JS_TEMPLATES,
+    generate_details,
+    generate_request,
+    generate_response,
+)
+from insights_content_template_renderer import utils
+from insights_content_template_renderer.endpoints import json_response
+from insights_content_template_renderer.js_executor import (
+    JsExecutor,
+    _eval_js_worker_task,
+    get_code_digest,
+)
+from insights_content_template_renderer.light_models import parse_light_request
+from insights_content_template_renderer.models import RendererRequest, RendererResponse
+
+try:
+    import pythonmonkey  # noqa: F401
+
+    HAS_PYTHONMONKEY = True
+except Exception:  # not installed or failing to initialize SpiderMonkey
+    HAS_PYTHONMONKEY = False
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    Measures the duration of a function call.
+
+    The number of calls of each round is chosen so the round takes at least min_time.
+
+    :param func: function without arguments
+    :param repeat: number of rounds
+    :param min_time: minimal duration of a round in seconds
+    :return: dictionary with the statistics of the duration of one call in seconds
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    durations = [elapsed / number] + [
+        duration / number for duration in timer.repeat(repeat - 1, number)
+    ]
+    return {
+        "median": statistics.median(durations),
+        "mean": statistics.mean(durations),
+        "stdev": statistics.stdev(durations) if len(durations) > 1 else 0.0,
+        "min": min(durations),
+        "rounds": len(durations),
+        "calls_per_round": number,
+    }
+
+
+def measure_memory(func):
+    """
+    Measures the memory kept by the result of a function call.
+
+    :param func: function without arguments
+    :return: number of bytes allocated by the call and not freed while the result
+             is kept
+    """
+    # The result is kept until the memory is measured and released even if
+    # the call fails
+    result = None
+    tracemalloc.start()
+    try:
+        result = func()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        del result
+    return size
+
+
+def get_templates(request):
+    """
+    Returns the texts of all templates of the request content.
+    """
+    templates = []
+    for rule in request["content"]:
+        for error_key in rule["error_keys"].values():
+            templates.append(error_key["metadata"]["description"])
+            templates.append(error_key["reason"])
+            templates.append(error_key["resolution"])
+    return templates
+
+
+def get_js_jobs(request):
+    """
+    Returns the (js_code, details) pairs of the reason templates of the reports.
+    """
+    content = {rule["plugin"]["python_module"]: rule for rule in request["content"]}
+    jobs = []
+    for cluster in request["report_data"]["reports"].values():
+        for report in cluster["reports"]:
+            module = report["component"].rsplit(".", 1)[0]
+            reason = content[module]["error_keys"][report["key"]]["reason"]
+            jobs.append((utils.compile_template(reason), report["details"]))
+    return jobs
+
+
+def is_native(templates):
+    """
+    Returns True if all templates are rendered without the JS worker.
+    """
+    return utils.TEMPLATE_ENGINE == "native" and all(
+        utils.native_template_cache.get(utils.compile_template(template)) is not None
+        for template in templates
+    )
+
+
+def run_benchmarks(request, repeat, min_time):
+    """
+    Runs the benchmarks of the render pipeline on the request.
+
+    :param request: renderer request, see benchmarks.synthetic.generate_request
+    :param repeat: number of rounds of each benchmark
+    :param min_time: minimal duration of a round in seconds
+    :return: dictionary with the results by the benchmark names, the benchmarks
+             which cannot run have the reason instead of the results
+    """
+    templates = get_templates(request)
+    prepared = [utils.prepare_template_text(template) for template in templates]
+    results = {}
+
+    def escape():
+        for template in templates:
+            utils.escape_new_line_inside_brackets(
+                utils.escape_raw_text_for_js(template)
+            )
+
+    def compile_dot():
+        for text in prepared:
+            utils.renderer.template(text, utils.DoT_settings)
+
+    results["escape"] = measure(escape, repeat, min_time)
+    results["dot_template"] = measure(compile_dot, repeat, min_time)
+    results["parse_model"] = measure(
+        lambda: RendererRequest.parse_obj(request), repeat, min_time
+    )
+    results["parse_light"] = measure(
+        lambda: parse_light_request(request), repeat, min_time
+    )
+
+    request_model = RendererRequest.parse_obj(request)
+
+    def render():
+        utils.render_reports(request_model)
+
+    if not HAS_PYTHONMONKEY:
+        reason = "pythonmonkey is not available"
+        results["worker_task"] = {"skipped": reason}
+        results["executor_round_trip"] = {"skipped": reason}
+        if is_native(templates):
+            results["render_reports"] = measure(render, repeat, min_time)
+        else:
+            results["render_reports"] = {"skipped": reason}
+        return results
+
+    jobs = get_js_jobs(request)
+    js_code, data = jobs[0]
+    digest = get_code_digest(js_code)
+
+    def worker_task():
+        _eval_js_worker_task(js_code, data, digest)
+
+    results["worker_task"] = measure(worker_task, repeat, min_time)
+
+    executor = JsExecutor(pool_size=1)
+    # The default executor is used by render_reports
+    default_executor = utils.get_js_executor()
+    try:
+        executor.warm_up([js_code])
+        default_executor.warm_up([js_code for js_code, _ in jobs])
+
+        def round_trip():
+            executor.execute(js_code, data)
+
+        results["executor_round_trip"] = measure(round_trip, repeat, min_time)
+        results["render_reports"] = measure(render, repeat, min_time)
+    finally:
+        executor.shutdown()
+        default_executor.shutdown()
+    return results
+
+
+# Transports of the template data by their names in the results,
+# as (data_transport, shared_memory_threshold) pairs
+TRANSPORTS = {
+    "python": ("python", 0),
+    "json": ("json", 0),
+    "json_shm": ("json", 1),
+}
+
+
+def run_transport_benchmarks(sizes, repeat, min_time):
+    """
+    Runs the round trip of a template with details of the given sizes
+    with each data transport.
+
+    :param sizes: numbers of nodes in the details
+    :param repeat: number of rounds of each benchmark
+    :param min_time: minimal duration of a round in seconds
+    :return: dictionary with the results by the benchmark names
+             transport_<transport>_<size>
+    """
+    names = [f"transport_{name}_{size}" for name in TRANSPORTS for size in sizes]
+    if not HAS_PYTHONMONKEY:
+        return dict.fromkeys(names, {"skipped": "pythonmonkey is not available"})
+
+    js_code = utils.compile_template(JS_TEMPLATES["reason"])
+    rng = random.Random(0)
+    details = {size: generate_details(rng, "RULE_0", size) for size in sizes}
+    results = {}
+    for name, (data_transport, threshold) in TRANSPORTS.items():
+        executor = JsExecutor(
+            pool_size=1,
+            data_transport=data_transport,
+            shared_memory_threshold=threshold,
+        )
+        try:
+            executor.warm_up([js_code])
+            for size in sizes:
+                data = details[size]
+
+                def round_trip(data=data, executor=executor):
+                    executor.execute(js_code, data)
+
+                results[f"transport_{name}_{size}"] = measure(
+                    round_trip, repeat, min_time
+                )
+        finally:
+            executor.shutdown()
+    return results
+
+
+def run_serialization_benchmarks(sizes, repeat, min_time):
+    """
+    Runs the serialization of responses of the given sizes by the response_model
+    path of FastAPI and by json_response.
+
+    :param sizes: numbers of rendered reports in the responses
+    :param repeat: number of rounds of each benchmark
+    :param min_time: minimal duration of a round in seconds
+    :return: dictionary with the results by the benchmark names
+    """
+    field = create_model_field(
+        name="Response_rendered_reports", type_=RendererResponse, mode="serialization"
+    )
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for size in sizes:
+            content = generate_response(size)
+
+            def serialize_model(content=content):
+                return loop.run_until_complete(
+                    serialize_response(
+                        field=field,
+                        response_content=RendererResponse.parse_obj(content),
+                        exclude_none=True,
+                        dump_json=True,
+                    )
+                )
+
+            def serialize_direct(content=content):
+                return json_response(content).body
+
+            results[f"serialize_model_{size}"] = measure(
+                serialize_model, repeat, min_time
+            )
+            results[f"serialize_direct_{size}"] = measure(
+                serialize_direct, repeat, min_time
+            )
+    finally:
+        loop.close()
+    return results
+
+
+def find_crossovers(results, sizes):
+    """
+    Finds the smallest details size from which each JSON transport is faster
+    than passing the Python objects.
+
+    :param results: dictionary with the results of run_transport_benchmarks
+    :param sizes: numbers of nodes in the details in ascending order
+    :return: dictionary with the size or None by the transport names
+    """
+    crossovers = {}
+    for name in TRANSPORTS:
+        if name == "python":
+            continue
+        crossovers[name] = None
+        for size in reversed(sizes):
+            result = results.get(f"transport_{name}_{size}", {})
+            baseline = results.get(f"transport_python_{size}", {})
+            if "median" not in result or "median" not in baseline:
+                break
+            if result["median"] >= baseline["median"]:
+                break
+            crossovers[name] = size
+    return crossovers
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the medians of the benchmarks with the baseline.
+
+    :param results: dictionary with the results by the benchmark names
+    :param baseline: results of the baseline run in the same format
+    :param threshold: allowed relative slowdown, e.g. 0.1 for 10 %
+    :return: list of (name, baseline median, median, ratio, regressed) tuples
+    """
+    comparison = []
+    for name, result in results.items():
+        baseline_result = baseline.get(name, {})
+        if "median" not in result or "median" not in baseline_result:
+            continue
+        ratio = result["median"] / baseline_result["median"]
+        comparison.append(
+            (
+                name,
+                baseline_result["median"],
+                result["median"],
+                ratio,
+                ratio > 1 + threshold,
+            )
+        )
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--reports-per-cluster", type=int, default=10)
+    parser.add_argument("--rules", type=int, default=20)
+    parser.add_argument("--details-size", type=int, default=5)
+    parser.add_argument(
+        "--js-ratio",
+        type=float,
+        default=0.5,
+        help="share of the rules with templates needing the JS worker",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--engine",
+        choices=["native", "js", "verify"],
+        default=utils.TEMPLATE_ENGINE,
+        help="template engine, see TEMPLATE_ENGINE",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="rounds of each benchmark"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="minimal seconds of a round"
+    )
+    parser.add_argument(
+        "--output", default="benchmark_results.json", help="file with the results"
+    )
+    parser.add_argument(
+        "--transport-sizes",
+        type=int,
+        nargs="*",
+        default=[1, 10, 100, 1000, 10000],
+        help="numbers of nodes in the details of the transport benchmarks",
+    )
+    parser.add_argument(
+        "--response-sizes",
+        type=int,
+        nargs="*",
+        default=[100, 1000, 10000],
+        help="numbers of rendered reports in the serialized responses",
+    )
+    parser.add_argument("--baseline", help="file with the results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed relative slowdown compared to the baseline",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    utils.TEMPLATE_ENGINE = args.engine
+    params = {
+        "clusters": args.clusters,
+        "reports_per_cluster": args.reports_per_cluster,
+        "rules": args.rules,
+        "details_size": args.details_size,
+        "js_ratio": args.js_ratio,
+        "seed": args.seed,
+    }
+    request = generate_request(**params)
+    results = run_benchmarks(request, args.repeat, args.min_time)
+    transport_sizes = sorted(args.transport_sizes)
+    results.update(
+        run_transport_benchmarks(transport_sizes, args.repeat, args.min_time)
+    )
+    crossovers = find_crossovers(results, transport_sizes)
+    results.update(
+        run_serialization_benchmarks(
+            sorted(args.response_sizes), args.repeat, args.min_time
+        )
+    )
+    parse_memory = {
+        "model": measure_memory(lambda: RendererRequest.parse_obj(request)),
+        "light": measure_memory(lambda: parse_light_request(request)),
+    }
+
+    with open(args.output, "w", encoding="UTF-8") as output:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "engine": args.engine,
+                "params": params,
+                "benchmarks": results,
+                "transport_crossovers": crossovers,
+                "parse_memory": parse_memory,
+            },
+            output,
+            indent=2,
+        )
+
+    for name, result in results.items():
+        if "median" in result:
+            print(f"{name:24} {result['median'] * 1e6:12.1f} us")
+        else:
+            print(f"{name:24} skipped: {result['skipped']}")
+    for name, size in parse_memory.items():
+        print(f"parse_memory_{name:12} {size / 1024:12.1f} KiB")
+    for name, size in crossovers.items():
+        if size is not None:
+            print(f"{name} transport is faster from {size} nodes in the details")
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, encoding="UTF-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("params") != params or baseline.get("engine") != args.engine:
+        print("Warning: the baseline was measured with different parameters")
+
+    print()
+    regressed = False
+    for name, baseline_median, median, ratio, slower in compare(
+        results, baseline["benchmarks"], args.threshold
+    ):
+        mark = "REGRESSION" if slower else ""
+        print(
+            f"{name:24} {baseline_median * 1e6:12.1f} us -> "
+            f"{median * 1e6:12.1f} us ({ratio:6.2f}x) {mark}"
+        )
+        regressed = regressed or slower
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
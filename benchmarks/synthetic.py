@@ -0,0 +1,184 @@
+"""
+Deterministic generator of synthetic renderer requests and responses.
+
+The same parameters and seed always give the same request, so the benchmark results
+of different commits can be compared.
+"""
+
+import random
+import uuid
+
+# Templates rendered natively, they use only interpolation, conditions and iteration
+NATIVE_TEMPLATES = {
+    "description": "{{=pydata.error_key}} affects {{=pydata.nodes.length}} nodes",
+    "reason": (
+        "Node{{?pydata.nodes.length>1}}s{{?}} not working:\n"
+        "{{~ pydata.nodes :node }}- {{=node.name}} ({{=node.role}}, "
+        "{{=node.memory}} GiB){{? node.ready }} ready{{??}} not ready{{?}}\n{{~}}"
+    ),
+    "resolution": "Red Hat recommends you to fix the issue with the nodes",
+}
+
+# Templates needing the JS worker, they call JavaScript methods
+JS_TEMPLATES = {
+    "description": "{{=pydata.error_key.toLowerCase()}} affects some nodes",
+    "reason": (
+        "Nodes not working: {{=pydata.nodes.map(node => node.name).join(', ')}}\n"
+        "{{~ pydata.nodes :node }}{{? node.memory > 8 }}- {{=node.name}}\n{{?}}{{~}}"
+    ),
+    "resolution": "Red Hat recommends you to restart {{=pydata.nodes[0].name}}",
+}
+
+
+def generate_content(rules, js_ratio=0.5):
+    """
+    Returns the content of the synthetic rules, each with one error key.
+
+    :param rules: number of rules
+    :param js_ratio: share of the rules with templates needing the JS worker
+    :return: list of the rule content dictionaries
+    """
+    content = []
+    for index in range(rules):
+        templates = JS_TEMPLATES if index < rules * js_ratio else NATIVE_TEMPLATES
+        error_key = f"RULE_{index}"
+        content.append(
+            {
+                "plugin": {
+                    "name": f"Benchmark rule {index}",
+                    "node_id": "",
+                    "product_code": "",
+                    "python_module": f"benchmark.rules.rule_{index}",
+                },
+                "error_keys": {
+                    error_key: {
+                        "metadata": {
+                            "description": templates["description"],
+                            "impact": 2,
+                            "likelihood": 3,
+                            "publish_date": "2019-10-29 15:00:00",
+                            "status": "active",
+                            "tags": ["openshift", "benchmark"],
+                        },
+                        "total_risk": 2,
+                        "generic": "",
+                        "summary": "",
+                        "resolution": templates["resolution"],
+                        "more_info": "",
+                        "reason": templates["reason"],
+                        "HasReason": True,
+                    }
+                },
+                "generic": "",
+                "summary": "",
+                "resolution": templates["resolution"],
+                "more_info": "",
+                "reason": templates["reason"],
+                "HasReason": True,
+            }
+        )
+    return content
+
+
+def generate_details(rng, error_key, details_size):
+    """
+    Returns the details of a report with the given number of nodes.
+    """
+    return {
+        "nodes": [
+            {
+                "name": f"node-{rng.randrange(10**6):06d}",
+                "role": rng.choice(["master", "worker", "infra"]),
+                "memory": round(rng.uniform(1, 64), 2),
+                "ready": rng.random() < 0.5,
+            }
+            for _ in range(details_size)
+        ],
+        "link": "https://docs.openshift.com/",
+        "type": "rule",
+        "error_key": error_key,
+    }
+
+
+def generate_request(
+    clusters=1, reports_per_cluster=5, rules=10, details_size=5, js_ratio=0.5, seed=0
+):
+    """
+    Returns a synthetic renderer request.
+
+    :param clusters: number of clusters
+    :param reports_per_cluster: number of reports of each cluster
+    :param rules: number of rules in the content, the reports are spread over them
+    :param details_size: number of nodes in the details of each report
+    :param js_ratio: share of the rules with templates needing the JS worker
+    :param seed: seed of the random generator
+    :return: dictionary with the content and the report data
+    """
+    rng = random.Random(seed)
+    cluster_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(clusters)]
+    reports = {}
+    for cluster_id in cluster_ids:
+        cluster_reports = []
+        for _ in range(reports_per_cluster):
+            index = rng.randrange(rules)
+            error_key = f"RULE_{index}"
+            cluster_reports.append(
+                {
+                    "rule_id": f"rule_{index}|{error_key}",
+                    "component": f"benchmark.rules.rule_{index}.report",
+                    "type": "rule",
+                    "key": error_key,
+                    "details": generate_details(rng, error_key, details_size),
+                    "tags": [],
+                    "links": {},
+                }
+            )
+        reports[cluster_id] = {
+            "fingerprints": [],
+            "info": [],
+            "pass": [],
+            "reports": cluster_reports,
+            "skips": [],
+            "system": {"metadata": {}, "hostname": None},
+        }
+
+    return {
+        "content": generate_content(rules, js_ratio),
+        "report_data": {
+            "clusters": cluster_ids,
+            "errors": None,
+            "reports": reports,
+            "generated_at": "",
+            "status": "ok",
+        },
+    }
+
+
+def generate_response(reports=10, reports_per_cluster=10, seed=0):
+    """
+    Returns a synthetic renderer response.
+
+    :param reports: number of rendered reports
+    :param reports_per_cluster: number of rendered reports of each cluster
+    :param seed: seed of the random generator
+    :return: dictionary with the clusters and their rendered reports
+    """
+    rng = random.Random(seed)
+    rendered = {}
+    for index in range(reports):
+        if index % reports_per_cluster == 0:
+            cluster_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            rendered[cluster_id] = []
+        rule = rng.randrange(100)
+        nodes = [f"node-{rng.randrange(10**6):06d}" for _ in range(rng.randint(1, 5))]
+        rendered[cluster_id].append(
+            {
+                "rule_id": f"benchmark.rules.rule_{rule}",
+                "error_key": f"RULE_{rule}",
+                "resolution": f"Red Hat recommends you to restart {nodes[0]}",
+                "reason": "Nodes not working:\n"
+                + "".join(f"- {node} (worker) not ready\n" for node in nodes),
+                "description": f"RULE_{rule} affects {len(nodes)} nodes",
+            }
+        )
+    return {"clusters": list(rendered), "reports": rendered}
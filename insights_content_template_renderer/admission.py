@@ -0,0 +1,235 @@
+"""
+Admission control of the rendering requests.
+
+The requests are rejected before their body is received and parsed when the process
+is saturated: when too many requests are in flight, when the JS workers have too many
+queued batches or when the bodies of the requests in flight would take too much
+memory. The saturated service answers 429 with the Retry-After header, so the clients
+back off instead of piling the requests up, and the request bodies larger than
+the limit are answered 413. A body without Content-Length (chunked) or longer than
+its Content-Length is counted while it is received, and the request is rejected
+as soon as the received bytes exceed the limits.
+
+The limits are per process, like the JS worker pool. The counters are updated only
+in the event loop, so they need no locking.
+"""
+
+import json
+import logging
+import os
+
+from starlette.requests import ClientDisconnect
+
+from insights_content_template_renderer.js_executor import get_js_executor
+from insights_content_template_renderer.metrics import (
+    admitted_requests,
+    inflight_requests,
+    rejected_requests,
+)
+
+log = logging.getLogger(__name__)
+
+# Maximal number of rendering requests processed at once (0 disables the limit)
+MAX_INFLIGHT_REQUESTS = int(os.environ.get("MAX_INFLIGHT_REQUESTS", "32"))
+# Number of batches queued or running in the JS workers above which the new rendering
+# requests are rejected (0 disables the limit)
+MAX_QUEUED_JS_TASKS = int(os.environ.get("MAX_QUEUED_JS_TASKS", "64"))
+# Maximal body size of a rendering request (0 disables the limit)
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", "0"))
+# Maximal sum of the body sizes of the rendering requests processed at once
+# (0 disables the limit)
+MAX_INFLIGHT_BYTES = int(os.environ.get("MAX_INFLIGHT_BYTES", "0"))
+# Seconds sent in the Retry-After header of the rejected requests
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+
+# Paths of the requests subject to the admission control
+RENDERING_PATHS = frozenset(
+    (
+        "/rendered_reports",
+        "/v1/rendered_reports",
+        "/v1/rendered_reports/light",
+        "/v1/rendered_reports/stream",
+    )
+)
+
+
+def get_content_length(scope):
+    """
+    Returns the Content-Length of the request.
+
+    :param scope: ASGI connection scope
+    :return: the length in bytes, 0 if the header is missing or invalid
+    """
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return max(int(value), 0)
+            except ValueError:
+                return 0
+    return 0
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting the rendering requests while the process
+    is not saturated.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_inflight_requests=None,
+        max_queued_js_tasks=None,
+        max_request_bytes=None,
+        max_inflight_bytes=None,
+        retry_after=None,
+        queue_depth=None,
+    ):
+        """
+        :param app: ASGI application
+        :param max_inflight_requests: see MAX_INFLIGHT_REQUESTS
+        :param max_queued_js_tasks: see MAX_QUEUED_JS_TASKS
+        :param max_request_bytes: see MAX_REQUEST_BYTES
+        :param max_inflight_bytes: see MAX_INFLIGHT_BYTES
+        :param retry_after: see ADMISSION_RETRY_AFTER
+        :param queue_depth: function returning the number of the queued JS batches
+                            (default: the queue depth of the JS executor)
+        """
+        self.app = app
+        self.max_inflight_requests = (
+            MAX_INFLIGHT_REQUESTS
+            if max_inflight_requests is None
+            else max_inflight_requests
+        )
+        self.max_queued_js_tasks = (
+            MAX_QUEUED_JS_TASKS if max_queued_js_tasks is None else max_queued_js_tasks
+        )
+        self.max_request_bytes = (
+            MAX_REQUEST_BYTES if max_request_bytes is None else max_request_bytes
+        )
+        self.max_inflight_bytes = (
+            MAX_INFLIGHT_BYTES if max_inflight_bytes is None else max_inflight_bytes
+        )
+        self.retry_after = ADMISSION_RETRY_AFTER if retry_after is None else retry_after
+        self.queue_depth = queue_depth or (lambda: get_js_executor().queue_depth)
+        self.inflight = 0
+        self.inflight_bytes = 0
+
+    def check(self, size):
+        """
+        Decides whether the request is admitted.
+
+        :param size: Content-Length of the request
+        :return: None if the request is admitted, otherwise the tuple with
+                 the status code and the reason of the rejection
+        """
+        if 0 < self.max_request_bytes < size:
+            return 413, "too_large"
+        if 0 < self.max_inflight_requests <= self.inflight:
+            return 429, "inflight_requests"
+        # A request is admitted to the idle process regardless of its size
+        if self.inflight and 0 < self.max_inflight_bytes < self.inflight_bytes + size:
+            return 429, "inflight_bytes"
+        if 0 < self.max_queued_js_tasks <= self.queue_depth():
+            return 429, "queued_js_tasks"
+        return None
+
+    def check_received(self, size):
+        """
+        Decides whether the admitted request may continue receiving its body.
+
+        :param size: number of bytes of the body received so far, already counted
+                     in inflight_bytes
+        :return: None if the request may continue, otherwise the tuple with
+                 the status code and the reason of the rejection
+        """
+        if 0 < self.max_request_bytes < size:
+            return 413, "too_large"
+        # The only request in flight is never rejected for the inflight bytes
+        if self.inflight > 1 and 0 < self.max_inflight_bytes < self.inflight_bytes:
+            return 429, "inflight_bytes"
+        return None
+
+    async def reject(self, send, status, reason):
+        """
+        Sends the response rejecting the request.
+        """
+        if status == 413:
+            detail = f"Request body exceeds {self.max_request_bytes} bytes"
+            headers = []
+        else:
+            detail = "Too many requests, retry later"
+            headers = [(b"retry-after", str(self.retry_after).encode())]
+        body = json.dumps({"detail": detail, "reason": reason}).encode()
+        headers += [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in RENDERING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        size = get_content_length(scope)
+        rejection = self.check(size)
+        if rejection is not None:
+            status, reason = rejection
+            rejected_requests.labels(reason).inc()
+            log.warning("Rejected request for %s: %s", scope["path"], reason)
+            await self.reject(send, status, reason)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def receive_counted():
+            nonlocal size, received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            received += len(message.get("body", b""))
+            if received <= size:
+                return message
+            self.inflight_bytes += received - size
+            size = received
+            rejection = self.check_received(size)
+            if rejection is None:
+                return message
+            # The application sees the client disconnected and its response
+            # is dropped
+            rejected = True
+            status, reason = rejection
+            rejected_requests.labels(reason).inc()
+            log.warning("Rejected request for %s: %s", scope["path"], reason)
+            if not response_started:
+                await self.reject(send, status, reason)
+            return {"type": "http.disconnect"}
+
+        async def send_unless_rejected(message):
+            nonlocal response_started
+            if rejected:
+                return
+            response_started = True
+            await send(message)
+
+        admitted_requests.inc()
+        self.inflight += 1
+        self.inflight_bytes += size
+        inflight_requests.inc()
+        try:
+            await self.app(scope, receive_counted, send_unless_rejected)
+        except ClientDisconnect:
+            if not rejected:
+                raise
+        finally:
+            self.inflight -= 1
+            self.inflight_bytes -= size
+            inflight_requests.dec()
@@ -0,0 +1,196 @@
+"""
+Offline compilation of the templates of the content into a bundle.
+
+The bundle is a JSON file with the JS functions compiled from all templates of
+the content by doT, keyed by the digests of their code, and an index of the
+templates. When the service loads the bundle (see TEMPLATE_BUNDLE_PATH), the
+templates are not compiled by doT at runtime and the JS workers evaluate all
+functions of the bundle in one pm.eval during the warm-up.
+
+Build the bundle from a file or directory with the content:
+
+    insights-template-bundle path/to/content -o template_bundle.json --check
+
+The templates that doT fails to compile (or that SpiderMonkey fails to evaluate
+with --check) are reported and the command fails, so the bad templates are caught
+when the bundle is built instead of under production load.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from insights_content_template_renderer import utils
+from insights_content_template_renderer.js_executor import (
+    _warm_up_worker,
+    get_code_digest,
+)
+from insights_content_template_renderer.models import Content
+from insights_content_template_renderer.registry import (
+    get_content_version,
+    load_content,
+)
+
+log = logging.getLogger(__name__)
+
+# Version of the format of the bundle file
+BUNDLE_FORMAT = 1
+
+
+class TemplateBundleError(ValueError):
+    """
+    Exception raised if the bundle file cannot be loaded.
+    """
+
+
+def build_bundle(content: list[Content]) -> tuple[dict, list[str]]:
+    """
+    Compiles all templates of the content into the bundle.
+
+    :param content: list with content data for all rules
+    :return: tuple with the bundle and the list of the errors of the templates
+             that failed to compile
+    """
+    templates = {}
+    index = {}
+    functions = {}
+    js_functions = []
+    errors = []
+    for rule in content:
+        module = rule.plugin["python_module"]
+        for error_key in rule.error_keys:
+            fields = {}
+            for field, template_text in utils.get_report_templates(
+                rule, error_key
+            ).items():
+                if not template_text:
+                    fields[field] = None
+                    continue
+                try:
+                    js_code = utils.compile_template(template_text)
+                except Exception as exception:
+                    errors.append(f"{module}|{error_key} {field}: {exception}")
+                    fields[field] = None
+                    continue
+                digest = get_code_digest(js_code)
+                templates[utils.get_template_digest(template_text)] = digest
+                if digest not in functions:
+                    functions[digest] = js_code
+                    if js_code not in utils.native_template_cache:
+                        js_functions.append(digest)
+                fields[field] = digest
+            index[f"{module}|{error_key}"] = fields
+
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "content_version": get_content_version(content),
+        "index": index,
+        "templates": templates,
+        "functions": functions,
+        "js_functions": js_functions,
+    }
+    return bundle, errors
+
+
+def check_bundle(bundle):
+    """
+    Evaluates the functions of the bundle by PythonMonkey in this process.
+
+    :param bundle: bundle returned by build_bundle
+    :return: list of the errors of the templates that failed to evaluate
+    """
+    functions = bundle["functions"]
+    evaluated = set(
+        _warm_up_worker([(js_code, digest) for digest, js_code in functions.items()])
+    )
+    return [
+        f"{key} {field}: JavaScript function failed to evaluate"
+        for key, fields in bundle["index"].items()
+        for field, digest in fields.items()
+        if digest is not None and digest not in evaluated
+    ]
+
+
+def load_bundle(path) -> dict:
+    """
+    Loads the bundle file.
+
+    :param path: path to the bundle file
+    :return: the bundle
+    :raises TemplateBundleError: If the file is not a bundle of a supported format
+    """
+    try:
+        with open(path, encoding="UTF-8") as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as exception:
+        raise TemplateBundleError(
+            f"Cannot load template bundle {path}: {exception}"
+        ) from exception
+    if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+        raise TemplateBundleError(
+            f"Template bundle {path} is not in format version {BUNDLE_FORMAT}"
+        )
+    return bundle
+
+
+def install_bundle(bundle):
+    """
+    Makes compile_template use the JS functions of the bundle instead of compiling
+    the templates by doT.
+
+    :param bundle: bundle returned by load_bundle
+    :return: JS code of the functions to be evaluated by the JS workers
+    """
+    functions = bundle["functions"]
+    utils.bundled_templates.update(
+        (template_digest, functions[digest])
+        for template_digest, digest in bundle["templates"].items()
+    )
+    digests = functions if utils.TEMPLATE_ENGINE != "native" else bundle["js_functions"]
+    log.info(
+        "Installed template bundle of content version %s with %d functions",
+        bundle["content_version"],
+        len(functions),
+    )
+    return [functions[digest] for digest in digests]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "content", help="JSON file or directory of JSON files with the content"
+    )
+    parser.add_argument(
+        "-o", "--output", default="template_bundle.json", help="file with the bundle"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="evaluate the compiled functions by PythonMonkey",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bundle, errors = build_bundle(load_content(args.content))
+    if args.check and not errors:
+        errors = check_bundle(bundle)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        print(f"{len(errors)} templates failed, no bundle written", file=sys.stderr)
+        return 1
+
+    with open(args.output, "w", encoding="UTF-8") as output:
+        json.dump(bundle, output, indent=1)
+    print(
+        f"Written {len(bundle['functions'])} functions of {len(bundle['index'])} "
+        f"error keys of content version {bundle['content_version']} to {args.output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
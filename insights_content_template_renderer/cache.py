@@ -0,0 +1,239 @@
+"""
+Provides the bounded caches used by the rendering pipeline.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe cache with least-recently-used eviction.
+
+    The cache keeps hit/miss/eviction counters so its efficiency can be monitored.
+    A cache with maxsize lower than 1 stores nothing and every lookup is a miss.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Initialize an empty cache.
+
+        :param maxsize: maximal number of stored items
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value and marks it as the most recently used one.
+
+        :param key: key of the cached item
+        :param default: value returned when the key is not cached
+        :return: cached value or the default
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores the value, evicting the least recently used items if the cache is full.
+
+        :param key: key of the cached item
+        :param value: value to be cached
+        """
+        if self.maxsize < 1:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        """
+        Returns the cached value, creating and caching it on a miss.
+
+        The factory is called outside of the lock, so a slow factory does not block
+        lookups of other keys. Concurrent misses of the same key may call it twice.
+
+        :param key: key of the cached item
+        :param factory: callable without arguments creating the value
+        :return: cached or newly created value
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Removes all items from the cache and resets the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the current size of the cache and its counters.
+
+        :return: dictionary with size, maxsize, hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """
+    Thread-safe cache bounded by the total size of its items in bytes, with
+    least-recently-used eviction and expiration of the items after their time to live.
+
+    A cache with maxbytes lower than 1 stores nothing and every lookup is a miss.
+    """
+
+    def __init__(self, maxbytes=0, ttl=300, timer=time.monotonic):
+        """
+        Initialize an empty cache.
+
+        :param maxbytes: maximal total size of the stored items in bytes
+        :param ttl: seconds after which a stored item expires
+        :param timer: function returning the current time in seconds
+        """
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._timer = timer
+        # Items stored as (value, size, expiration time) tuples
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value and marks it as the most recently used one.
+
+        :param key: key of the cached item
+        :param default: value returned when the key is not cached or has expired
+        :return: cached value or the default
+        """
+        with self._lock:
+            try:
+                value, _, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires <= self._timer():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=None):
+        """
+        Stores the value, evicting the least recently used items if the cache is full.
+        The value larger than the whole cache is not stored.
+
+        :param key: key of the cached item
+        :param value: value to be cached
+        :param size: size of the item in bytes (default: size of the value object)
+        """
+        if size is None:
+            size = sys.getsizeof(value)
+        if self.maxbytes < 1 or size > self.maxbytes:
+            return
+        with self._lock:
+            now = self._timer()
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, now + self.ttl)
+            self.bytes += size
+
+            # The expired items are dropped first, if they are the oldest ones
+            while self._data:
+                oldest = next(iter(self._data))
+                _, _, expires = self._data[oldest]
+                if expires <= now:
+                    self._remove(oldest)
+                    self.expirations += 1
+                elif self.bytes > self.maxbytes:
+                    self._remove(oldest)
+                    self.evictions += 1
+                else:
+                    break
+
+    def clear(self):
+        """
+        Removes all items from the cache and resets the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def stats(self):
+        """
+        Returns the current size of the cache and its counters.
+
+        :return: dictionary with size, bytes, maxbytes, hits, misses, evictions
+                 and expirations
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "bytes": self.bytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -2,24 +2,58 @@
 Contains service endpoints.
 """
 
+import asyncio
+import json
 import logging
+import math
 import os
+import time
 
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from prometheus_fastapi_instrumentator import Instrumentator
+from pydantic_core import to_json
+from starlette.requests import ClientDisconnect
 
+from insights_content_template_renderer.admission import AdmissionMiddleware
+from insights_content_template_renderer.incremental import render_request_stream
 from insights_content_template_renderer.js_executor import shutdown_js_executor
-from insights_content_template_renderer.models import RendererRequest, RendererResponse
+from insights_content_template_renderer.light_models import parse_light_request
+from insights_content_template_renderer.models import (
+    Content,
+    ContentVersion,
+    RendererRequest,
+    RendererResponse,
+)
+from insights_content_template_renderer.registry import (
+    ContentVersionNotFoundError,
+    content_registry,
+)
 from insights_content_template_renderer.sentry import init_sentry
-from insights_content_template_renderer.utils import RenderingError, render_reports
+from insights_content_template_renderer.utils import (
+    RenderingError,
+    render_reports_stream,
+    render_response_content_async,
+)
+from insights_content_template_renderer.warm_up import WARM_UP_ON_STARTUP, warm_up
 
 app = FastAPI()
 log = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Header with the seconds the client waits for the rendered reports
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
 init_sentry(
     os.environ.get("SENTRY_DSN", None), None, os.environ.get("SENTRY_ENVIRONMENT", None)
 )
+app.add_middleware(AdmissionMiddleware)
 instrumentator = Instrumentator().instrument(app)
 
 
@@ -29,11 +63,32 @@ async def rendering_error_handler(request, exc: RenderingError):
     return PlainTextResponse("Internal Server Error", status_code=500)
 
 
+@app.exception_handler(ContentVersionNotFoundError)
+async def content_version_not_found_handler(request, exc: ContentVersionNotFoundError):
+    """Handle requests referencing unknown content versions."""
+    return JSONResponse({"detail": str(exc)}, status_code=404)
+
+
 @app.on_event("startup")
 async def expose_metrics():
     instrumentator.expose(app, endpoint="/metrics", tags=["metrics"])
 
 
+@app.on_event("startup")
+async def warm_up_workers():
+    """
+    Start the JavaScript worker pool and preload the content before the application
+    starts accepting requests.
+    """
+    if not WARM_UP_ON_STARTUP:
+        return
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception:
+        # The workers are started on the first request instead
+        log.exception("Warm-up failed")
+
+
 @app.on_event("shutdown")
 async def shutdown_workers():
     """Gracefully shutdown the JavaScript worker pool on application shutdown."""
@@ -41,21 +96,156 @@ async def shutdown_workers():
     shutdown_js_executor()
 
 
-@app.post("/rendered_reports", response_model=RendererResponse)
-@app.post("/v1/rendered_reports", response_model=RendererResponse)
-async def rendered_reports(data: RendererRequest):
+def json_response(content):
+    """
+    Encodes the response content built by the service directly to the JSON response.
+
+    The content is not validated again by the response_model of the endpoint,
+    which only documents the response, and it is encoded by the pydantic-core
+    JSON encoder without converting it to the models.
+
+    :param content: dictionary with the response, e.g. in the format of
+                    RendererResponse
+    :return: JSON response
+    """
+    return Response(to_json(content), media_type="application/json")
+
+
+async def stream_ndjson(rendered_clusters, first=None):
+    """
+    Serializes the rendered reports of each cluster as one line of NDJSON.
+
+    The response status has already been sent when rendering of a cluster fails,
+    so the failure is reported by the last line with the error.
+
+    :param rendered_clusters: async iterator of the rendered clusters
+    :param first: rendered cluster already taken from the iterator
+    """
+    try:
+        if first is not None:
+            yield first.model_dump_json() + "\n"
+        async for rendered_cluster in rendered_clusters:
+            yield rendered_cluster.model_dump_json() + "\n"
+    except ClientDisconnect:
+        # The client or the admission control ended the request
+        raise
+    except ValueError as exc:
+        log.warning("Invalid request: %s", exc)
+        yield json.dumps({"error": f"Invalid request: {exc}"}) + "\n"
+    except Exception as exc:
+        error = RenderingError(f"error rendering template: {exc}")
+        log.exception(error)
+        yield json.dumps({"error": "Internal Server Error"}) + "\n"
+
+
+@app.post(
+    "/rendered_reports",
+    response_model=RendererResponse,
+    response_model_exclude_none=True,
+)
+@app.post(
+    "/v1/rendered_reports",
+    response_model=RendererResponse,
+    response_model_exclude_none=True,
+)
+async def rendered_reports(
+    data: RendererRequest, request: Request, stream: bool = False
+):
     """
     Endpoint for rendering reports based on DoT.js content templates and report details.
 
+    With the stream query parameter or the application/x-ndjson Accept header,
+    the rendered reports of each cluster are sent as one line of NDJSON as soon
+    as they are rendered.
+
+    With the timeout in the body or the X-Request-Timeout header (in seconds),
+    the rendering is stopped when the timeout passes and the reports not rendered
+    by then are listed in the unrendered field of the response.
+
     :param data: request containing JSON body with required data
+    :param request: the HTTP request
+    :param stream: stream the rendered reports of each cluster as NDJSON
     :return: JSON with rendered reports
     """
     log.info("Received request for /rendered_reports")
+    return await respond_rendered_reports(data, request, stream)
+
+
+@app.post(
+    "/v1/rendered_reports/light",
+    response_model=RendererResponse,
+    response_model_exclude_none=True,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": {"$ref": "#/components/schemas/RendererRequest"}
+                }
+            },
+            "required": True,
+        }
+    },
+)
+async def rendered_reports_light(request: Request, stream: bool = False):
+    """
+    Endpoint for rendering reports of trusted callers. Takes the same JSON body
+    as /rendered_reports, but checks only the fields read by the rendering, which
+    makes the parsing of large requests faster and lighter.
+
+    :param request: the HTTP request with the same JSON body as /rendered_reports
+    :param stream: stream the rendered reports of each cluster as NDJSON
+    :return: JSON with rendered reports
+    """
+    log.info("Received request for /rendered_reports/light")
+
+    try:
+        data = parse_light_request(json.loads(await request.body()))
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=422)
+    return await respond_rendered_reports(data, request, stream)
+
+
+async def respond_rendered_reports(data, request: Request, stream: bool):
+    """
+    Renders the reports of the parsed request, see rendered_reports.
+
+    :param data: the parsed request, RendererRequest or LightRendererRequest
+    :param request: the HTTP request
+    :param stream: stream the rendered reports of each cluster as NDJSON
+    :return: the rendered reports or the response
+    """
+    deadline = None
+    timeout = request.headers.get(REQUEST_TIMEOUT_HEADER)
+    if timeout is not None:
+        try:
+            seconds = float(timeout)
+        except ValueError:
+            seconds = math.nan
+        # NaN, infinite or not positive timeouts would disable the deadline
+        if not 0 < seconds < math.inf:
+            return JSONResponse(
+                {"detail": f"Invalid {REQUEST_TIMEOUT_HEADER} header: {timeout!r}"},
+                status_code=422,
+            )
+        deadline = time.monotonic() + seconds
+
+    content_index = None
+    if data.content_version is not None:
+        content_index = content_registry.get(data.content_version)
+
+    if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_ndjson(render_reports_stream(data, content_index)),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
     log.debug("Rendering report")
     try:
-        rendered_report = render_reports(data)
+        rendered_report = await render_response_content_async(
+            data, content_index, deadline
+        )
         log.debug("Report successfully rendered")
-        return rendered_report
+        return json_response(rendered_report)
 
     except Exception as exc:
         # Wrap the exception with request data for debugging
@@ -63,3 +253,64 @@ async def rendered_reports(data: RendererRequest):
         log.exception(error)
         # Re-raise so Sentry can capture it with the request_data
         raise error from exc
+
+
+@app.post("/v1/rendered_reports/stream")
+async def rendered_reports_stream(request: Request):
+    """
+    Endpoint for rendering the reports of large requests. The JSON body is parsed
+    while it is being received and the reports of each cluster are rendered as soon
+    as they are parsed. The rendered reports of each cluster are sent as one line
+    of NDJSON.
+
+    :param request: the HTTP request with the same JSON body as /rendered_reports
+    :return: NDJSON with the rendered reports of each cluster
+    """
+    log.info("Received request for /rendered_reports/stream")
+
+    rendered_clusters = render_request_stream(request.stream())
+    try:
+        # The errors found before the first cluster is rendered get their status code
+        first = await anext(rendered_clusters, None)
+    except ValueError as exc:
+        await rendered_clusters.aclose()
+        return JSONResponse({"detail": str(exc)}, status_code=422)
+    except (ContentVersionNotFoundError, ClientDisconnect):
+        await rendered_clusters.aclose()
+        raise
+    except Exception as exc:
+        error = RenderingError(f"error rendering template: {exc}")
+        log.exception(error)
+        raise error from exc
+
+    return StreamingResponse(
+        stream_ndjson(rendered_clusters, first), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@app.post("/v1/content", response_model=ContentVersion)
+def register_content(content: list[Content]):
+    """
+    Endpoint for registering the content data referenced by the following requests.
+
+    The templates of the content are compiled during the registration. The returned
+    version can be sent as content_version instead of the content itself.
+
+    :param content: list with content data for all rules
+    :return: JSON with the content version
+    """
+    log.info("Received request for /content")
+    version, content_index = content_registry.register(content)
+    return ContentVersion(version=version, rules=len(content_index.rules))
+
+
+@app.get("/v1/content/{version}", response_model=ContentVersion)
+def get_content(version: str):
+    """
+    Endpoint for checking that the content version is registered.
+
+    :param version: content version returned by the registration
+    :return: JSON with the content version
+    """
+    content_index = content_registry.get(version)
+    return ContentVersion(version=version, rules=len(content_index.rules))
@@ -0,0 +1,259 @@
+"""
+Incremental parsing and rendering of the renderer request.
+
+The request body is parsed while it is being received. The reports of each cluster
+are validated and rendered as soon as they are parsed, so neither the whole body nor
+the whole parsed request is held in memory and the rendering overlaps with the upload.
+
+Only the structure of the request (the top-level object, report_data and its reports)
+is walked by the parser, the other values are decoded by json one by one.
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import re
+
+from pydantic import TypeAdapter
+
+from insights_content_template_renderer.models import Content, ReportPerCluster
+from insights_content_template_renderer.registry import content_registry
+from insights_content_template_renderer.utils import (
+    ContentIndex,
+    render_cluster_async,
+)
+
+log = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+content_adapter = TypeAdapter(list[Content] | None)
+clusters_adapter = TypeAdapter(list[str])
+content_version_adapter = TypeAdapter(str | None)
+
+
+class IncrementalParseError(ValueError):
+    """
+    Exception raised if the request body is not valid JSON.
+    """
+
+
+class IncrementalJSONReader:
+    """
+    Reads JSON from an async iterator of byte chunks.
+
+    The caller walks into the objects by iter_object and reads the other values
+    by read_value. Only the unread part of the body is buffered.
+    """
+
+    def __init__(self, chunks):
+        """
+        Initialize the reader.
+
+        :param chunks: async iterable of the byte chunks of the body
+        """
+        self._chunks = aiter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    async def _fill(self, size):
+        """
+        Reads chunks until at least size characters are buffered after the position.
+
+        :return: False if the body ended first
+        """
+        if self._pos:
+            self._buffer = self._buffer[self._pos :]
+            self._pos = 0
+        while len(self._buffer) < size and not self._eof:
+            try:
+                chunk = await anext(self._chunks)
+            except StopAsyncIteration:
+                self._eof = True
+                chunk = b""
+            try:
+                self._buffer += self._decoder.decode(chunk, final=self._eof)
+            except UnicodeDecodeError as exception:
+                raise IncrementalParseError(str(exception)) from exception
+        return len(self._buffer) >= size
+
+    async def _peek(self):
+        """
+        Skips the white space and returns the next character.
+        """
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill(1):
+                raise IncrementalParseError("Unexpected end of JSON")
+
+    async def _expect(self, chars):
+        """
+        Consumes the next character, which must be one of the chars.
+
+        :return: the consumed character
+        """
+        char = await self._peek()
+        if char not in chars:
+            raise IncrementalParseError(
+                f"Expecting one of {chars!r} at position {self._pos}, found {char!r}"
+            )
+        self._pos += 1
+        return char
+
+    async def read_value(self):
+        """
+        Reads and decodes the next JSON value.
+
+        :return: the decoded value
+        """
+        await self._peek()
+        size = len(self._buffer) - self._pos
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as exception:
+                if self._eof:
+                    raise IncrementalParseError(str(exception)) from exception
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            # Doubling the buffered size keeps the repeated decoding linear
+            await self._fill(2 * size + 1)
+            size = len(self._buffer) - self._pos
+
+    async def iter_object(self):
+        """
+        Walks into the next JSON object and yields its keys. The value of each key
+        must be read or walked into before the next key is requested.
+        """
+        await self._expect("{")
+        if await self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if await self._peek() != '"':
+                raise IncrementalParseError(
+                    f"Expecting property name at position {self._pos}"
+                )
+            key = await self.read_value()
+            await self._expect(":")
+            yield key
+            if await self._expect(",}") == "}":
+                return
+
+    async def finish(self):
+        """
+        Checks that there is nothing but white space after the parsed value.
+        """
+        try:
+            char = await self._peek()
+        except IncrementalParseError:
+            return
+        raise IncrementalParseError(f"Extra data at position {self._pos}: {char!r}")
+
+
+async def parse_request(chunks):
+    """
+    Parses the renderer request incrementally and yields its parts in the order
+    of the body: ("content", list of Content or None), ("content_version", str or
+    None), ("clusters", list of cluster IDs) and ("reports", (cluster_id,
+    ReportPerCluster)) for each cluster. Unknown keys are skipped like by the model.
+
+    :param chunks: async iterable of the byte chunks of the body
+    :return: async generator of the (kind, value) pairs
+    """
+    reader = IncrementalJSONReader(chunks)
+    required = {"clusters", "reports"}
+    async for key in reader.iter_object():
+        if key == "content":
+            yield "content", content_adapter.validate_python(await reader.read_value())
+        elif key == "content_version":
+            yield (
+                "content_version",
+                content_version_adapter.validate_python(await reader.read_value()),
+            )
+        elif key == "report_data":
+            async for data_key in reader.iter_object():
+                required.discard(data_key)
+                if data_key == "clusters":
+                    yield (
+                        "clusters",
+                        clusters_adapter.validate_python(await reader.read_value()),
+                    )
+                elif data_key == "reports":
+                    async for cluster_id in reader.iter_object():
+                        cluster_data = ReportPerCluster.parse_obj(
+                            await reader.read_value()
+                        )
+                        yield "reports", (cluster_id, cluster_data)
+                else:
+                    await reader.read_value()
+        else:
+            await reader.read_value()
+    await reader.finish()
+    if required:
+        raise ValueError(f"report_data.{min(required)} is required")
+
+
+async def render_request_stream(chunks):
+    """
+    Renders the reports of the request parsed incrementally from the body.
+
+    The reports of each cluster are rendered as soon as they are parsed and the
+    content is known, while the next cluster is being parsed. The clusters parsed
+    before the content (or the content_version) are kept until the content arrives,
+    so the clients should send the content first.
+
+    :param chunks: async iterable of the byte chunks of the body
+    :return: async generator of the rendered reports of each cluster in the order
+             of the request
+    :raises ValueError: If the body is not a valid request
+    :raises ContentVersionNotFoundError: If the content version is not registered
+    """
+    content_index = None
+    waiting = []
+    pending = []
+    try:
+        async for kind, value in parse_request(chunks):
+            if kind in ("content", "content_version") and value is not None:
+                if content_index is not None:
+                    raise ValueError(
+                        "exactly one of content and content_version is required"
+                    )
+                if kind == "content":
+                    content_index = ContentIndex(value)
+                else:
+                    content_index = content_registry.get(value)
+            elif kind == "reports":
+                waiting.append(value)
+
+            if content_index is not None:
+                for cluster_id, cluster_data in waiting:
+                    pending.append(
+                        asyncio.ensure_future(
+                            render_cluster_async(
+                                content_index, cluster_id, cluster_data
+                            )
+                        )
+                    )
+                waiting.clear()
+            # At most two clusters are rendered while the next one is being parsed
+            while len(pending) > 1 or (pending and pending[0].done()):
+                yield await pending.pop(0)
+
+        if content_index is None:
+            raise ValueError("exactly one of content and content_version is required")
+        while pending:
+            yield await pending.pop(0)
+    finally:
+        # The client has disconnected or the request is invalid
+        for task in pending:
+            task.cancel()
@@ -1,32 +1,281 @@
 """
-JavaScript execution pool for running JS code in an isolated process.
+JavaScript execution pool for running JS code in isolated processes.
 
 This module provides a process pool for executing JavaScript code using PythonMonkey.
 Running JS in the separate process avoids the PythonMonkey FastAPI recursion bug
 (see https://github.com/Distributive-Network/PythonMonkey/issues/490).
+
+The worker keeps the evaluated JS functions in a bounded cache keyed by the digest
+of their code, so the same template is compiled by SpiderMonkey only once.
+
+After each batch the worker reports its resident memory. It runs the JS garbage
+collector when the memory crosses JS_WORKER_GC_RSS_MB and the executor recycles
+the worker when it crosses JS_WORKER_MAX_RSS_MB.
+
+The data of the templates is passed to the worker either as the pickled Python
+objects, which PythonMonkey converts to JS ones attribute by attribute, or with
+JS_DATA_TRANSPORT=json serialized as JSON once and parsed natively by JSON.parse
+in the worker. The JSON data larger than JS_SHARED_MEMORY_THRESHOLD is passed
+in shared memory instead of the task pipe.
+
+The timeout of each template is either overridden, or derived from the latency
+history of the template, or the default one. When a batch times out, only the worker
+running it is killed and replaced, the other tasks keep running.
 """
 
+import asyncio
+import contextlib
+import hashlib
+import json
 import logging
+import math
 import multiprocessing as mp
-from functools import cache
+import os
+import resource
+import time
+import weakref
+from concurrent.futures import Future
+from functools import cache, lru_cache
+from multiprocessing.shared_memory import SharedMemory
+
+from insights_content_template_renderer.cache import LRUCache
+from insights_content_template_renderer.metrics import (
+    js_ipc_payload_bytes,
+    js_queue_depth,
+    js_task_execution_seconds,
+    js_task_wait_seconds,
+    js_timeouts,
+    js_worker_recycles,
+    js_workers,
+)
+from insights_content_template_renderer.worker_pool import WorkerPool, resolve_future
 
 log = logging.getLogger(__name__)
 
+# Maximal number of evaluated JS functions kept by the worker process
+JS_FUNCTION_CACHE_SIZE = int(os.environ.get("JS_FUNCTION_CACHE_SIZE", "1024"))
+
+# Upper limit of the default timeout in seconds for a batch of tasks
+JS_BATCH_TIMEOUT = float(os.environ.get("JS_BATCH_TIMEOUT", "30"))
+
+# Minimal and maximal number of worker processes of each executor
+JS_POOL_SIZE = int(os.environ.get("JS_POOL_SIZE", "1"))
+JS_POOL_MAX_SIZE = int(os.environ.get("JS_POOL_MAX_SIZE", str(JS_POOL_SIZE)))
+
+# Number of tasks queued in the least loaded worker that makes the pool spawn
+# another worker (if it has less than JS_POOL_MAX_SIZE workers)
+JS_POOL_SCALE_UP_QUEUE_DEPTH = int(os.environ.get("JS_POOL_SCALE_UP_QUEUE_DEPTH", "2"))
+
+# Seconds after which an idle worker above JS_POOL_SIZE is stopped
+JS_POOL_IDLE_TIMEOUT = float(os.environ.get("JS_POOL_IDLE_TIMEOUT", "60"))
+
+# Derive the timeout of each template from its latency history
+JS_ADAPTIVE_TIMEOUT = os.environ.get("JS_ADAPTIVE_TIMEOUT", "true").lower() == "true"
+# Multiple of the typical latency of the template used as its timeout
+JS_ADAPTIVE_TIMEOUT_FACTOR = float(os.environ.get("JS_ADAPTIVE_TIMEOUT_FACTOR", "10"))
+# Minimal adaptive timeout in seconds of a template
+JS_ADAPTIVE_TIMEOUT_MIN = float(os.environ.get("JS_ADAPTIVE_TIMEOUT_MIN", "1"))
+
+# Resident memory in MiB of the worker process above which the JS garbage collector
+# is run after a batch (0 disables it)
+JS_WORKER_GC_RSS_MB = int(os.environ.get("JS_WORKER_GC_RSS_MB", "256"))
+# Resident memory in MiB of the worker process above which the worker is replaced
+# by a new one after finishing its queued tasks (0 disables it)
+JS_WORKER_MAX_RSS_MB = int(os.environ.get("JS_WORKER_MAX_RSS_MB", "512"))
+
+# Transport of the template data to the worker process: "python" (the pickled
+# objects converted by PythonMonkey) or "json" (parsed by JSON.parse in the worker)
+JS_DATA_TRANSPORT = os.environ.get("JS_DATA_TRANSPORT", "python").lower()
+# Size in bytes of the JSON data above which it is passed to the worker in shared
+# memory instead of the task pipe (0 disables it)
+JS_SHARED_MEMORY_THRESHOLD = int(
+    os.environ.get("JS_SHARED_MEMORY_THRESHOLD", str(256 * 1024))
+)
+
+# Number of executions of a template before its timeout is derived from its latency
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 10
+
+# Evaluated JS functions of the worker process, created on the first task
+_worker_functions = None
+
+# JSON.parse wrapper of the worker process, created on the first JSON data
+_json_parse = None
 
-def _eval_js_worker_task(js_code, data):
+
+@lru_cache(maxsize=JS_FUNCTION_CACHE_SIZE)
+def get_code_digest(js_code):
+    """
+    Returns the digest identifying the JavaScript code in the worker function cache.
+
+    :param js_code: JavaScript code
+    :return: hexadecimal SHA-256 digest
+    """
+    return hashlib.sha256(js_code.encode()).hexdigest()
+
+
+def _get_worker_functions():
+    """
+    Returns the cache of the evaluated JS functions of the worker process.
+    """
+    global _worker_functions
+
+    if _worker_functions is None:
+        _worker_functions = LRUCache(JS_FUNCTION_CACHE_SIZE)
+    return _worker_functions
+
+
+def _get_worker_function(js_code, digest):
+    """
+    Returns the evaluated JS function from the worker cache, evaluating it on a miss.
+
+    :param js_code: JavaScript code of the function, can be None if only digest is known
+    :param digest: digest of the code, None disables the caching
+    :return: evaluated JS function or None if it is not cached and the code is missing
+    """
+    import pythonmonkey as pm
+
+    if digest is None:
+        return pm.eval(js_code)
+
+    worker_functions = _get_worker_functions()
+    func = worker_functions.get(digest)
+    if func is None and js_code is not None:
+        func = pm.eval(js_code)
+        worker_functions.put(digest, func)
+    return func
+
+
+def _parse_json(text):
+    """
+    Parses the JSON text into a JS object in the worker process.
+
+    PythonMonkey passes None as undefined, so null values are parsed as undefined
+    to render the templates the same way as with the Python objects.
+
+    :param text: JSON text
+    :return: parsed JS value
+    """
+    global _json_parse
+
+    import pythonmonkey as pm
+
+    if _json_parse is None:
+        _json_parse = pm.eval(
+            "(function (text, nulls) {"
+            "return nulls ? JSON.parse(text, (key, value) => "
+            "value === null ? undefined : value) : JSON.parse(text);})"
+        )
+    # The reviver slows down the parsing, it is not needed without any null
+    return _json_parse(text, "null" in text)
+
+
+class JsonData:
+    """
+    Template data serialized as JSON for the worker process, passed either as
+    the text or as the name of the shared memory block holding the encoded text.
+
+    The data is parsed at most once in the worker, so the tasks of a batch sharing
+    the same JsonData object (e.g. the templates of one report) share the JS object.
+    """
+
+    __slots__ = ("text", "shm_name", "size", "_value")
+
+    def __init__(self, text=None, shm_name=None, size=0):
+        """
+        :param text: JSON text, None if the data is in shared memory
+        :param shm_name: name of the shared memory block with the UTF-8 encoded text
+        :param size: size of the encoded text in the shared memory block
+        """
+        self.text = text
+        self.shm_name = shm_name
+        self.size = size
+        self._value = None
+
+    def __getstate__(self):
+        return self.text, self.shm_name, self.size
+
+    def __setstate__(self, state):
+        self.text, self.shm_name, self.size = state
+        self._value = None
+
+    def read_text(self):
+        """
+        Returns the JSON text, reading it from the shared memory if needed.
+        """
+        if self.text is not None:
+            return self.text
+        block = SharedMemory(self.shm_name)
+        try:
+            return bytes(block.buf[: self.size]).decode()
+        finally:
+            block.close()
+
+    def load(self):
+        """
+        Returns the data parsed into a JS object, in the worker process.
+        """
+        if self._value is None:
+            self._value = _parse_json(self.read_text())
+        return self._value
+
+
+def encode_data(data, shared_memory_threshold=JS_SHARED_MEMORY_THRESHOLD):
+    """
+    Serializes the template data as JSON for the worker process.
+
+    The caller owns the returned shared memory block and must close and unlink it
+    after the worker has finished the task.
+
+    :param data: JSON serializable template data
+    :param shared_memory_threshold: size in bytes of the encoded data above which it
+                                    is put into shared memory (0 disables it)
+    :return: tuple of the JsonData and the SharedMemory block or None
+    """
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if shared_memory_threshold <= 0 or len(text) < shared_memory_threshold:
+        # Each character takes at least one byte, a shorter text cannot exceed it
+        return JsonData(text), None
+    encoded = text.encode()
+    if len(encoded) < shared_memory_threshold:
+        return JsonData(text), None
+    block = SharedMemory(create=True, size=len(encoded))
+    block.buf[: len(encoded)] = encoded
+    js_ipc_payload_bytes.labels("shared_memory").observe(len(encoded))
+    return JsonData(shm_name=block.name, size=len(encoded)), block
+
+
+def release_shared_memory(blocks):
+    """
+    Closes and unlinks the shared memory blocks created by encode_data.
+    """
+    for block in blocks:
+        block.close()
+        with contextlib.suppress(FileNotFoundError):
+            block.unlink()
+
+
+def _eval_js_worker_task(js_code, data, digest=None):
     """
     Execute JavaScript in a worker process.
     This function is called by pool workers and returns the result directly.
 
-    :param js_code: JavaScript code to execute
-    :param data: Data to pass to the JavaScript function
-    :return: Tuple of (status, result) where status is 'success' or 'error'
+    If the digest is given, the evaluated function is cached in the worker and
+    the code can be omitted in the following tasks.
+
+    :param js_code: JavaScript code to execute, can be None if the digest is given
+    :param data: Data to pass to the JavaScript function or its JsonData
+    :param digest: Digest of the JavaScript code
+    :return: Tuple of (status, result) where status is 'success', 'error' or
+             'missing' (the digest is not cached and the code was not sent)
     """
     try:
-        import pythonmonkey as pm
         from pythonmonkey import SpiderMonkeyError
 
-        func = pm.eval(js_code)
+        func = _get_worker_function(js_code, digest)
+        if func is None:
+            return ("missing", digest)
+        if isinstance(data, JsonData):
+            data = data.load()
         result = func(data)
         # Convert to native Python string to avoid pickling issues
         # PythonMonkey returns JS strings that can't be pickled
@@ -37,99 +286,752 @@ def _eval_js_worker_task(js_code, data):
         import traceback
 
         return ("error", f"JavaScript error: {str(e)}\n{traceback.format_exc()}")
-    except (TypeError, AttributeError, ValueError) as e:
-        # Python-side errors (invalid arguments, etc.)
+    except (TypeError, AttributeError, ValueError, OSError) as e:
+        # Python-side errors (invalid arguments, missing shared memory, etc.)
         import traceback
 
         return ("error", f"Python error: {str(e)}\n{traceback.format_exc()}")
 
 
+def get_rss():
+    """
+    Returns the resident set size of the current process.
+
+    :return: resident memory in bytes
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # The peak resident memory (in KiB) where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _eval_js_worker_batch(tasks):
+    """
+    Execute a batch of JavaScript tasks in a worker process.
+
+    If the worker memory exceeds JS_WORKER_GC_RSS_MB after the batch, the JS garbage
+    collector is run before measuring it again.
+
+    :param tasks: List of (js_code, data, digest) tuples, see _eval_js_worker_task
+    :return: Tuple with the list of (status, result) tuples and the list of durations
+             of the tasks in seconds, both in the order of the tasks, and the resident
+             memory of the worker in bytes
+    """
+    results = []
+    durations = []
+    for js_code, data, digest in tasks:
+        start = time.perf_counter()
+        results.append(_eval_js_worker_task(js_code, data, digest))
+        durations.append(time.perf_counter() - start)
+
+    rss = get_rss()
+    if 0 < JS_WORKER_GC_RSS_MB * 2**20 < rss:
+        import pythonmonkey as pm
+
+        pm.collect()
+        rss = get_rss()
+    return results, durations, rss
+
+
+def get_bundle_source(tasks):
+    """
+    Returns the JS code of an object with the functions by their digests,
+    so all functions can be evaluated at once.
+
+    :param tasks: List of (js_code, digest) pairs
+    :return: JavaScript code
+    """
+    members = ",".join(f"{json.dumps(digest)}:{js_code}" for js_code, digest in tasks)
+    return f"({{{members}}})"
+
+
+def _warm_up_worker(tasks):
+    """
+    Initialize PythonMonkey in a worker process and evaluate the JS functions
+    into the worker cache.
+
+    The functions are evaluated in one pm.eval. If it fails, they are evaluated
+    one by one so only the failing ones are left out.
+
+    :param tasks: List of (js_code, digest) pairs
+    :return: List of digests of the evaluated functions
+    """
+    import pythonmonkey as pm
+    from pythonmonkey import SpiderMonkeyError
+
+    # Render an empty template, so the first request does not initialize SpiderMonkey
+    pm.eval("(function anonymous(pydata) {var out='';return out;})")({})
+
+    evaluated = []
+    if tasks:
+        try:
+            functions = pm.eval(get_bundle_source(tasks))
+        except SpiderMonkeyError as e:
+            log.warning("Failed to evaluate the bundle of JavaScript functions: %s", e)
+        else:
+            worker_functions = _get_worker_functions()
+            for _, digest in tasks:
+                worker_functions.put(digest, functions[digest])
+            return [digest for _, digest in tasks]
+
+    for js_code, digest in tasks:
+        try:
+            _get_worker_function(js_code, digest)
+        except SpiderMonkeyError as e:
+            log.warning("Failed to evaluate JavaScript function %s: %s", digest, e)
+            continue
+        evaluated.append(digest)
+    return evaluated
+
+
+def _observe_batch(submitted, durations):
+    """
+    Observes the time the batch spent executing in the worker and the rest of its
+    latency, which is spent in the worker queue and in transfer.
+
+    :param submitted: value of time.perf_counter when the batch was submitted
+    :param durations: durations of the tasks of the batch returned by the worker
+    """
+    execution = sum(durations)
+    js_task_execution_seconds.observe(execution)
+    js_task_wait_seconds.observe(max(time.perf_counter() - submitted - execution, 0))
+
+
+class LatencyHistory:
+    """
+    Exponentially weighted moving average and variance of the latencies of each
+    template. The number of tracked templates is bounded.
+
+    Concurrent records of the same template may lose one of the samples, which
+    does not matter for the estimate.
+    """
+
+    def __init__(self, maxsize=JS_FUNCTION_CACHE_SIZE, alpha=0.1):
+        """
+        Initialize an empty history.
+
+        :param maxsize: maximal number of tracked templates
+        :param alpha: weight of the latest sample
+        """
+        self.alpha = alpha
+        self._stats = LRUCache(maxsize)
+
+    def record(self, key, latency):
+        """
+        Adds the latency sample of the template.
+
+        :param key: key identifying the template
+        :param latency: latency in seconds
+        """
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = (latency, 0.0, 1)
+        else:
+            mean, variance, count = stats
+            diff = latency - mean
+            increment = self.alpha * diff
+            stats = (
+                mean + increment,
+                (1 - self.alpha) * (variance + diff * increment),
+                count + 1,
+            )
+        self._stats.put(key, stats)
+
+    def estimate(self, key, min_samples=ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        """
+        Returns the typical latency of the template as the average increased
+        by three standard deviations.
+
+        :param key: key identifying the template
+        :param min_samples: minimal number of samples needed for the estimate
+        :return: latency in seconds or None if the template has too few samples
+        """
+        stats = self._stats.get(key)
+        if stats is None or stats[2] < min_samples:
+            return None
+        mean, variance, _ = stats
+        return mean + 3 * math.sqrt(variance)
+
+
 class JsExecutor:
     """
     Manages a process pool for executing JavaScript code in isolated processes.
 
     This class provides a singleton-style process pool that is lazily initialized
-    on first use. Each uvicorn worker gets its own pool with a single worker process.
+    on first use. Each uvicorn worker gets its own pool of JS_POOL_SIZE worker
+    processes, which can grow up to JS_POOL_MAX_SIZE when the workers are busy.
+
+    The executor remembers which functions each worker has already evaluated and
+    sends only their digest instead of the whole code.
     """
 
-    def __init__(self):
-        """Initialize the JsExecutor with no process pool (lazy initialization)."""
+    def __init__(
+        self,
+        pool_size=None,
+        max_pool_size=None,
+        data_transport=None,
+        shared_memory_threshold=None,
+    ):
+        """
+        Initialize the JsExecutor with no process pool (lazy initialization).
+
+        :param pool_size: Minimal number of worker processes (default: JS_POOL_SIZE)
+        :param max_pool_size: Maximal number of worker processes
+                              (default: JS_POOL_MAX_SIZE)
+        :param data_transport: Transport of the template data, "python" or "json"
+                               (default: JS_DATA_TRANSPORT)
+        :param shared_memory_threshold: Size in bytes of the JSON data passed in
+                                        shared memory, 0 disables it
+                                        (default: JS_SHARED_MEMORY_THRESHOLD)
+        """
         self._process_pool = None
         self._pool_lock = mp.Lock()
         self._timeout = 5  # Default timeout in seconds
+        self._pool_size = pool_size or JS_POOL_SIZE
+        self._max_pool_size = max_pool_size or JS_POOL_MAX_SIZE
+        self._data_transport = data_transport or JS_DATA_TRANSPORT
+        if self._data_transport not in ("python", "json"):
+            raise ValueError(f"Unknown JS data transport: {self._data_transport}")
+        if shared_memory_threshold is None:
+            shared_memory_threshold = JS_SHARED_MEMORY_THRESHOLD
+        self._shared_memory_threshold = shared_memory_threshold
+        # Digests of the functions most likely cached by each worker
+        self._worker_digests = weakref.WeakKeyDictionary()
+        # Timeouts of the templates overriding the default one by their digests
+        self._template_timeouts = {}
+        self._latencies = LatencyHistory(JS_FUNCTION_CACHE_SIZE)
 
     def get_pool(self):
         """
         Get or create the process pool for JavaScript execution.
         Uses lazy initialization to avoid creating processes during module import.
 
-        Uses a single worker process because the purpose of the executor is to isolate
-        the monkeypython usage, not parallel processing.
-
         :return: The process pool instance
         """
         if self._process_pool is None:
             with self._pool_lock:
                 # Double-check pattern to avoid race conditions
                 if self._process_pool is None:
-                    log.info("Initializing JavaScript worker process")
+                    log.info("Initializing JavaScript worker processes")
 
-                    # Use spawn method to avoid inheriting FastAPI context
-                    ctx = mp.get_context("spawn")
-                    # Restart worker after 1000 tasks to prevent SpiderMonkey memory leak
-                    # from pm.eval() accumulating compiled JavaScript functions
-                    self._process_pool = ctx.Pool(processes=1, maxtasksperchild=1000)
+                    # Use spawn method to avoid inheriting FastAPI context.
+                    # The workers are recycled by their memory, see _check_worker_memory
+                    self._process_pool = WorkerPool(
+                        size=self._pool_size,
+                        max_size=self._max_pool_size,
+                        scale_up_queue_depth=JS_POOL_SCALE_UP_QUEUE_DEPTH,
+                        idle_timeout=JS_POOL_IDLE_TIMEOUT,
+                        context="spawn",
+                    )
 
-                    log.info("JavaScript worker process initialized successfully")
+                    log.info("JavaScript worker processes initialized successfully")
 
         return self._process_pool
 
+    @property
+    def queue_depth(self):
+        """Number of batches queued or running in the worker processes."""
+        pool = self._process_pool
+        return pool.queue_depth if pool is not None else 0
+
+    @property
+    def worker_count(self):
+        """Number of the worker processes."""
+        pool = self._process_pool
+        return len(pool.workers) if pool is not None else 0
+
+    def set_template_timeout(self, js_code, timeout):
+        """
+        Override the timeout of the template.
+
+        :param js_code: JavaScript code of the template function
+        :param timeout: Timeout in seconds, None removes the override
+        """
+        digest = get_code_digest(js_code)
+        if timeout is None:
+            self._template_timeouts.pop(digest, None)
+        else:
+            self._template_timeouts[digest] = timeout
+
+    def get_template_timeout(self, js_code):
+        """
+        Returns the timeout of the template: the overridden one, the one derived
+        from the latency history of the template, or the default one.
+
+        The adaptive timeout is never longer than the default one.
+
+        :param js_code: JavaScript code of the template function
+        :return: Timeout in seconds
+        """
+        digest = get_code_digest(js_code)
+        timeout = self._template_timeouts.get(digest)
+        if timeout is not None:
+            return timeout
+        if JS_ADAPTIVE_TIMEOUT:
+            latency = self._latencies.estimate(digest)
+            if latency is not None:
+                return min(
+                    max(latency * JS_ADAPTIVE_TIMEOUT_FACTOR, JS_ADAPTIVE_TIMEOUT_MIN),
+                    self._timeout,
+                )
+        return self._timeout
+
+    def warm_up(self, js_codes=(), timeout=None):
+        """
+        Start the worker processes and evaluate the JS functions in each of them,
+        so the first requests do not wait for the spawn of the workers, the import
+        of PythonMonkey and the evaluation of the functions.
+
+        :param js_codes: JavaScript code of the functions to be evaluated
+        :param timeout: Timeout in seconds for each worker (default: JS_BATCH_TIMEOUT)
+        :return: Number of the warmed up workers
+        :raises TimeoutError: If a worker does not finish the warm-up in time
+        """
+        if timeout is None:
+            timeout = JS_BATCH_TIMEOUT
+        tasks = [
+            (js_code, get_code_digest(js_code)) for js_code in dict.fromkeys(js_codes)
+        ]
+
+        pool = self.get_pool()
+        futures = [
+            pool.submit(_warm_up_worker, (tasks,), worker) for worker in pool.workers
+        ]
+        for future in futures:
+            evaluated = self._wait(future, timeout)
+            worker_digests = self._get_worker_digests(future.worker)
+            for digest in evaluated:
+                worker_digests.put(digest, True)
+        log.info(
+            "Warmed up %d JavaScript workers with %d functions",
+            len(futures),
+            len(tasks),
+        )
+        return len(futures)
+
+    def _get_worker_digests(self, worker):
+        """
+        Returns the digests of the functions most likely cached by the worker.
+        """
+        digests = self._worker_digests.get(worker)
+        if digests is None:
+            digests = self._worker_digests.setdefault(
+                worker, LRUCache(JS_FUNCTION_CACHE_SIZE)
+            )
+        return digests
+
+    def _check_worker_memory(self, pool, worker, rss):
+        """
+        Recycles the worker if its resident memory exceeds JS_WORKER_MAX_RSS_MB.
+        The worker exits after finishing its queued tasks and a new one is spawned.
+        """
+        if 0 < JS_WORKER_MAX_RSS_MB * 2**20 < rss and pool.retire_worker(worker):
+            js_worker_recycles.inc()
+            log.info(
+                "Recycling JavaScript worker process %s using %d MiB of memory",
+                worker.pid,
+                rss // 2**20,
+            )
+
+    def submit_batch(self, jobs):
+        """
+        Submit a list of JavaScript functions to a worker process without waiting.
+
+        Each job is a (js_code, data) pair. The code of each distinct function is sent
+        at most once and only if the worker has not evaluated it already. If the worker
+        does not have some of the functions (e.g. it has been replaced), the affected
+        jobs are submitted once more with the code before the future is resolved.
+
+        With the JSON transport, each distinct data object of the batch is serialized
+        once and the shared memory blocks are released when the future is resolved.
+        The callers on the event loop use submit_batch_async, so the data is encoded
+        in a thread.
+
+        The future has the task_future attribute with the future of the task
+        currently running the jobs in the pool.
+
+        :param jobs: List of (js_code, data) pairs
+        :return: Future with the list of (status, result) tuples in the order
+                 of the jobs, status is 'success' or 'error'
+        """
+        pool = self.get_pool()
+        worker = pool.select_worker()
+        worker_digests = self._get_worker_digests(worker)
+
+        digests = {}
+        encoded = {}
+        blocks = []
+        tasks = []
+        for js_code, data in jobs:
+            if self._data_transport == "json":
+                # The templates of a report share its details object
+                if id(data) not in encoded:
+                    encoded[id(data)], block = encode_data(
+                        data, self._shared_memory_threshold
+                    )
+                    if block is not None:
+                        blocks.append(block)
+                data = encoded[id(data)]
+            if js_code not in digests:
+                digest = get_code_digest(js_code)
+                digests[js_code] = digest
+                # The first task with the code makes the worker evaluate it
+                sent_code = None if digest in worker_digests else js_code
+            else:
+                digest = digests[js_code]
+                sent_code = None
+            tasks.append((sent_code, data, digest))
+
+        batch_future = Future()
+        if blocks:
+            batch_future.add_done_callback(lambda _: release_shared_memory(blocks))
+
+        def remember_digests(results, durations, indexes, worker_digests):
+            for i, duration in zip(indexes, durations, strict=True):
+                if results[i][0] == "success":
+                    worker_digests.put(tasks[i][2], True)
+                    self._latencies.record(tasks[i][2], duration)
+
+        def on_batch_done(future):
+            try:
+                results, durations, rss = future.result()
+            except BaseException as exc:
+                resolve_future(batch_future, False, exc)
+                return
+
+            _observe_batch(submitted, durations)
+            # The task may have run in another worker than the selected one
+            self._check_worker_memory(pool, future.worker, rss)
+            remember_digests(
+                results,
+                durations,
+                range(len(results)),
+                self._get_worker_digests(future.worker),
+            )
+            missing = [
+                i for i, (status, _) in enumerate(results) if status == "missing"
+            ]
+            if not missing:
+                resolve_future(batch_future, True, results)
+                return
+
+            # The worker has been replaced or it has evicted some of the functions
+            retried_tasks = []
+            resent_digests = set()
+            for i in missing:
+                js_code = jobs[i][0]
+                _, data, digest = tasks[i]
+                sent_code = None if digest in resent_digests else js_code
+                resent_digests.add(digest)
+                retried_tasks.append((sent_code, data, digest))
+
+            def on_retry_done(future):
+                try:
+                    retried_results, retried_durations, rss = future.result()
+                except BaseException as exc:
+                    resolve_future(batch_future, False, exc)
+                    return
+
+                _observe_batch(retry_submitted, retried_durations)
+                self._check_worker_memory(pool, future.worker, rss)
+                for i, result in zip(missing, retried_results, strict=True):
+                    if result[0] == "missing":
+                        # The worker has been replaced again while retrying the job
+                        result = ("error", "JavaScript function was not evaluated")
+                    results[i] = result
+                remember_digests(
+                    results,
+                    retried_durations,
+                    missing,
+                    self._get_worker_digests(future.worker),
+                )
+                resolve_future(batch_future, True, results)
+
+            try:
+                retry_submitted = time.perf_counter()
+                retry_future = pool.submit(_eval_js_worker_batch, (retried_tasks,))
+            except ValueError as exc:
+                # The pool has been terminated in the meantime
+                resolve_future(batch_future, False, exc)
+                return
+            batch_future.task_future = retry_future
+            retry_future.add_done_callback(on_retry_done)
+
+        submitted = time.perf_counter()
+        try:
+            batch_future.task_future = pool.submit(
+                _eval_js_worker_batch, (tasks,), worker
+            )
+        except BaseException:
+            release_shared_memory(blocks)
+            raise
+        batch_future.task_future.add_done_callback(on_batch_done)
+        return batch_future
+
+    async def submit_batch_async(self, jobs):
+        """
+        Submit a list of JavaScript functions to a worker process without blocking
+        the event loop: the data of the jobs is encoded and pickled in a thread.
+
+        :param jobs: List of (js_code, data) pairs
+        :return: Future with the list of (status, result) tuples, see submit_batch
+        """
+        return await asyncio.to_thread(self.submit_batch, jobs)
+
+    def _get_batch_timeout(self, jobs, timeout):
+        """
+        Returns the timeout for the batch of jobs: the sum of the timeouts of their
+        templates limited by JS_BATCH_TIMEOUT, but not shorter than the longest
+        timeout of the templates.
+        """
+        if timeout is None:
+            timeouts = [self.get_template_timeout(js_code) for js_code, _ in jobs]
+            timeout = max(
+                min(sum(timeouts), JS_BATCH_TIMEOUT), max(timeouts, default=0)
+            )
+        return timeout
+
+    def _handle_timeout(self, future, timeout, err):
+        """
+        Stop the timed out task and raise TimeoutError.
+        The worker running the task is killed and replaced by a new one.
+        """
+        log.error(f"JavaScript execution timed out after {timeout}s")
+        js_timeouts.inc()
+
+        exception = TimeoutError(f"JavaScript execution timed out after {timeout}s")
+        self._cancel_batch(future, exception)
+        raise exception from err
+
+    def _cancel_batch(self, future, exception):
+        """
+        Stop the task running the batch. A queued task is skipped by its worker,
+        the worker running the task is killed and replaced by a new one.
+        """
+        pool = self._process_pool
+        task_future = getattr(future, "task_future", None)
+        if pool is not None and task_future is not None:
+            pool.cancel_task(task_future, exception)
+
+    def _wait(self, future, timeout):
+        """
+        Wait for the result of the task submitted to the worker process.
+
+        :param future: Future of the submitted task
+        :param timeout: Timeout in seconds
+        :return: The value returned by the task
+        :raises TimeoutError: If execution exceeds timeout
+        """
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError as err:
+            self._handle_timeout(future, timeout, err)
+
+    async def _wait_async(self, future, timeout):
+        """
+        Await the result of the task submitted to the worker process
+        without blocking the event loop.
+
+        :param future: Future of the submitted task
+        :param timeout: Timeout in seconds
+        :return: The value returned by the task
+        :raises TimeoutError: If execution exceeds timeout
+        """
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except TimeoutError as err:
+            self._handle_timeout(future, timeout, err)
+
+    @staticmethod
+    def _get_single_result(results):
+        status, result = results[0]
+        if status == "error":
+            raise RuntimeError(f"JavaScript execution failed: {result}")
+        return result
+
     def execute(self, js_code, data, timeout=None):
         """
         Execute JavaScript code with the given data in a worker process.
 
-        Note: If execution times out, the worker process may still be running.
-        The pool will be terminated and recreated to prevent resource leaks.
+        Note: If execution times out, the worker process running it is killed
+        and replaced, the tasks of the other workers keep running.
 
         :param js_code: JavaScript code to execute (should be a function)
         :param data: Data to pass to the JavaScript function
-        :param timeout: Timeout in seconds (default: 5)
+        :param timeout: Timeout in seconds (default: timeout of the template)
         :return: The result of the JavaScript execution as a string
         :raises TimeoutError: If execution exceeds timeout
         :raises RuntimeError: If JavaScript execution fails
         """
-        if timeout is None:
-            timeout = self._timeout
+        jobs = [(js_code, data)]
+        timeout = self._get_batch_timeout(jobs, timeout)
+        future = self.submit_batch(jobs)
+        return self._get_single_result(self._wait(future, timeout))
 
-        try:
-            # Get the process pool (creates it on first call)
-            pool = self.get_pool()
+    async def execute_async(self, js_code, data, timeout=None):
+        """
+        Execute JavaScript code with the given data in a worker process
+        without blocking the event loop.
 
-            # Submit task to pool with timeout
-            # Using apply_async allows us to set a timeout without blocking other requests
-            async_result = pool.apply_async(_eval_js_worker_task, args=(js_code, data))
+        :param js_code: JavaScript code to execute (should be a function)
+        :param data: Data to pass to the JavaScript function
+        :param timeout: Timeout in seconds (default: timeout of the template)
+        :return: The result of the JavaScript execution as a string
+        :raises TimeoutError: If execution exceeds timeout
+        :raises RuntimeError: If JavaScript execution fails
+        """
+        jobs = [(js_code, data)]
+        timeout = self._get_batch_timeout(jobs, timeout)
+        future = await self.submit_batch_async(jobs)
+        return self._get_single_result(await self._wait_async(future, timeout))
 
-            # Wait for result with timeout
-            status, result = async_result.get(timeout=timeout)
+    def execute_batch(self, jobs, timeout=None):
+        """
+        Execute a list of JavaScript functions in a worker process in one exchange.
 
-            if status == "error":
-                raise RuntimeError(f"JavaScript execution failed: {result}")
+        :param jobs: List of (js_code, data) pairs
+        :param timeout: Timeout in seconds for the whole batch
+                        (default: sum of the timeouts of the templates,
+                        limited by JS_BATCH_TIMEOUT)
+        :return: List of (status, result) tuples in the order of the jobs,
+                 status is 'success' or 'error'
+        :raises TimeoutError: If execution of the batch exceeds timeout
+        """
+        if not jobs:
+            return []
+        future = self.submit_batch(jobs)
+        return self._wait(future, self._get_batch_timeout(jobs, timeout))
 
-            return result
+    async def execute_batch_async(self, jobs, timeout=None):
+        """
+        Execute a list of JavaScript functions in a worker process in one exchange
+        without blocking the event loop.
 
-        except mp.TimeoutError as err:
-            log.error(
-                f"JavaScript execution timed out after {timeout}s, recreating pool"
+        :param jobs: List of (js_code, data) pairs
+        :param timeout: Timeout in seconds for the whole batch
+                        (default: sum of the timeouts of the templates,
+                        limited by JS_BATCH_TIMEOUT)
+        :return: List of (status, result) tuples in the order of the jobs,
+                 status is 'success' or 'error'
+        :raises TimeoutError: If execution of the batch exceeds timeout
+        """
+        if not jobs:
+            return []
+        future = await self.submit_batch_async(jobs)
+        return await self._wait_async(future, self._get_batch_timeout(jobs, timeout))
+
+    def execute_batches(self, batches, timeout=None, deadline=None):
+        """
+        Execute the batches of JavaScript functions in parallel, each of them
+        in the least loaded worker process.
+
+        The batches not finished by the deadline are cancelled: the queued ones are
+        dropped and the workers running the others are replaced.
+
+        :param batches: List of lists of (js_code, data) pairs
+        :param timeout: Timeout in seconds for each batch since its submission
+                        (default: see execute_batch)
+        :param deadline: Value of time.monotonic after which the results of the batches
+                         are not needed any more (default: no deadline)
+        :return: List of the lists of (status, result) tuples of the batches,
+                 None for the batches not finished by the deadline
+        :raises TimeoutError: If execution of any batch exceeds its timeout, the other
+                              batches are cancelled
+        """
+        submitted = []
+        for jobs in batches:
+            batch_timeout = self._get_batch_timeout(jobs, timeout)
+            future = None
+            if jobs and (deadline is None or time.monotonic() < deadline):
+                future = self.submit_batch(jobs)
+            submitted.append(
+                (jobs, future, time.monotonic() + batch_timeout, batch_timeout)
             )
 
-            # Terminate the pool to kill a hung worker
-            if self._process_pool is not None:
-                self._process_pool.terminate()
-                self._process_pool = None
+        results = []
+        for jobs, future, batch_deadline, batch_timeout in submitted:
+            if future is None:
+                results.append(None if jobs else [])
+                continue
+            wait_until = batch_deadline
+            if deadline is not None:
+                wait_until = min(wait_until, deadline)
+            try:
+                results.append(
+                    future.result(timeout=max(wait_until - time.monotonic(), 0))
+                )
+            except TimeoutError as err:
+                if wait_until == batch_deadline:
+                    # The request fails, the results of its other batches are not
+                    # needed any more
+                    for _, other_future, _, _ in submitted:
+                        if other_future not in (None, future):
+                            self._cancel_batch(
+                                other_future,
+                                TimeoutError("Another batch of the request timed out"),
+                            )
+                    self._handle_timeout(future, batch_timeout, err)
+                self._cancel_batch(future, TimeoutError("Request deadline exceeded"))
+                results.append(None)
+        return results
+
+    async def execute_batches_async(self, batches, timeout=None, deadline=None):
+        """
+        Execute the batches of JavaScript functions in parallel, each of them
+        in the least loaded worker process, without blocking the event loop.
+
+        :param batches: List of lists of (js_code, data) pairs
+        :param timeout: Timeout in seconds for each batch (default: see execute_batch)
+        :param deadline: Value of time.monotonic after which the results of the batches
+                         are not needed any more (default: no deadline)
+        :return: List of the lists of (status, result) tuples of the batches,
+                 None for the batches not finished by the deadline
+        :raises TimeoutError: If execution of any batch exceeds its timeout, the other
+                              batches are cancelled
+        """
+        submitted = []
+        failed = False
 
-            raise TimeoutError(
-                f"JavaScript execution timed out after {timeout}s"
-            ) from err
+        async def execute(jobs):
+            if not jobs:
+                return []
+            batch_timeout = wait = self._get_batch_timeout(jobs, timeout)
+            if deadline is not None:
+                wait = min(batch_timeout, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            future = await self.submit_batch_async(jobs)
+            if failed:
+                self._cancel_batch(
+                    future, TimeoutError("Another batch of the request timed out")
+                )
+                return None
+            submitted.append(future)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), wait)
+            except TimeoutError as err:
+                if failed:
+                    # The batch has been cancelled because another one timed out
+                    return None
+                if wait == batch_timeout:
+                    self._handle_timeout(future, batch_timeout, err)
+                self._cancel_batch(future, TimeoutError("Request deadline exceeded"))
+                return None
+
+        try:
+            return await asyncio.gather(*(execute(jobs) for jobs in batches))
+        except TimeoutError:
+            # The request fails, the results of its other batches are not needed
+            # any more
+            failed = True
+            for future in submitted:
+                if not future.done():
+                    self._cancel_batch(
+                        future, TimeoutError("Another batch of the request timed out")
+                    )
+            raise
 
     def shutdown(self):
         """
@@ -162,3 +1064,7 @@ def shutdown_js_executor():
     executor = get_js_executor()
     executor.shutdown()
     get_js_executor.cache_clear()
+
+
+js_queue_depth.set_function(lambda: get_js_executor().queue_depth)
+js_workers.set_function(lambda: get_js_executor().worker_count)
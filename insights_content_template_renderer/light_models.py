@@ -0,0 +1,228 @@
+"""
+Lightweight validation of the renderer request for trusted callers.
+
+The request is checked only for the fields read by the rendering and parsed into
+plain classes with __slots__ instead of the models: the fields the rendering does
+not read (e.g. generic, summary, more_info, HasReason of the content or type of
+the reports) are neither required nor kept, and the details of the reports are not
+copied. The parsed request can be passed wherever RendererRequest is rendered.
+"""
+
+import math
+
+
+class LightValidationError(ValueError):
+    """
+    Exception raised if the request lacks a field read by the rendering.
+    """
+
+
+class LightContent:
+    """
+    Content of a rule with the fields read by the rendering, see Content.
+    """
+
+    __slots__ = ("plugin", "error_keys", "resolution", "reason")
+
+    def __init__(self, plugin, error_keys, resolution, reason):
+        self.plugin = plugin
+        self.error_keys = error_keys
+        self.resolution = resolution
+        self.reason = reason
+
+
+class LightReport:
+    """
+    Report with the fields read by the rendering, see Report.
+    """
+
+    __slots__ = ("component", "key", "details")
+
+    def __init__(self, component, key, details):
+        self.component = component
+        self.key = key
+        self.details = details
+
+
+class LightReportPerCluster:
+    """
+    Reports of a cluster, see ReportPerCluster.
+    """
+
+    __slots__ = ("reports",)
+
+    def __init__(self, reports):
+        self.reports = reports
+
+
+class LightReportData:
+    """
+    Report data of the request, see ReportData.
+    """
+
+    __slots__ = ("clusters", "reports")
+
+    def __init__(self, clusters, reports):
+        self.clusters = clusters
+        self.reports = reports
+
+
+class LightRendererRequest:
+    """
+    Renderer request, see RendererRequest.
+    """
+
+    __slots__ = ("content", "content_version", "report_data", "timeout")
+
+    def __init__(self, content, content_version, report_data, timeout):
+        self.content = content
+        self.content_version = content_version
+        self.report_data = report_data
+        self.timeout = timeout
+
+
+def get_field(data: dict, name: str, field_type, location: str):
+    """
+    Returns the value of the field checked for its type.
+
+    :param data: dictionary with the field
+    :param name: name of the field
+    :param field_type: expected type or tuple of types of the value
+    :param location: location of the dictionary in the request for the error message
+    :return: value of the field
+    :raises LightValidationError: If the field is missing or has another type
+    """
+    try:
+        value = data[name]
+    except KeyError:
+        raise LightValidationError(f"{location}{name}: field required") from None
+    # bool is an int, but not a valid number of seconds or a string
+    if not isinstance(value, field_type) or isinstance(value, bool):
+        types = field_type if isinstance(field_type, tuple) else (field_type,)
+        raise LightValidationError(
+            f"{location}{name}: expected {' or '.join(t.__name__ for t in types)}"
+        )
+    return value
+
+
+def check_dict(value, location: str) -> dict:
+    """
+    Checks that the value is a dictionary.
+
+    :raises LightValidationError: If the value is not a dictionary
+    """
+    if not isinstance(value, dict):
+        raise LightValidationError(f"{location}: expected dict")
+    return value
+
+
+def parse_light_content(data) -> list[LightContent]:
+    """
+    Parses the content of the request.
+
+    :param data: list with content data for all rules
+    :return: list of the parsed rules
+    :raises LightValidationError: If a rule lacks a field read by the rendering
+    """
+    if not isinstance(data, list):
+        raise LightValidationError("content: expected list")
+    content = []
+    for index, rule in enumerate(data):
+        location = f"content.{index}."
+        check_dict(rule, location[:-1])
+        plugin = get_field(rule, "plugin", dict, location)
+        get_field(plugin, "python_module", str, f"{location}plugin.")
+        content.append(
+            LightContent(
+                plugin,
+                get_field(rule, "error_keys", dict, location),
+                get_field(rule, "resolution", str, location),
+                get_field(rule, "reason", str, location),
+            )
+        )
+    return content
+
+
+def check_report(report, location: str):
+    """
+    Checks the fields of the report read by the rendering.
+
+    :param report: dictionary with the report
+    :param location: location of the report in the request for the error message
+    :raises LightValidationError: If the report lacks a field read by the rendering
+    """
+    check_dict(report, location[:-1])
+    for name, field_type in (("component", str), ("key", str), ("details", dict)):
+        get_field(report, name, field_type, location)
+
+
+def parse_light_reports(data, location: str) -> LightReportPerCluster:
+    """
+    Parses the reports of a cluster.
+
+    :param data: dictionary with the reports of the cluster
+    :param location: location of the reports in the request for the error message
+    :return: parsed reports of the cluster
+    :raises LightValidationError: If a report lacks a field read by the rendering
+    """
+    check_dict(data, location)
+    reports = []
+    for index, report in enumerate(get_field(data, "reports", list, f"{location}.")):
+        # The valid reports are checked inline, the location is formatted
+        # only for the error message of the invalid ones
+        if not (
+            type(report) is dict
+            and type(report.get("component")) is str
+            and type(report.get("key")) is str
+            and type(report.get("details")) is dict
+        ):
+            check_report(report, f"{location}.reports.{index}.")
+        reports.append(
+            LightReport(report["component"], report["key"], report["details"])
+        )
+    return LightReportPerCluster(reports)
+
+
+def parse_light_request(data) -> LightRendererRequest:
+    """
+    Parses the renderer request checking only the fields read by the rendering.
+
+    :param data: request decoded from JSON
+    :return: parsed request
+    :raises LightValidationError: If the request lacks a field read by the rendering
+    """
+    check_dict(data, "request")
+    content = data.get("content")
+    content_version = data.get("content_version")
+    if (content is None) == (content_version is None):
+        raise LightValidationError(
+            "exactly one of content and content_version is required"
+        )
+    if content is not None:
+        content = parse_light_content(content)
+    elif not isinstance(content_version, str):
+        raise LightValidationError("content_version: expected str")
+
+    timeout = data.get("timeout")
+    if timeout is not None:
+        timeout = get_field(data, "timeout", (int, float), "")
+        # NaN, infinite or not positive timeouts would disable the deadline
+        if not 0 < timeout < math.inf:
+            raise LightValidationError("timeout: expected positive finite number")
+
+    report_data = get_field(data, "report_data", dict, "")
+    clusters = get_field(report_data, "clusters", list, "report_data.")
+    for index, cluster_id in enumerate(clusters):
+        if not isinstance(cluster_id, str):
+            raise LightValidationError(f"report_data.clusters.{index}: expected str")
+    reports = {
+        cluster_id: parse_light_reports(
+            cluster_data, f"report_data.reports.{cluster_id}"
+        )
+        for cluster_id, cluster_data in get_field(
+            report_data, "reports", dict, "report_data."
+        ).items()
+    }
+    return LightRendererRequest(
+        content, content_version, LightReportData(clusters, reports), timeout
+    )
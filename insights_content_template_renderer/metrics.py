@@ -0,0 +1,159 @@
+"""
+Prometheus metrics of the template rendering.
+
+The metrics are registered in the default registry, so they are exposed
+by the /metrics endpoint together with the HTTP metrics.
+"""
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Compiled templates by their kind: "static" templates not reading the data,
+# "native" templates rendered in-process and "js" templates rendered by the JS worker
+compiled_templates = Counter(
+    "compiled_templates_total",
+    "Number of compiled templates by the engine rendering them",
+    ["engine"],
+)
+
+# Rendered templates by the engine which rendered them, the share of "static"
+# and "native" shows how much traffic to the JS worker is avoided
+rendered_templates = Counter(
+    "rendered_templates_total",
+    "Number of rendered templates by the engine rendering them",
+    ["engine"],
+)
+
+# Lookups of the strings rendered by the JS worker in the render cache by their result
+# ("hit" or "miss"), the hit ratio is hit / (hit + miss)
+render_cache_lookups = Counter(
+    "render_cache_lookups_total",
+    "Number of lookups in the render cache by their result",
+    ["result"],
+)
+
+render_cache_bytes = Gauge(
+    "render_cache_bytes",
+    "Size in bytes of the rendered strings in the render cache",
+)
+
+# Share of the reports of a request which are identical to another report of the
+# request (the same rule, error key and details) and are not rendered again
+report_deduplication_ratio = Histogram(
+    "report_deduplication_ratio",
+    "Share of the reports of a request reused from identical reports",
+    buckets=(0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1),
+)
+
+# Reports left out of the responses because they were not rendered before
+# the deadline of the request
+unrendered_reports = Counter(
+    "unrendered_reports_total",
+    "Number of reports not rendered before the deadline of the request",
+)
+
+# Rendering requests admitted and rejected by the admission control, the rejections
+# by their reason: "too_large", "inflight_requests", "inflight_bytes" or
+# "queued_js_tasks"
+admitted_requests = Counter(
+    "admitted_requests_total",
+    "Number of rendering requests admitted by the admission control",
+)
+
+rejected_requests = Counter(
+    "rejected_requests_total",
+    "Number of rendering requests rejected by the admission control by the reason",
+    ["reason"],
+)
+
+inflight_requests = Gauge(
+    "inflight_requests",
+    "Number of rendering requests being processed",
+)
+
+# The JS executor metrics are observed once per batch of templates sent to the JS
+# worker, not per template, so they do not slow down the rendering
+js_queue_depth = Gauge(
+    "js_queue_depth",
+    "Number of batches queued or running in the JS worker processes",
+)
+
+js_workers = Gauge(
+    "js_workers",
+    "Number of JS worker processes",
+)
+
+js_task_wait_seconds = Histogram(
+    "js_task_wait_seconds",
+    "Seconds a batch spent in the queue of the JS worker and in transfer",
+)
+
+js_task_execution_seconds = Histogram(
+    "js_task_execution_seconds",
+    "Seconds the JS worker spent rendering the templates of a batch",
+)
+
+# Sizes of the pickled tasks sent to the JS workers, of their pickled results
+# and of the JSON data passed to them in shared memory
+js_ipc_payload_bytes = Histogram(
+    "js_ipc_payload_bytes",
+    "Size in bytes of the data sent to and received from the JS workers",
+    ["direction"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float("inf")),
+)
+
+js_worker_spawns = Counter(
+    "js_worker_spawns_total",
+    "Number of spawned JS worker processes",
+)
+
+js_worker_recycles = Counter(
+    "js_worker_recycles_total",
+    "Number of JS worker processes replaced because of their memory use",
+)
+
+js_timeouts = Counter(
+    "js_timeouts_total",
+    "Number of batches of the JS worker that timed out",
+)
+
+
+class CacheCollector:
+    """
+    Collects the counters of the registered caches when the metrics are scraped,
+    so the cache lookups are not slowed down by updating the metrics.
+    """
+
+    def __init__(self):
+        self._caches = {}
+
+    def register(self, name, cache):
+        """
+        Exposes the counters of the cache.
+
+        :param name: value of the cache label of the metrics
+        :param cache: cache with the stats method, see cache.LRUCache
+        """
+        self._caches[name] = cache
+
+    def collect(self):
+        counters = {
+            name: CounterMetricFamily(
+                f"cache_{name}", f"Number of cache {name} by cache", labels=["cache"]
+            )
+            for name in ("hits", "misses", "evictions")
+        }
+        size = GaugeMetricFamily(
+            "cache_size", "Number of items in the cache by cache", labels=["cache"]
+        )
+        for cache_name, cache in self._caches.items():
+            stats = cache.stats()
+            for name, counter in counters.items():
+                counter.add_metric([cache_name], stats[name])
+            size.add_metric([cache_name], stats["size"])
+        yield from counters.values()
+        yield size
+
+
+cache_metrics = CacheCollector()
+REGISTRY.register(cache_metrics)
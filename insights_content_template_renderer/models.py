@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 from insights_content_template_renderer.data import (
     content_example,
@@ -50,6 +50,17 @@ class RenderedReport(BaseModel):
     description: str
 
 
+class UnrenderedReport(BaseModel):
+    cluster: str
+    rule_id: str
+    error_key: str
+
+
+class RenderedCluster(BaseModel):
+    cluster: str
+    reports: list[RenderedReport]
+
+
 class ReportData(BaseModel):
     clusters: list[str]
     reports: dict[str, ReportPerCluster]
@@ -81,16 +92,32 @@ class ReportData(BaseModel):
 
 
 class RendererRequest(BaseModel):
-    content: list[Content]
+    content: list[Content] | None = None
+    content_version: str | None = None
     report_data: ReportData
+    # Seconds after which the reports not rendered yet are listed as unrendered
+    timeout: float | None = Field(None, gt=0, allow_inf_nan=False)
 
     class Config:
         schema_extra = {"example": request_data_example}
 
+    @model_validator(mode="after")
+    def check_content_or_version(self):
+        if (self.content is None) == (self.content_version is None):
+            raise ValueError("exactly one of content and content_version is required")
+        return self
+
+
+class ContentVersion(BaseModel):
+    version: str
+    rules: int
+
 
 class RendererResponse(BaseModel):
     clusters: list[str]
     reports: dict[str, list[RenderedReport]]
+    # Reports not rendered before the deadline, only set with the request timeout
+    unrendered: list[UnrenderedReport] | None = None
 
     class Config:
         schema_extra = {"example": response_data_example}
@@ -0,0 +1,735 @@
+"""
+Pure-Python evaluator of DoT.js templates written in a safe subset of the syntax.
+
+Most of the rule templates only interpolate the report details (`{{=pydata.field}}`),
+test simple conditions (`{{? ...}}`) and iterate over lists (`{{~ ...}}`). Such
+templates are rendered in-process, without the round trip to the JS worker.
+
+The evaluator reproduces the JS function compiled by doT: the template is tokenized
+by the same regular expressions, the tokens are checked to generate exactly the same
+JS code, and the expressions are evaluated with the JS semantics (truthiness, string
+conversion, strict and loose equality, function scoped loop variables). Python None
+stands for JS undefined, as it is converted by PythonMonkey.
+
+A template which does not read its data (e.g. the static text without any tags) is
+rendered once when it is compiled.
+
+A template outside of the subset is rejected when it is compiled, and a template
+that gets data whose JS semantics are not modelled (e.g. string conversion of
+an object) raises UnsupportedTemplateError when it is rendered. In both cases
+the template must be rendered by the JS worker.
+"""
+
+import contextlib
+import decimal
+import math
+import re
+
+import doT
+
+# Largest integer represented exactly by JS numbers
+MAX_SAFE_INTEGER = 2**53 - 1
+
+
+class UnsupportedTemplateError(Exception):
+    """
+    Exception raised if the template or its data are outside of the subset
+    supported by the native evaluator.
+    """
+
+
+class _Null:
+    """
+    JS null, which is distinct from undefined represented by None.
+    """
+
+    def __repr__(self):
+        return "null"
+
+
+NULL = _Null()
+
+LITERALS = {"true": True, "false": False, "null": NULL, "undefined": None}
+
+# Names which cannot be used as loop variables of the iterations, because they are
+# either reserved or they are used by the function generated by doT
+RESERVED_NAMES = {
+    "arguments",
+    "break",
+    "case",
+    "catch",
+    "class",
+    "const",
+    "continue",
+    "debugger",
+    "default",
+    "delete",
+    "do",
+    "else",
+    "enum",
+    "eval",
+    "export",
+    "extends",
+    "finally",
+    "for",
+    "function",
+    "if",
+    "import",
+    "in",
+    "instanceof",
+    "let",
+    "new",
+    "out",
+    "return",
+    "super",
+    "switch",
+    "this",
+    "throw",
+    "try",
+    "typeof",
+    "var",
+    "void",
+    "while",
+    "with",
+    "yield",
+    "Infinity",
+    "NaN",
+    *LITERALS,
+}
+GENERATED_NAME = re.compile(r"(arr|l)\d+")
+IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+
+# Properties inherited from Object.prototype, which the evaluator does not model
+OBJECT_PROTOTYPE_PROPERTIES = {
+    "__defineGetter__",
+    "__defineSetter__",
+    "__lookupGetter__",
+    "__lookupSetter__",
+    "__proto__",
+    "constructor",
+    "hasOwnProperty",
+    "isPrototypeOf",
+    "propertyIsEnumerable",
+    "toLocaleString",
+    "toString",
+    "valueOf",
+}
+
+EXPRESSION_TOKEN = re.compile(
+    r"\s*(?:"
+    r"(?P<number>(?:0|[1-9]\d*)(?:\.\d+)?)(?![\w$])"
+    r"|(?P<string>'[^'\\\n]*'|\"[^\"\\\n]*\")"
+    r"|(?P<name>[A-Za-z_$][\w$]*)"
+    r"|(?P<op>===|!==|==|!=|<=|>=|&&|\|\||[!<>.()\[\]])"
+    r")"
+)
+
+
+def _is_number(value):
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _check_value(value):
+    """
+    Checks that the value read from the data has the same meaning in JS.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        if abs(value) > MAX_SAFE_INTEGER:
+            raise UnsupportedTemplateError(f"Integer {value} is not a safe JS number")
+    elif not isinstance(value, str | float | bool | dict | list | type(None)):
+        raise UnsupportedTemplateError(f"Unsupported value of type {type(value)}")
+    return value
+
+
+def to_boolean(value):
+    """
+    Converts the value to boolean following the JS rules.
+    """
+    if value is None or value is NULL:
+        return False
+    if isinstance(value, float):
+        return value != 0 and not math.isnan(value)
+    if isinstance(value, dict | list):
+        # Objects are always truthy, even the empty ones
+        return True
+    return bool(value)
+
+
+def to_string(value):
+    """
+    Converts the value to string following the JS rules.
+    """
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return "undefined"
+    if value is NULL:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        if value.is_integer() and abs(value) <= MAX_SAFE_INTEGER:
+            return str(int(value))
+        if value.is_integer() and abs(value) < 1e21:
+            # JS prints the shortest digits identifying the number padded with zeros
+            # (e.g. 2**60 is "1152921504606847000"), as repr does before the exponent
+            sign, digits, exponent = decimal.Decimal(repr(value)).normalize().as_tuple()
+            return "-" * sign + "".join(map(str, digits)) + "0" * exponent
+        text = repr(value)
+        if "e" not in text:
+            return text
+    raise UnsupportedTemplateError(f"String conversion of {value!r} is not supported")
+
+
+def _type_of(value):
+    if value is None:
+        return "undefined"
+    if value is NULL:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if _is_number(value):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    return "object"
+
+
+def strict_equals(left, right):
+    """
+    Compares the values following the rules of the JS `===` operator.
+    """
+    left_type, right_type = _type_of(left), _type_of(right)
+    if left_type != right_type:
+        return False
+    if left_type == "object":
+        raise UnsupportedTemplateError("Comparison of objects is not supported")
+    return left == right
+
+
+def loose_equals(left, right):
+    """
+    Compares the values following the rules of the JS `==` operator.
+    """
+    left_type, right_type = _type_of(left), _type_of(right)
+    if left_type == right_type:
+        return strict_equals(left, right)
+    nullish = {"undefined", "null"}
+    if left_type in nullish or right_type in nullish:
+        return left_type in nullish and right_type in nullish
+    raise UnsupportedTemplateError(
+        f"Comparison of {left_type} and {right_type} is not supported"
+    )
+
+
+def compare(operator, left, right):
+    """
+    Compares the numbers following the rules of the JS relational operators.
+    """
+    if not (_is_number(left) and _is_number(right)):
+        raise UnsupportedTemplateError("Only numbers can be compared")
+    if operator == "<":
+        return left < right
+    if operator == ">":
+        return left > right
+    if operator == "<=":
+        return left <= right
+    return left >= right
+
+
+def get_property(value, key):
+    """
+    Returns the property of the value following the JS rules.
+    """
+    if value is None or value is NULL:
+        # JS throws TypeError, let the JS worker report it
+        raise UnsupportedTemplateError(f"Cannot read property {key!r} of {value!r}")
+    if _is_number(key):
+        if not float(key).is_integer():
+            raise UnsupportedTemplateError(f"Unsupported property {key!r}")
+        key = str(int(key))
+    elif not isinstance(key, str):
+        raise UnsupportedTemplateError(f"Unsupported property {key!r}")
+
+    if isinstance(value, dict):
+        if key in value:
+            return _check_value(value[key])
+        if key in OBJECT_PROTOTYPE_PROPERTIES:
+            raise UnsupportedTemplateError(f"Unsupported property {key!r}")
+        return None
+    if isinstance(value, list):
+        if key == "length":
+            return len(value)
+        if key.isdigit() and (key == "0" or not key.startswith("0")):
+            index = int(key)
+            return _check_value(value[index]) if index < len(value) else None
+        raise UnsupportedTemplateError(f"Unsupported array property {key!r}")
+    # JS strings are measured in UTF-16 code units
+    if (
+        isinstance(value, str)
+        and key == "length"
+        and all(ord(char) <= 0xFFFF for char in value)
+    ):
+        return len(value)
+    raise UnsupportedTemplateError(f"Unsupported property {key!r} of {_type_of(value)}")
+
+
+class _ExpressionParser:
+    """
+    Parses the JS expression into a Python function evaluating it in the given scope.
+
+    Supported are literals, variables, property access, `!`, relational and equality
+    operators, `&&`, `||` and parentheses.
+    """
+
+    def __init__(self, code, names):
+        self.names = names
+        # Variables read by the expression
+        self.variables = set()
+        self.tokens = []
+        position = 0
+        code = code.rstrip()
+        while position < len(code):
+            match = EXPRESSION_TOKEN.match(code, position)
+            if match is None:
+                raise UnsupportedTemplateError(f"Unsupported expression {code!r}")
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+
+    def parse(self):
+        expression = self._parse_or()
+        if self.position != len(self.tokens):
+            raise UnsupportedTemplateError("Unexpected token in expression")
+        return expression
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def _accept(self, *operators):
+        kind, value = self._peek()
+        if kind == "op" and value in operators:
+            self.position += 1
+            return value
+        return None
+
+    def _expect(self, operator):
+        if self._accept(operator) is None:
+            raise UnsupportedTemplateError(f"Expected {operator!r} in expression")
+
+    def _parse_or(self):
+        left = self._parse_and()
+        while self._accept("||"):
+            right = self._parse_and()
+            left = self._or(left, right)
+        return left
+
+    @staticmethod
+    def _or(left, right):
+        def evaluate(scope):
+            value = left(scope)
+            return value if to_boolean(value) else right(scope)
+
+        return evaluate
+
+    def _parse_and(self):
+        left = self._parse_equality()
+        while self._accept("&&"):
+            right = self._parse_equality()
+            left = self._and(left, right)
+        return left
+
+    @staticmethod
+    def _and(left, right):
+        def evaluate(scope):
+            value = left(scope)
+            return right(scope) if to_boolean(value) else value
+
+        return evaluate
+
+    def _parse_equality(self):
+        left = self._parse_relational()
+        while operator := self._accept("===", "!==", "==", "!="):
+            right = self._parse_relational()
+            left = self._equality(operator, left, right)
+        return left
+
+    @staticmethod
+    def _equality(operator, left, right):
+        equals = strict_equals if operator in ("===", "!==") else loose_equals
+        negate = operator.startswith("!")
+
+        def evaluate(scope):
+            return equals(left(scope), right(scope)) != negate
+
+        return evaluate
+
+    def _parse_relational(self):
+        left = self._parse_unary()
+        while operator := self._accept("<", ">", "<=", ">="):
+            right = self._parse_unary()
+            left = self._relational(operator, left, right)
+        return left
+
+    @staticmethod
+    def _relational(operator, left, right):
+        def evaluate(scope):
+            return compare(operator, left(scope), right(scope))
+
+        return evaluate
+
+    def _parse_unary(self):
+        if self._accept("!"):
+            operand = self._parse_unary()
+            return lambda scope: not to_boolean(operand(scope))
+        return self._parse_postfix()
+
+    def _parse_postfix(self):
+        expression = self._parse_primary()
+        while operator := self._accept(".", "["):
+            if operator == ".":
+                kind, name = self._peek()
+                if kind != "name":
+                    raise UnsupportedTemplateError("Expected property name")
+                self.position += 1
+                expression = self._property(expression, lambda scope, name=name: name)
+            else:
+                key = self._parse_or()
+                self._expect("]")
+                expression = self._property(expression, key)
+        return expression
+
+    @staticmethod
+    def _property(expression, key):
+        def evaluate(scope):
+            return get_property(expression(scope), key(scope))
+
+        return evaluate
+
+    def _parse_primary(self):
+        kind, value = self._peek()
+        self.position += 1
+        if kind == "number":
+            number = float(value) if "." in value else int(value)
+            if abs(number) > MAX_SAFE_INTEGER:
+                raise UnsupportedTemplateError(f"Unsupported number {value}")
+            return lambda scope: number
+        if kind == "string":
+            text = value[1:-1]
+            return lambda scope: text
+        if kind == "name":
+            if value in LITERALS:
+                literal = LITERALS[value]
+                return lambda scope: literal
+            if value not in self.names:
+                raise UnsupportedTemplateError(f"Unsupported variable {value!r}")
+            self.variables.add(value)
+            return lambda scope: scope[value]
+        if kind == "op" and value == "(":
+            expression = self._parse_or()
+            self._expect(")")
+            return expression
+        raise UnsupportedTemplateError("Unexpected end of expression")
+
+
+def _strip(text):
+    """
+    Removes the white space and comments the same way as doT with `strip` enabled.
+    """
+    text = re.sub(r"(^|\r|\n)\t* +| +\t*(\r|\n|$)", " ", text)
+    return re.sub(r"\r|\n|\t|\/\*[\s\S]*?\*\/", "", text)
+
+
+def _tokenize(text, settings):
+    """
+    Splits the template escaped by doT into the static text and the tags.
+
+    :return: list of (kind, groups) tuples, where the kind is "text" for
+             the static text with the text as the only group
+    """
+    patterns = [
+        (kind, re.compile(pattern))
+        for kind, pattern in (
+            ("interpolate", settings.interpolate),
+            ("encode", settings.encode),
+            ("conditional", settings.conditional),
+            ("iterate", settings.iterate),
+            ("evaluate", settings.evaluate),
+        )
+        if pattern
+    ]
+
+    tokens = []
+    position = 0
+    while True:
+        # The earliest tag wins, the order of the patterns breaks the ties
+        found = None
+        for kind, pattern in patterns:
+            match = pattern.search(text, position)
+            if match and (found is None or match.start() < found[1].start()):
+                found = (kind, match)
+        if found is None:
+            break
+        kind, match = found
+        if match.start() > position:
+            tokens.append(("text", (text[position : match.start()],)))
+        tokens.append((kind, match.groups()))
+        position = match.end()
+    if position < len(text):
+        tokens.append(("text", (text[position:],)))
+    return tokens
+
+
+def _generate_js(tokens, settings):
+    """
+    Generates the JS function code from the tokens the same way as doT.
+    """
+    symbols = doT.startend.append if settings.append else doT.startend.split
+    parts = []
+    sid = 0
+    for kind, groups in tokens:
+        if kind == "text":
+            parts.append(groups[0])
+        elif kind in ("interpolate", "encode"):
+            parts.append(symbols.start + doT.unescape(groups[0]) + symbols.end)
+        elif kind == "conditional":
+            elsecode, code = groups
+            if elsecode:
+                parts.append(
+                    "';}else if(" + doT.unescape(code) + "){out+='"
+                    if code
+                    else "';}else{out+='"
+                )
+            else:
+                parts.append(
+                    "';if(" + doT.unescape(code) + "){out+='" if code else "';}out+='"
+                )
+        elif kind == "iterate":
+            iterate, vname, iname = groups
+            if not iterate:
+                parts.append("';} } out+='")
+                continue
+            sid += 1
+            indv = iname or f"i{sid}"
+            parts.append(
+                f"';var arr{sid}={doT.unescape(iterate)};if(arr{sid}){{var {vname},"
+                f"{indv}=-1,l{sid}=arr{sid}.length-1;while({indv}<l{sid}){{"
+                f"{vname}=arr{sid}[{indv}+=1];out+='"
+            )
+        else:
+            parts.append("';" + doT.unescape(groups[0]) + "out+='")
+
+    code = "".join(parts)
+    code = re.sub(r"\n", "\\n", code)
+    code = re.sub(r"\t", "\\t", code)
+    code = re.sub(r"\r", "\\r", code)
+    code = re.sub(r"(\s|;|\}|^|\{)out\+='';", r"\1", code)
+    code = re.sub(r"\+''", "", code)
+    return (
+        "function anonymous("
+        + settings.varname
+        + ") {var out='"
+        + code
+        + "';return out;}"
+    )
+
+
+def _check_loop_variable(name, varname):
+    if (
+        not IDENTIFIER.fullmatch(name)
+        or name in RESERVED_NAMES
+        or name == varname
+        or GENERATED_NAME.fullmatch(name)
+    ):
+        raise UnsupportedTemplateError(f"Unsupported loop variable {name!r}")
+
+
+class NativeTemplate:
+    """
+    DoT.js template compiled to Python functions.
+    """
+
+    def __init__(self, text, js_code, settings):
+        """
+        Compiles the template.
+
+        :param text: template prepared for doT (escaped for JS)
+        :param js_code: JS function code compiled by doT from the same text
+        :param settings: DoT settings used for the compilation
+        :raises UnsupportedTemplateError: if the template is outside of the subset
+        """
+        self.varname = settings.varname
+        if settings.strip:
+            text = _strip(text)
+        tokens = _tokenize(re.sub(r"['\\]", r"\\\g<0>", text), settings)
+        if _generate_js(tokens, settings) != js_code:
+            raise UnsupportedTemplateError(
+                "Template is not tokenized the same as by doT"
+            )
+
+        # Loop variables are declared by `var`, so they are visible (and undefined)
+        # in the whole function
+        self.names = {self.varname}
+        sid = 0
+        for kind, groups in tokens:
+            if kind == "iterate" and groups[0]:
+                sid += 1
+                _, vname, iname = groups
+                iname = iname or f"i{sid}"
+                for name in (vname, iname):
+                    _check_loop_variable(name, self.varname)
+                if vname == iname:
+                    raise UnsupportedTemplateError("Loop variables must differ")
+                self.names.update((vname, iname))
+
+        self._sid = 0
+        self._variables = set()
+        self._render, _ = self._compile_block(iter(tokens), None)
+
+        # The template not reading its data always renders the same string,
+        # so it is rendered once here
+        self.static_value = None
+        if self.varname not in self._variables:
+            with contextlib.suppress(UnsupportedTemplateError):
+                self.static_value = self(None)
+
+    @property
+    def is_static(self):
+        """True if the rendered string does not depend on the data."""
+        return self.static_value is not None
+
+    def _expression(self, code):
+        parser = _ExpressionParser(doT.unescape(code), self.names)
+        expression = parser.parse()
+        self._variables.update(parser.variables)
+        return expression
+
+    def _compile_block(self, tokens, closing):
+        """
+        Compiles the tokens until the closing tag of the block.
+
+        :param tokens: iterator of the tokens
+        :param closing: kind of the tag closing the block, None for the whole template
+        :return: tuple with the function rendering the block into the list of strings
+                 and the groups of the closing tag
+        """
+        nodes = []
+        for kind, groups in tokens:
+            if kind == "text":
+                nodes.append(self._text(re.sub(r"\\(['\\])", r"\1", groups[0])))
+            elif kind in ("interpolate", "encode"):
+                nodes.append(self._interpolation(self._expression(groups[0])))
+            elif kind == "conditional":
+                elsecode, code = groups
+                if not code or elsecode:
+                    if closing != "conditional":
+                        raise UnsupportedTemplateError("Unexpected end of conditional")
+                    return self._block(nodes), (elsecode, code)
+                nodes.append(self._conditional(self._expression(code), tokens))
+            elif kind == "iterate":
+                iterate, vname, iname = groups
+                if not iterate:
+                    if closing != "iterate":
+                        raise UnsupportedTemplateError("Unexpected end of iteration")
+                    return self._block(nodes), groups
+                nodes.append(self._iteration(iterate, vname, iname, tokens))
+            else:
+                raise UnsupportedTemplateError("Evaluation of JS code is not supported")
+
+        if closing is not None:
+            raise UnsupportedTemplateError(f"Unterminated {closing}")
+        return self._block(nodes), None
+
+    @staticmethod
+    def _block(nodes):
+        def render(scope, out):
+            for node in nodes:
+                node(scope, out)
+
+        return render
+
+    @staticmethod
+    def _text(text):
+        return lambda scope, out: out.append(text)
+
+    @staticmethod
+    def _interpolation(expression):
+        return lambda scope, out: out.append(to_string(expression(scope)))
+
+    def _conditional(self, condition, tokens):
+        branches = []
+        otherwise = None
+        while True:
+            body, (elsecode, code) = self._compile_block(tokens, "conditional")
+            if otherwise is not None:
+                raise UnsupportedTemplateError("Conditional continues after else")
+            if condition is None:
+                otherwise = body
+            else:
+                branches.append((condition, body))
+            if not elsecode:
+                break
+            condition = self._expression(code) if code else None
+
+        def render(scope, out):
+            for branch_condition, branch in branches:
+                if to_boolean(branch_condition(scope)):
+                    branch(scope, out)
+                    return
+            if otherwise is not None:
+                otherwise(scope, out)
+
+        return render
+
+    def _iteration(self, iterate, vname, iname, tokens):
+        array = self._expression(iterate)
+        self._sid += 1
+        iname = iname or f"i{self._sid}"
+        body, _ = self._compile_block(tokens, "iterate")
+
+        def render(scope, out):
+            value = array(scope)
+            if not to_boolean(value):
+                return
+            if isinstance(value, dict | str):
+                # The length property of the objects and strings is not modelled
+                raise UnsupportedTemplateError("Only arrays can be iterated")
+            if not isinstance(value, list):
+                # The length of other values is undefined, the loop does not run
+                scope[iname] = -1
+                return
+            last = len(value) - 1
+            scope[iname] = -1
+            while scope[iname] < last:
+                scope[iname] += 1
+                index = scope[iname]
+                scope[vname] = (
+                    _check_value(value[index]) if index < len(value) else None
+                )
+                body(scope, out)
+
+        return render
+
+    def __call__(self, data):
+        """
+        Renders the template.
+
+        :param data: data of the template
+        :return: rendered string, as returned by the JS function
+        :raises UnsupportedTemplateError: if the data are outside of the subset
+        """
+        if self.static_value is not None:
+            return self.static_value
+        scope = dict.fromkeys(self.names)
+        scope[self.varname] = data
+        out = []
+        self._render(scope, out)
+        return "".join(out)
@@ -0,0 +1,121 @@
+"""
+Keeps the content data registered by the clients, so they do not have to send
+the content of all rules with every request.
+
+The registry is local to the process and bounded. Clients referencing a content
+version the registry does not know (e.g. after a restart) get the 404 status code
+and should register the content again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from insights_content_template_renderer.cache import LRUCache
+from insights_content_template_renderer.models import Content
+from insights_content_template_renderer.utils import ContentIndex
+
+log = logging.getLogger(__name__)
+
+# Maximal number of content versions kept by each process
+CONTENT_REGISTRY_SIZE = int(os.environ.get("CONTENT_REGISTRY_SIZE", "4"))
+
+
+class ContentVersionNotFoundError(Exception):
+    """
+    Exception raised if the requested content version has not been registered.
+    """
+
+
+def load_content(path) -> list[Content]:
+    """
+    Loads the content data from a JSON file or from all JSON files in a directory.
+    Each file contains either the content of a single rule or a list of them,
+    like the content service returns.
+
+    :param path: path to the file or directory with the content
+    :return: list with content data for all rules
+    """
+    path = Path(path)
+    files = sorted(path.glob("*.json")) if path.is_dir() else [path]
+
+    content = []
+    for file in files:
+        with open(file, encoding="UTF-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [data]
+        content.extend(Content.parse_obj(rule) for rule in data)
+    log.info("Loaded content of %d rules from %s", len(content), path)
+    return content
+
+
+def get_content_version(content: list[Content]) -> str:
+    """
+    Returns the version identifying the content data.
+
+    :param content: list with content data for all rules
+    :return: hexadecimal SHA-256 digest of the content
+    """
+    serialized = json.dumps(
+        [rule.model_dump() for rule in content],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class ContentRegistry:
+    """
+    Registry of the content data versions with their precompiled templates.
+    """
+
+    def __init__(self, size=CONTENT_REGISTRY_SIZE):
+        """
+        Initialize an empty registry.
+
+        :param size: maximal number of kept content versions
+        """
+        self._indexes = LRUCache(size)
+
+    def register(self, content: list[Content]) -> tuple[str, ContentIndex]:
+        """
+        Registers the content data and compiles all its templates.
+        Registering already known content only refreshes it.
+
+        :param content: list with content data for all rules
+        :return: tuple with the content version and the content index
+        """
+        version = get_content_version(content)
+        index = self._indexes.get(version)
+        if index is None:
+            log.info("Registering content version %s", version)
+            index = ContentIndex(content)
+            compiled = index.precompile()
+            self._indexes.put(version, index)
+            log.info(
+                "Content version %s registered with %d rules and %d error keys",
+                version,
+                len(index.rules),
+                compiled,
+            )
+        return version, index
+
+    def get(self, version: str) -> ContentIndex:
+        """
+        Returns the index of the registered content version.
+
+        :param version: content version returned by register
+        :return: content index
+        """
+        index = self._indexes.get(version)
+        if index is None:
+            raise ContentVersionNotFoundError(
+                f"The content version '{version}' has not been registered."
+            )
+        return index
+
+
+content_registry = ContentRegistry()
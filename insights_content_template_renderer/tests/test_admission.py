@@ -0,0 +1,134 @@
+"""
+Unit tests for admission.py module.
+"""
+
+from fastapi import FastAPI, Request, status
+from fastapi.testclient import TestClient
+
+from insights_content_template_renderer.admission import AdmissionMiddleware
+from insights_content_template_renderer.metrics import rejected_requests
+
+
+def get_client(**limits):
+    app = FastAPI()
+    admission = AdmissionMiddleware(app, **limits)
+
+    @app.post("/v1/rendered_reports")
+    async def rendered_reports(request: Request):
+        await request.body()
+        return {"inflight": admission.inflight, "bytes": admission.inflight_bytes}
+
+    @app.post("/v1/content")
+    async def register_content():
+        return {}
+
+    return TestClient(admission)
+
+
+def test_admitted_request():
+    """Test that a request is counted as in flight while it is processed."""
+    client = get_client(queue_depth=lambda: 0)
+
+    response = client.post("/v1/rendered_reports", content=b"{}")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"inflight": 1, "bytes": 2}
+    assert client.app.inflight == 0
+    assert client.app.inflight_bytes == 0
+
+
+def test_request_too_large():
+    """Test that a request with too large body is rejected before it is parsed."""
+    client = get_client(max_request_bytes=10, queue_depth=lambda: 0)
+    before = rejected_requests.labels("too_large")._value.get()
+
+    response = client.post("/v1/rendered_reports", content=b"x" * 11)
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert "retry-after" not in response.headers
+    assert rejected_requests.labels("too_large")._value.get() == before + 1
+
+
+def chunks(size, count):
+    """Body sent chunked, without Content-Length."""
+    for _ in range(count):
+        yield b"x" * size
+
+
+def test_chunked_request_counted():
+    """Test that a body without Content-Length is counted as it is received."""
+    client = get_client(max_request_bytes=100, queue_depth=lambda: 0)
+
+    response = client.post("/v1/rendered_reports", content=chunks(10, 3))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"inflight": 1, "bytes": 30}
+    assert client.app.inflight_bytes == 0
+
+
+def test_chunked_request_too_large():
+    """Test that a body without Content-Length is rejected when it exceeds the limit."""
+    client = get_client(max_request_bytes=10, queue_depth=lambda: 0)
+    before = rejected_requests.labels("too_large")._value.get()
+
+    response = client.post("/v1/rendered_reports", content=chunks(6, 2))
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert response.json()["reason"] == "too_large"
+    assert rejected_requests.labels("too_large")._value.get() == before + 1
+    assert client.app.inflight == 0
+    assert client.app.inflight_bytes == 0
+
+
+def test_chunked_request_rejected_by_inflight_bytes():
+    """Test that a body without Content-Length is limited by the inflight bytes."""
+    client = get_client(max_inflight_bytes=100, retry_after=2, queue_depth=lambda: 0)
+    admission = client.app
+    # Another request is in flight
+    admission.inflight, admission.inflight_bytes = 1, 60
+
+    response = client.post("/v1/rendered_reports", content=chunks(50, 1))
+
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["retry-after"] == "2"
+    assert response.json()["reason"] == "inflight_bytes"
+    assert (admission.inflight, admission.inflight_bytes) == (1, 60)
+
+
+def test_request_rejected_by_queued_tasks():
+    """Test that the requests are rejected while the JS workers are saturated."""
+    client = get_client(max_queued_js_tasks=5, retry_after=3, queue_depth=lambda: 5)
+
+    response = client.post("/v1/rendered_reports", content=b"{}")
+
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["retry-after"] == "3"
+    assert response.json()["reason"] == "queued_js_tasks"
+    # The other endpoints are not limited
+    assert client.post("/v1/content").status_code == status.HTTP_200_OK
+
+
+def test_admission_limits():
+    """Test the limits of the requests and their bodies in flight."""
+    admission = AdmissionMiddleware(
+        None,
+        max_inflight_requests=2,
+        max_queued_js_tasks=0,
+        max_request_bytes=0,
+        max_inflight_bytes=100,
+        queue_depth=lambda: 0,
+    )
+
+    # A request larger than the budget is admitted to the idle process
+    assert admission.check(1000) is None
+    admission.inflight, admission.inflight_bytes = 1, 60
+    assert admission.check(40) is None
+    assert admission.check(41) == (429, "inflight_bytes")
+    admission.inflight = 2
+    assert admission.check(0) == (429, "inflight_requests")
+    # The received body is already counted in the inflight bytes
+    assert admission.check_received(40) is None
+    admission.inflight_bytes = 101
+    assert admission.check_received(41) == (429, "inflight_bytes")
+    admission.inflight = 1
+    assert admission.check_received(41) is None
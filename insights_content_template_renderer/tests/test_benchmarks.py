@@ -0,0 +1,89 @@
+"""
+Unit tests for the synthetic requests and the comparison of the benchmarks.
+"""
+
+import json
+
+import pytest
+
+from benchmarks.render_pipeline import compare, find_crossovers, measure_memory
+from benchmarks.synthetic import generate_request, generate_response
+from insights_content_template_renderer.endpoints import json_response
+from insights_content_template_renderer.models import RendererRequest, RendererResponse
+
+
+def test_generate_request_is_deterministic():
+    """Test that the same parameters and seed give the same request."""
+    assert generate_request(seed=1) == generate_request(seed=1)
+    assert generate_request(seed=1) != generate_request(seed=2)
+
+
+def test_generate_request_scales():
+    """Test that the request has the requested number of clusters, reports and rules."""
+    request = generate_request(
+        clusters=3, reports_per_cluster=4, rules=5, details_size=6
+    )
+    reports = request["report_data"]["reports"]
+
+    assert len(request["content"]) == 5
+    assert len(reports) == 3
+    for cluster in reports.values():
+        assert len(cluster["reports"]) == 4
+        for report in cluster["reports"]:
+            assert len(report["details"]["nodes"]) == 6
+    RendererRequest.parse_obj(request)
+
+
+def test_generate_response():
+    """Test that the response has the requested number of reports in its format."""
+    content = generate_response(reports=25, reports_per_cluster=10, seed=1)
+
+    assert content == generate_response(reports=25, reports_per_cluster=10, seed=1)
+    assert [len(reports) for reports in content["reports"].values()] == [10, 10, 5]
+    # Both serializations give the same JSON
+    assert json.loads(json_response(content).body) == RendererResponse.parse_obj(
+        content
+    ).model_dump(exclude_none=True)
+
+
+def test_compare_with_baseline():
+    """Test that only the benchmarks slower than the threshold are regressions."""
+    baseline = {"fast": {"median": 1.0}, "slow": {"median": 1.0}}
+    results = {
+        "fast": {"median": 1.05},
+        "slow": {"median": 1.5},
+        "skipped": {"skipped": "reason"},
+    }
+
+    assert compare(results, baseline, 0.1) == [
+        ("fast", 1.0, 1.05, 1.05, False),
+        ("slow", 1.0, 1.5, 1.5, True),
+    ]
+
+
+def test_find_transport_crossovers():
+    """Test that the crossover is the smallest size from which JSON stays faster."""
+    results = {
+        "transport_python_1": {"median": 1.0},
+        "transport_python_10": {"median": 2.0},
+        "transport_python_100": {"median": 10.0},
+        "transport_json_1": {"median": 0.5},
+        "transport_json_10": {"median": 3.0},
+        "transport_json_100": {"median": 5.0},
+        "transport_json_shm_1": {"skipped": "reason"},
+        "transport_json_shm_10": {"skipped": "reason"},
+        "transport_json_shm_100": {"skipped": "reason"},
+    }
+
+    assert find_crossovers(results, [1, 10, 100]) == {"json": 100, "json_shm": None}
+
+
+def test_measure_memory():
+    """Test that the memory kept by the result is measured and errors propagated."""
+    assert measure_memory(lambda: bytearray(100_000)) >= 100_000
+
+    def fail():
+        raise ValueError("invalid request")
+
+    with pytest.raises(ValueError, match="invalid request"):
+        measure_memory(fail)
@@ -0,0 +1,114 @@
+"""
+Unit tests for bundle.py module.
+"""
+
+import json
+from unittest.mock import patch
+
+import pydantic
+import pytest
+
+from insights_content_template_renderer import utils
+from insights_content_template_renderer.bundle import (
+    BUNDLE_FORMAT,
+    TemplateBundleError,
+    build_bundle,
+    install_bundle,
+    load_bundle,
+    main,
+)
+from insights_content_template_renderer.cache import LRUCache
+from insights_content_template_renderer.data import request_data_example
+from insights_content_template_renderer.js_executor import get_code_digest
+from insights_content_template_renderer.models import Content
+
+
+def get_content():
+    return pydantic.parse_obj_as(list[Content], request_data_example["content"])
+
+
+def test_build_bundle():
+    """Test that the bundle has the compiled functions of all templates."""
+    content = get_content()
+
+    bundle, errors = build_bundle(content)
+
+    assert errors == []
+    assert bundle["format"] == BUNDLE_FORMAT
+    assert len(bundle["index"]) == sum(len(rule.error_keys) for rule in content)
+    for fields in bundle["index"].values():
+        for digest in fields.values():
+            assert digest is None or digest in bundle["functions"]
+    for digest, js_code in bundle["functions"].items():
+        assert get_code_digest(js_code) == digest
+    assert set(bundle["js_functions"]) <= set(bundle["functions"])
+
+
+def test_install_bundle_replaces_compilation():
+    """Test that the templates of the installed bundle are not compiled by doT."""
+    bundle, _ = build_bundle(get_content())
+    rule = get_content()[0]
+    error_key = next(iter(rule.error_keys))
+    template_text = utils.get_report_templates(rule, error_key)["reason"]
+    js_code = utils.compile_template(template_text)
+
+    with (
+        patch.object(utils, "template_cache", LRUCache(16)),
+        patch.dict(utils.bundled_templates, clear=True),
+        patch.object(utils.renderer, "template") as mock_template,
+    ):
+        install_bundle(bundle)
+        assert utils.compile_template(template_text) == js_code
+
+    mock_template.assert_not_called()
+
+
+def test_install_bundle_returns_js_functions():
+    """Test that only the functions rendered by the JS worker are evaluated."""
+    bundle, _ = build_bundle(get_content())
+
+    with patch.dict(utils.bundled_templates, clear=True):
+        js_codes = install_bundle(bundle)
+        with patch.object(utils, "TEMPLATE_ENGINE", "js"):
+            all_js_codes = install_bundle(bundle)
+
+    assert js_codes == [bundle["functions"][d] for d in bundle["js_functions"]]
+    assert all_js_codes == list(bundle["functions"].values())
+
+
+def test_load_bundle_invalid(tmp_path):
+    """Test that a file which is not a bundle is rejected."""
+    bundle_path = tmp_path / "bundle.json"
+    bundle_path.write_text(json.dumps({"format": BUNDLE_FORMAT + 1}))
+
+    with pytest.raises(TemplateBundleError):
+        load_bundle(bundle_path)
+    with pytest.raises(TemplateBundleError):
+        load_bundle(tmp_path / "missing.json")
+
+
+def test_main_writes_bundle(tmp_path):
+    """Test that the command writes the bundle of the content."""
+    content_path = tmp_path / "content.json"
+    content_path.write_text(json.dumps(request_data_example["content"]))
+    bundle_path = tmp_path / "bundle.json"
+
+    assert main([str(content_path), "-o", str(bundle_path)]) == 0
+
+    assert load_bundle(bundle_path) == build_bundle(get_content())[0]
+
+
+def test_main_reports_bad_templates(tmp_path, capsys):
+    """Test that the command fails without writing the bundle if a template fails."""
+    content_path = tmp_path / "content.json"
+    content_path.write_text(json.dumps(request_data_example["content"]))
+    bundle_path = tmp_path / "bundle.json"
+
+    with (
+        patch.object(utils, "template_cache", LRUCache(16)),
+        patch.object(utils.renderer, "template", side_effect=SyntaxError("bad")),
+    ):
+        assert main([str(content_path), "-o", str(bundle_path)]) == 1
+
+    assert "bad" in capsys.readouterr().err
+    assert not bundle_path.exists()
@@ -0,0 +1,145 @@
+"""
+Unit tests for cache.py module.
+"""
+
+from insights_content_template_renderer.cache import LRUCache, TTLCache
+
+
+def test_get_missing_key():
+    """Test that lookup of a missing key returns the default and counts a miss."""
+    cache = LRUCache(2)
+
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+    assert cache.misses == 2
+    assert cache.hits == 0
+
+
+def test_put_and_get():
+    """Test that a stored value is returned and counted as a hit."""
+    cache = LRUCache(2)
+    cache.put("key", "value")
+
+    assert cache.get("key") == "value"
+    assert "key" in cache
+    assert len(cache) == 1
+    assert cache.hits == 1
+
+
+def test_lru_eviction():
+    """Test that the least recently used item is evicted when the cache is full."""
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Touch "a" so "b" becomes the least recently used item
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.evictions == 1
+
+
+def test_get_or_create():
+    """Test that the factory is called only on a cache miss."""
+    cache = LRUCache(2)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "created"
+
+    assert cache.get_or_create("key", factory) == "created"
+    assert cache.get_or_create("key", factory) == "created"
+    assert len(calls) == 1
+    assert cache.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+
+def test_disabled_cache():
+    """Test that a cache with zero size does not store anything."""
+    cache = LRUCache(0)
+    cache.put("key", "value")
+
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_clear():
+    """Test that clear removes all items and resets the counters."""
+    cache = LRUCache(2)
+    cache.put("key", "value")
+    cache.get("key")
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 0
+
+
+class FakeTimer:
+    """Timer returning the time set by the test."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_byte_size_eviction():
+    """Test that the least recently used items are evicted above the byte size cap."""
+    cache = TTLCache(maxbytes=10)
+    cache.put("a", "a", size=4)
+    cache.put("b", "b", size=4)
+    cache.get("a")
+    cache.put("c", "c", size=4)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.bytes == 8
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_too_large_item():
+    """Test that an item larger than the whole cache is not stored."""
+    cache = TTLCache(maxbytes=10)
+    cache.put("a", "a", size=11)
+
+    assert len(cache) == 0
+    assert cache.bytes == 0
+
+
+def test_ttl_cache_expiration():
+    """Test that the items expire after their time to live."""
+    timer = FakeTimer()
+    cache = TTLCache(maxbytes=100, ttl=10, timer=timer)
+    cache.put("a", "value", size=5)
+
+    timer.now = 9
+    assert cache.get("a") == "value"
+    timer.now = 10
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 0,
+        "bytes": 0,
+        "maxbytes": 100,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 1,
+    }
+
+
+def test_ttl_cache_disabled():
+    """Test that the cache with zero size stores nothing."""
+    cache = TTLCache(maxbytes=0)
+    cache.put("a", "a", size=0)
+
+    assert cache.get("a") is None
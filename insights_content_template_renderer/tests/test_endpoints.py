@@ -1,3 +1,5 @@
+import copy
+import json
 from unittest.mock import patch
 
 import pytest
@@ -9,10 +11,13 @@ from insights_content_template_renderer.data import (
     response_data_example,
 )
 from insights_content_template_renderer.endpoints import app
+from insights_content_template_renderer.models import RenderedCluster
 
 client = TestClient(app)
 
 ENDPOINT__V1_RENDERED_REPORTS = "/v1/rendered_reports"
+ENDPOINT__V1_RENDERED_REPORTS_LIGHT = "/v1/rendered_reports/light"
+ENDPOINT__V1_CONTENT = "/v1/content"
 
 
 @pytest.mark.parametrize("method", [client.get, client.put, client.delete])
@@ -32,13 +37,199 @@ def test_valid_data():
     assert response.json() == response_data_example
 
 
-@patch("insights_content_template_renderer.endpoints.render_reports")
+@patch("insights_content_template_renderer.endpoints.render_response_content_async")
 def test_exception_handling(mock_render_reports):
-    """Test that exceptions in render_reports are properly handled."""
-    # Mock render_reports to raise an exception
+    """Test that exceptions in render_response_content_async are properly handled."""
+    # Mock render_response_content_async to raise an exception
     mock_render_reports.side_effect = Exception("Test exception")
 
     response = client.post(ENDPOINT__V1_RENDERED_REPORTS, json=request_data_example)
 
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
     assert response.text == "Internal Server Error"
+
+
+def test_valid_data_with_timeout():
+    """Test that the response with a timeout lists the unrendered reports."""
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json=request_data_example,
+        headers={"X-Request-Timeout": "30"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {**response_data_example, "unrendered": []}
+
+
+@pytest.mark.parametrize("timeout", ["soon", "nan", "inf", "-inf", "0", "-1"])
+def test_invalid_timeout_header(timeout):
+    """Test that the timeouts which would disable the deadline are rejected."""
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json=request_data_example,
+        headers={"X-Request-Timeout": timeout},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize("timeout", [0, -1])
+def test_invalid_timeout(timeout):
+    """Test that the timeout of the request body must be positive."""
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json={**request_data_example, "timeout": timeout},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_valid_data_light():
+    """Test that the light endpoint does not require the fields not rendered."""
+    request_data = copy.deepcopy(request_data_example)
+    for rule in request_data["content"]:
+        del rule["generic"], rule["summary"], rule["more_info"], rule["HasReason"]
+
+    response = client.post(ENDPOINT__V1_RENDERED_REPORTS_LIGHT, json=request_data)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == response_data_example
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"", b"{", json.dumps({"content": request_data_example["content"]}).encode()],
+)
+def test_invalid_data_light(body):
+    response = client.post(ENDPOINT__V1_RENDERED_REPORTS_LIGHT, content=body)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "detail" in response.json()
+
+
+def test_register_content():
+    response = client.post(ENDPOINT__V1_CONTENT, json=request_data_example["content"])
+    assert response.status_code == status.HTTP_200_OK
+    version = response.json()["version"]
+    assert response.json()["rules"] == 1
+
+    response = client.get(f"{ENDPOINT__V1_CONTENT}/{version}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"version": version, "rules": 1}
+
+
+def test_unknown_content_version():
+    response = client.get(f"{ENDPOINT__V1_CONTENT}/unknown")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json={
+            "content_version": "unknown",
+            "report_data": request_data_example["report_data"],
+        },
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_valid_data_with_content_version():
+    response = client.post(ENDPOINT__V1_CONTENT, json=request_data_example["content"])
+    version = response.json()["version"]
+
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json={
+            "content_version": version,
+            "report_data": request_data_example["report_data"],
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == response_data_example
+
+
+def get_streamed_records(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize(
+    "params,headers",
+    [({"stream": "true"}, {}), ({}, {"Accept": "application/x-ndjson"})],
+)
+def test_valid_data_streamed(params, headers):
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json=request_data_example,
+        params=params,
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert get_streamed_records(response) == [
+        {"cluster": cluster_id, "reports": reports}
+        for cluster_id, reports in response_data_example["reports"].items()
+    ]
+
+
+def test_streamed_clusters_in_order():
+    request_data = copy.deepcopy(request_data_example)
+    cluster_reports = next(iter(request_data["report_data"]["reports"].values()))
+    cluster_ids = [f"00000000-0000-0000-0000-00000000000{i}" for i in range(5)]
+    request_data["report_data"]["clusters"] = cluster_ids
+    request_data["report_data"]["reports"] = dict.fromkeys(cluster_ids, cluster_reports)
+
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS, json=request_data, params={"stream": "true"}
+    )
+
+    records = get_streamed_records(response)
+    assert [record["cluster"] for record in records] == cluster_ids
+    assert all(len(record["reports"]) == 1 for record in records)
+
+
+@patch("insights_content_template_renderer.endpoints.render_reports_stream")
+def test_streamed_exception_handling(mock_render_reports_stream):
+    """Test that a failure while streaming is reported by the last line."""
+
+    async def failing_stream(data, content_index):
+        yield RenderedCluster(cluster="cluster", reports=[])
+        raise Exception("Test exception")
+
+    mock_render_reports_stream.side_effect = failing_stream
+
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS,
+        json=request_data_example,
+        params={"stream": "true"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert get_streamed_records(response) == [
+        {"cluster": "cluster", "reports": []},
+        {"error": "Internal Server Error"},
+    ]
+
+
+ENDPOINT__V1_RENDERED_REPORTS_STREAM = "/v1/rendered_reports/stream"
+
+
+def test_valid_data_parsed_incrementally():
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS_STREAM, content=json.dumps(request_data_example)
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert get_streamed_records(response) == [
+        {"cluster": cluster_id, "reports": reports}
+        for cluster_id, reports in response_data_example["reports"].items()
+    ]
+
+
+def test_invalid_data_parsed_incrementally():
+    response = client.post(ENDPOINT__V1_RENDERED_REPORTS_STREAM, content=b'{"content"')
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.post(
+        ENDPOINT__V1_RENDERED_REPORTS_STREAM,
+        content=json.dumps(
+            {
+                "content_version": "unknown",
+                "report_data": request_data_example["report_data"],
+            }
+        ),
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,125 @@
+"""
+Unit tests for incremental.py module.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from insights_content_template_renderer.data import (
+    request_data_example,
+    response_data_example,
+)
+from insights_content_template_renderer.incremental import (
+    IncrementalJSONReader,
+    IncrementalParseError,
+    parse_request,
+    render_request_stream,
+)
+from insights_content_template_renderer.models import ReportPerCluster
+
+
+async def iter_chunks(body, size):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def read_values(body, size=1):
+    async def read():
+        reader = IncrementalJSONReader(iter_chunks(body, size))
+        values = {}
+        async for key in reader.iter_object():
+            values[key] = await reader.read_value()
+        await reader.finish()
+        return values
+
+    return asyncio.run(read())
+
+
+def parse(request_data, size=7):
+    async def collect():
+        body = json.dumps(request_data).encode()
+        return [part async for part in parse_request(iter_chunks(body, size))]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_read_values_split_in_chunks(size):
+    """Test that the values split between the chunks are decoded."""
+    values = {"number": 12345, "text": "žluťoučký", "list": [1.5, None], "t": True}
+    body = json.dumps(values, ensure_ascii=False, indent=2).encode()
+
+    assert read_values(body, size) == values
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"", b'{"key": }', b'{"key": 1', b'{"key": 1} extra', b"{key: 1}", b"\xff"],
+)
+def test_read_invalid_json(body):
+    """Test that the invalid JSON is rejected."""
+    with pytest.raises(IncrementalParseError):
+        read_values(body)
+
+
+def test_parse_request():
+    """Test that the request is parsed into its parts cluster by cluster."""
+    parts = parse(request_data_example)
+    report_data = request_data_example["report_data"]
+
+    assert [kind for kind, _ in parts] == ["content", "clusters", "reports"]
+    assert parts[1][1] == report_data["clusters"]
+    cluster_id, cluster_data = parts[2][1]
+    assert cluster_id in report_data["reports"]
+    assert isinstance(cluster_data, ReportPerCluster)
+
+
+@pytest.mark.parametrize(
+    "request_data",
+    [
+        {"content": [], "report_data": {"clusters": []}},
+        {"content": [], "report_data": {"reports": {}, "clusters": "cluster"}},
+        {"content": [], "report_data": {"reports": {"cluster": {"reports": [{}]}}}},
+    ],
+)
+def test_parse_invalid_request(request_data):
+    """Test that the request not matching the model is rejected."""
+    with pytest.raises(ValueError):
+        parse(request_data)
+
+
+def render(request_data, size=64):
+    async def collect():
+        body = json.dumps(request_data).encode()
+        return [
+            rendered_cluster.model_dump()
+            async for rendered_cluster in render_request_stream(iter_chunks(body, size))
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_render_request_stream():
+    """Test that the reports are rendered the same as from the whole request."""
+    assert render(request_data_example) == [
+        {"cluster": cluster_id, "reports": reports}
+        for cluster_id, reports in response_data_example["reports"].items()
+    ]
+
+
+def test_render_request_stream_content_last():
+    """Test that the clusters parsed before the content are rendered too."""
+    request_data = {
+        "report_data": request_data_example["report_data"],
+        "content": request_data_example["content"],
+    }
+
+    assert len(render(request_data)) == 1
+
+
+def test_render_request_stream_without_content():
+    """Test that the request without content is rejected."""
+    with pytest.raises(ValueError):
+        render({"report_data": request_data_example["report_data"]})
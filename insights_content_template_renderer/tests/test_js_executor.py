@@ -9,14 +9,30 @@ Tests the JavaScript execution pool functionality including:
 - Graceful shutdown
 """
 
+import asyncio
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import MagicMock, patch
+
 import pytest
 
+from insights_content_template_renderer import js_executor
 from insights_content_template_renderer.js_executor import (
     JsExecutor,
+    LatencyHistory,
+    _eval_js_worker_batch,
     _eval_js_worker_task,
+    encode_data,
+    get_code_digest,
     get_js_executor,
+    get_rss,
+    release_shared_memory,
     shutdown_js_executor,
 )
+from insights_content_template_renderer.worker_pool import resolve_future
 
 
 def test_worker_task_successful_execution():
@@ -41,6 +57,45 @@ def test_worker_task_runtime_error():
     assert "test error" in result
 
 
+def test_worker_task_caches_function():
+    """Test that the worker evaluates the function once and then uses only its digest."""
+    js_code = "(function(data) { return 'Hi ' + data.name; })"
+    digest = get_code_digest(js_code)
+
+    assert _eval_js_worker_task(js_code, {"name": "A"}, digest) == ("success", "Hi A")
+    assert _eval_js_worker_task(None, {"name": "B"}, digest) == ("success", "Hi B")
+
+
+def test_worker_task_missing_function():
+    """Test that the worker reports a digest of a function it has not evaluated."""
+    status, result = _eval_js_worker_task(None, {}, "unknown-digest")
+
+    assert status == "missing"
+    assert result == "unknown-digest"
+
+
+def test_worker_batch_execution():
+    """Test that the worker executes all tasks of a batch and reports each status."""
+    js_code = "(function(data) { return data.value; })"
+    digest = get_code_digest(js_code)
+    failing_js_code = "(function(data) { throw new Error('batch error'); })"
+
+    results, durations, rss = _eval_js_worker_batch(
+        [
+            (js_code, {"value": "first"}, digest),
+            (failing_js_code, {}, get_code_digest(failing_js_code)),
+            (None, {"value": "second"}, digest),
+        ]
+    )
+
+    assert len(durations) == 3
+    assert rss > 0
+    assert results[0] == ("success", "first")
+    assert results[1][0] == "error"
+    assert "batch error" in results[1][1]
+    assert results[2] == ("success", "second")
+
+
 def test_executor_initialization():
     """Test JsExecutor initialization."""
     executor = JsExecutor()
@@ -128,6 +183,18 @@ def test_execute_javascript_error():
     executor.shutdown()
 
 
+def test_configurable_pool_size():
+    """Test that the executor starts the configured number of worker processes."""
+    executor = JsExecutor(pool_size=2, max_pool_size=3)
+
+    pool = executor.get_pool()
+
+    assert len(pool.workers) == 2
+    assert pool.max_size == 3
+
+    executor.shutdown()
+
+
 def test_shutdown_with_no_pool():
     """Test shutdown when no pool was created."""
     executor = JsExecutor()
@@ -190,6 +257,451 @@ def test_multiple_different_executions():
     executor.shutdown()
 
 
+def test_execute_sends_digest_of_known_function():
+    """Test that the executor remembers the functions evaluated by the worker."""
+    executor = JsExecutor()
+    js_code = "(function(data) { return data.value; })"
+    digest = get_code_digest(js_code)
+
+    assert executor.execute(js_code, {"value": "first"}) == "first"
+    worker = executor.get_pool().workers[0]
+    assert digest in executor._get_worker_digests(worker)
+    assert executor.execute(js_code, {"value": "second"}) == "second"
+
+    executor.shutdown()
+
+
+def test_execute_resends_code_unknown_to_worker():
+    """Test that the code is sent again if the worker does not have the function."""
+    executor = JsExecutor()
+    js_code = "(function(data) { return data.value; })"
+
+    # Pretend the worker has the function although it has never seen it
+    worker = executor.get_pool().workers[0]
+    executor._get_worker_digests(worker).put(get_code_digest(js_code), True)
+
+    assert executor.execute(js_code, {"value": "resent"}) == "resent"
+
+    executor.shutdown()
+
+
+def test_execute_batch():
+    """Test executing a batch of JavaScript functions in one exchange."""
+    executor = JsExecutor()
+    js_code = "(function(data) { return 'Hi ' + data.name; })"
+    failing_js_code = "(function(data) { throw new Error('JS error'); })"
+
+    results = executor.execute_batch(
+        [(js_code, {"name": "A"}), (failing_js_code, {}), (js_code, {"name": "B"})]
+    )
+
+    assert len(results) == 3
+    assert results[0] == ("success", "Hi A")
+    assert results[1][0] == "error"
+    assert "JS error" in results[1][1]
+    assert results[2] == ("success", "Hi B")
+    worker_digests = executor._get_worker_digests(executor.get_pool().workers[0])
+    assert get_code_digest(js_code) in worker_digests
+    assert get_code_digest(failing_js_code) not in worker_digests
+
+    executor.shutdown()
+
+
+def test_execute_batch_without_jobs():
+    """Test that an empty batch does not start the worker process."""
+    executor = JsExecutor()
+
+    assert executor.execute_batch([]) == []
+    assert executor._process_pool is None
+
+
+def test_execute_batch_timeout_error():
+    """Test that a hung function in a batch raises TimeoutError."""
+    executor = JsExecutor()
+    js_code = "(function(data) { while(true) {} })"
+
+    with pytest.raises(TimeoutError):
+        executor.execute_batch([(js_code, {})], timeout=1)
+
+    executor.shutdown()
+
+
+def test_execute_batches_in_parallel():
+    """Test that the batches are executed in different workers in parallel."""
+    executor = JsExecutor(pool_size=2)
+    js_code = "(function(data) { return 'Hi ' + data.name; })"
+
+    results = executor.execute_batches(
+        [[(js_code, {"name": "A"}), (js_code, {"name": "B"})], [], [(js_code, {})]]
+    )
+
+    assert results == [
+        [("success", "Hi A"), ("success", "Hi B")],
+        [],
+        [("success", "Hi undefined")],
+    ]
+    for worker in executor.get_pool().workers:
+        assert get_code_digest(js_code) in executor._get_worker_digests(worker)
+
+    executor.shutdown()
+
+
+def test_execute_batches_deadline():
+    """Test that the batches not finished by the deadline are cancelled."""
+    executor = JsExecutor(pool_size=2)
+    hung_js_code = "(function(data) { while(true) {} })"
+    js_code = "(function(data) { return data.value; })"
+
+    results = executor.execute_batches(
+        [[(js_code, {"value": "done"})], [(hung_js_code, {})]],
+        timeout=30,
+        deadline=time.monotonic() + 1,
+    )
+
+    assert results == [[("success", "done")], None]
+    assert executor.execute(js_code, {"value": "after"}) == "after"
+
+    executor.shutdown()
+
+
+def test_execute_batches_timeout_cancels_other_batches():
+    """Test that the other batches of the request are cancelled on timeout."""
+    executor = JsExecutor()
+    futures = [Future(), Future()]
+    js_code = "(function(data) { return data.value; })"
+
+    with (
+        patch.object(executor, "submit_batch", side_effect=futures),
+        patch.object(executor, "_cancel_batch") as mock_cancel,
+        pytest.raises(TimeoutError),
+    ):
+        executor.execute_batches([[(js_code, {})], [(js_code, {})]], timeout=0.01)
+
+    cancelled = [call.args[0] for call in mock_cancel.call_args_list]
+    assert futures[1] in cancelled
+    assert futures[0] in cancelled
+
+
+def test_execute_batches_async_timeout_cancels_other_batches():
+    """Test that the other batches are cancelled when one of them times out."""
+    executor = JsExecutor()
+    futures = [Future(), Future()]
+    hung_js_code = "(function(data) { while(true) {} })"
+    slow_js_code = "(function(data) { return data.value; })"
+    executor.set_template_timeout(hung_js_code, 0.01)
+    executor.set_template_timeout(slow_js_code, 30)
+
+    def cancel_batch(future, exception):
+        resolve_future(future, False, exception)
+
+    with (
+        patch.object(executor, "submit_batch", side_effect=futures),
+        patch.object(
+            executor, "_cancel_batch", side_effect=cancel_batch
+        ) as mock_cancel,
+        pytest.raises(TimeoutError, match="timed out after 0.01s"),
+    ):
+        asyncio.run(
+            asyncio.wait_for(
+                executor.execute_batches_async(
+                    [[(hung_js_code, {})], [(slow_js_code, {})]]
+                ),
+                5,
+            )
+        )
+
+    cancelled = [call.args[0] for call in mock_cancel.call_args_list]
+    assert cancelled == futures
+
+
+def test_submit_batch_async_does_not_block_loop():
+    """Test that the batch is encoded and pickled outside the event loop thread."""
+    executor = JsExecutor()
+    future = Future()
+    threads = []
+
+    def submit_batch(jobs):
+        threads.append(threading.get_ident())
+        return future
+
+    async def submit():
+        with patch.object(executor, "submit_batch", side_effect=submit_batch):
+            return await executor.submit_batch_async([("(function() {})", {})])
+
+    assert asyncio.run(submit()) is future
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_execute_batches_async():
+    """Test that the batches are awaited in parallel."""
+    executor = JsExecutor(pool_size=2)
+    js_code = "(function(data) { return data.value; })"
+
+    results = asyncio.run(
+        executor.execute_batches_async(
+            [[(js_code, {"value": "a"})], [(js_code, {"value": "b"})]]
+        )
+    )
+
+    assert results == [[("success", "a")], [("success", "b")]]
+
+    executor.shutdown()
+
+
+def test_execute_async():
+    """Test executing JavaScript without blocking the event loop."""
+    executor = JsExecutor()
+    js_code = "(function(data) { return 'async ' + data.value; })"
+
+    async def render_concurrently():
+        return await asyncio.gather(
+            executor.execute_async(js_code, {"value": "first"}),
+            executor.execute_async(js_code, {"value": "second"}),
+        )
+
+    assert asyncio.run(render_concurrently()) == ["async first", "async second"]
+
+    executor.shutdown()
+
+
+def test_execute_async_javascript_error():
+    """Test that JavaScript errors are raised as RuntimeError by execute_async."""
+    executor = JsExecutor()
+    js_code = "(function(data) { throw new Error('JS error'); })"
+
+    with pytest.raises(RuntimeError) as exc_info:
+        asyncio.run(executor.execute_async(js_code, {}))
+
+    assert "JS error" in str(exc_info.value)
+
+    executor.shutdown()
+
+
+def test_execute_async_timeout_error():
+    """Test that timeout raises TimeoutError in execute_async."""
+    executor = JsExecutor()
+    js_code = "(function(data) { while(true) {} })"
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(executor.execute_async(js_code, {}, timeout=1))
+
+    executor.shutdown()
+
+
+def test_execute_batch_async():
+    """Test executing a batch of JavaScript functions without blocking the event loop."""
+    executor = JsExecutor()
+    js_code = "(function(data) { return data.value; })"
+
+    results = asyncio.run(
+        executor.execute_batch_async(
+            [(js_code, {"value": "a"}), (js_code, {"value": "b"})]
+        )
+    )
+
+    assert results == [("success", "a"), ("success", "b")]
+
+    executor.shutdown()
+
+
+def test_warm_up():
+    """Test that the warm-up evaluates the functions in all workers."""
+    executor = JsExecutor(pool_size=2)
+    js_code = "(function(data) { return data.value; })"
+    broken_js_code = "(function(data) {"
+
+    assert executor.warm_up([js_code, broken_js_code]) == 2
+    for worker in executor.get_pool().workers:
+        digests = executor._get_worker_digests(worker)
+        assert get_code_digest(js_code) in digests
+        assert get_code_digest(broken_js_code) not in digests
+    assert executor.execute(js_code, {"value": "warm"}) == "warm"
+
+    executor.shutdown()
+
+
+def test_get_rss():
+    """Test that the resident memory of the process is measured."""
+    assert get_rss() > 2**20
+
+
+def test_worker_recycled_by_memory():
+    """Test that a worker exceeding the memory watermark is replaced by a new one."""
+    executor = JsExecutor(pool_size=1)
+    js_code = "(function(data) { return data.value; })"
+    pool = executor.get_pool()
+    worker = pool.workers[0]
+
+    with patch.object(js_executor, "JS_WORKER_MAX_RSS_MB", 1):
+        assert executor.execute(js_code, {"value": "first"}) == "first"
+
+    assert worker not in pool.workers
+    assert executor.execute(js_code, {"value": "second"}) == "second"
+    assert pool.workers[0] is not worker
+
+    executor.shutdown()
+
+
+def test_execute_timeout_kills_only_hung_worker():
+    """Test that a timeout kills only the worker running the hung function."""
+    executor = JsExecutor(pool_size=2)
+    hung_js_code = "(function(data) { while(true) {} })"
+    js_code = "(function(data) { return data.value; })"
+    pool = executor.get_pool()
+    other_future = executor.submit_batch([(js_code, {"value": "other"})])
+    # The worker the batch has been dispatched to, the hung function runs in the other
+    with pool._lock:
+        other_worker = next(
+            worker
+            for worker in pool.workers
+            if any(
+                task[0] is other_future.task_future for task in worker.pending.values()
+            )
+        )
+
+    with pytest.raises(TimeoutError):
+        executor.execute(hung_js_code, {}, timeout=1)
+
+    assert other_future.result(timeout=30) == [("success", "other")]
+    assert executor.get_pool() is pool
+    assert other_worker in pool.workers
+    assert executor.execute(js_code, {"value": "after"}) == "after"
+
+    executor.shutdown()
+
+
+def test_encode_data():
+    """Test that the data is passed as JSON text below the shared memory threshold."""
+    data = {"name": "Žluťoučký kůň", "value": None}
+
+    json_data, block = encode_data(data, 1024)
+
+    assert block is None
+    assert json_data.text == '{"name":"Žluťoučký kůň","value":null}'
+    assert pickle.loads(pickle.dumps(json_data)).read_text() == json_data.text
+
+
+def test_encode_data_in_shared_memory():
+    """Test that the data above the threshold is passed in shared memory."""
+    data = {"nodes": ["node"] * 100}
+
+    json_data, block = encode_data(data, 100)
+    try:
+        assert json_data.text is None
+        copy = pickle.loads(pickle.dumps(json_data))
+        assert copy.read_text() == '{"nodes":[' + ",".join(['"node"'] * 100) + "]}"
+    finally:
+        release_shared_memory([block])
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(json_data.shm_name)
+
+
+def test_unknown_data_transport():
+    """Test that an unknown data transport is rejected."""
+    with pytest.raises(ValueError):
+        JsExecutor(data_transport="xml")
+
+
+@pytest.mark.parametrize("shared_memory_threshold", [0, 1])
+def test_execute_batch_json_transport(shared_memory_threshold):
+    """Test that the data passed as JSON is rendered like the Python objects."""
+    executor = JsExecutor(
+        data_transport="json", shared_memory_threshold=shared_memory_threshold
+    )
+    js_code = "(function(data) { return data.name + ' ' + data.missing; })"
+    other_js_code = "(function(data) { return String(data.name.length); })"
+    data = {"name": "A", "missing": None}
+
+    results = executor.execute_batch([(js_code, data), (other_js_code, data)])
+
+    assert results == [("success", "A undefined"), ("success", "1")]
+
+    executor.shutdown()
+
+
+def test_json_transport_encodes_outside_loop():
+    """Test that the async submission encodes the JSON data outside the event loop."""
+    executor = JsExecutor(data_transport="json")
+    pool = MagicMock()
+    pool.submit.return_value = Future()
+    threads = []
+
+    def encode(data, shared_memory_threshold):
+        threads.append(threading.get_ident())
+        return encode_data(data, shared_memory_threshold)
+
+    with (
+        patch.object(executor, "get_pool", return_value=pool),
+        patch.object(js_executor, "encode_data", side_effect=encode),
+    ):
+        asyncio.run(executor.submit_batch_async([("(function() {})", {"a": 1})]))
+
+    (tasks,) = pool.submit.call_args.args[1]
+    assert tasks[0][1].text == '{"a":1}'
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_batch_results_credited_to_worker_of_task():
+    """
+    Test that the evaluated functions are remembered for the worker that ran
+    the batch, not the one selected before the submission.
+    """
+    executor = JsExecutor()
+    selected_worker, running_worker = MagicMock(), MagicMock()
+    pool = MagicMock()
+    pool.select_worker.return_value = selected_worker
+    task_future = Future()
+    task_future.worker = running_worker
+    pool.submit.return_value = task_future
+    js_code = "(function(data) { return 'x'; })"
+
+    with patch.object(executor, "get_pool", return_value=pool):
+        future = executor.submit_batch([(js_code, {})])
+        task_future.set_result(([("success", "x")], [0.01], 0))
+
+    assert future.result() == [("success", "x")]
+    digest = get_code_digest(js_code)
+    assert digest in executor._get_worker_digests(running_worker)
+    assert digest not in executor._get_worker_digests(selected_worker)
+
+
+def test_latency_history():
+    """Test that the latency estimate needs enough samples and follows them."""
+    history = LatencyHistory()
+    for _ in range(9):
+        history.record("template", 0.1)
+
+    assert history.estimate("template") is None
+    history.record("template", 0.1)
+    assert history.estimate("template") == pytest.approx(0.1)
+    assert history.estimate("unknown") is None
+
+
+def test_template_timeout():
+    """Test the overridden, adaptive and default timeouts of the templates."""
+    executor = JsExecutor()
+    fast_js_code = "(function(data) { return 'fast'; })"
+    slow_js_code = "(function(data) { return 'slow'; })"
+    for _ in range(10):
+        executor._latencies.record(get_code_digest(fast_js_code), 0.01)
+    executor.set_template_timeout(slow_js_code, 60)
+
+    assert executor.get_template_timeout(fast_js_code) == 1
+    assert executor.get_template_timeout(slow_js_code) == 60
+    assert executor.get_template_timeout("(unknown)") == 5
+    assert executor._get_batch_timeout([(fast_js_code, {})] * 10, None) == 10
+    assert executor._get_batch_timeout([(slow_js_code, {})], None) == 60
+    # The timeouts shorter than the default one apply to the batch
+    assert executor._get_batch_timeout([(fast_js_code, {})], None) == 1
+    executor.set_template_timeout(slow_js_code, 0.5)
+    assert executor._get_batch_timeout([(slow_js_code, {})], None) == 0.5
+    assert executor._get_batch_timeout([(slow_js_code, {})] * 100, None) == 30
+
+    executor.set_template_timeout(slow_js_code, None)
+    assert executor.get_template_timeout(slow_js_code) == 5
+
+
 def test_get_js_executor_singleton():
     """Test that get_js_executor returns singleton JsExecutor instance."""
     executor1 = get_js_executor()
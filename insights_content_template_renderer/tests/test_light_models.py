@@ -0,0 +1,109 @@
+"""
+Unit tests for light_models.py module.
+"""
+
+import copy
+
+import pytest
+
+from insights_content_template_renderer.data import request_data_example
+from insights_content_template_renderer.light_models import (
+    LightValidationError,
+    parse_light_request,
+)
+from insights_content_template_renderer.models import RendererRequest
+from insights_content_template_renderer.utils import ContentIndex
+
+CLUSTER_ID = "5d5892d3-1f74-4ccf-91af-548dfc9767aa"
+
+
+def test_parse_light_request():
+    """Test that the fields read by the rendering are the same as of the model."""
+    request = parse_light_request(request_data_example)
+    model = RendererRequest.parse_obj(request_data_example)
+
+    assert request.content_version is None
+    assert request.timeout is None
+    assert request.report_data.clusters == model.report_data.clusters
+    report, expected = (
+        request.report_data.reports[CLUSTER_ID].reports[0],
+        model.report_data.reports[CLUSTER_ID].reports[0],
+    )
+    assert (report.component, report.key, report.details) == (
+        expected.component,
+        expected.key,
+        expected.details,
+    )
+    # The details are not copied
+    assert (
+        report.details
+        is request_data_example["report_data"]["reports"][CLUSTER_ID]["reports"][0][
+            "details"
+        ]
+    )
+    for rule, expected_rule in zip(request.content, model.content, strict=True):
+        assert rule.plugin == expected_rule.plugin
+        assert rule.error_keys == expected_rule.error_keys
+        assert rule.resolution == expected_rule.resolution
+        assert rule.reason == expected_rule.reason
+
+
+def test_parse_light_request_without_unused_fields():
+    """Test that the fields not read by the rendering are not required."""
+    data = copy.deepcopy(request_data_example)
+    for rule in data["content"]:
+        for field in ("generic", "summary", "more_info", "HasReason"):
+            del rule[field]
+    for cluster_data in data["report_data"]["reports"].values():
+        for report in cluster_data["reports"]:
+            del report["type"]
+
+    request = parse_light_request(data)
+
+    content_index = ContentIndex(request.content)
+    report = request.report_data.reports[CLUSTER_ID].reports[0]
+    assert content_index.get_rule_content(report) is request.content[0]
+
+
+@pytest.mark.parametrize(
+    "path,value,message",
+    [
+        (("content", 0, "reason"), None, "content.0.reason: expected str"),
+        (
+            ("content", 0, "plugin"),
+            {},
+            "content.0.plugin.python_module: field required",
+        ),
+        (
+            ("report_data", "reports", CLUSTER_ID, "reports", 0, "details"),
+            [],
+            f"report_data.reports.{CLUSTER_ID}.reports.0.details: expected dict",
+        ),
+        (("report_data", "clusters", 0), 1, "report_data.clusters.0: expected str"),
+        (("timeout",), True, "timeout: expected int or float"),
+        (("timeout",), float("nan"), "timeout: expected positive finite number"),
+        (("timeout",), -1, "timeout: expected positive finite number"),
+        (("content_version",), "version", "exactly one of content and content_version"),
+    ],
+)
+def test_parse_light_request_invalid(path, value, message):
+    """Test that the fields read by the rendering are checked."""
+    data = copy.deepcopy(request_data_example)
+    parent = data
+    for key in path[:-1]:
+        parent = parent[key]
+    parent[path[-1]] = value
+
+    with pytest.raises(LightValidationError, match=message):
+        parse_light_request(data)
+
+
+def test_parse_light_request_missing_field():
+    data = copy.deepcopy(request_data_example)
+    del data["report_data"]["reports"][CLUSTER_ID]["reports"][0]["component"]
+
+    with pytest.raises(
+        LightValidationError,
+        match=f"report_data.reports.{CLUSTER_ID}.reports.0.component: field required",
+    ):
+        parse_light_request(data)
@@ -1,8 +1,18 @@
 """Test the /metrics endpoint."""
 
+import os
+
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 
+from insights_content_template_renderer import utils
 from insights_content_template_renderer.endpoints import app
+from insights_content_template_renderer.worker_pool import WorkerPool
+
+
+def get_sample_value(name, labels=None):
+    """Returns the current value of the metric sample or 0 if it does not exist."""
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
 
 
 class TestMetricsEndpoint:  # pylint: disable=too-few-public-methods
@@ -14,3 +24,46 @@ class TestMetricsEndpoint:  # pylint: disable=too-few-public-methods
             response = client.get("/metrics")
             assert response.status_code == 200
             assert "http_requests_total" in response.text
+
+    def test_js_executor_metrics(self):
+        """Check that the metrics of the JS executor and the caches are exposed."""
+        with TestClient(app) as client:
+            response = client.get("/metrics")
+            assert "js_queue_depth" in response.text
+            assert "js_task_execution_seconds_bucket" in response.text
+            assert 'cache_hits_total{cache="template"}' in response.text
+
+
+class TestRenderingMetrics:
+    """Check the metrics observed while rendering."""
+
+    def test_cache_metrics(self):
+        """Check that the lookups of the compiled templates are counted."""
+        before = get_sample_value("cache_hits_total", {"cache": "template"})
+        utils.compile_template("Template counted by {{=pydata.name}}")
+        utils.compile_template("Template counted by {{=pydata.name}}")
+
+        assert get_sample_value("cache_hits_total", {"cache": "template"}) > before
+
+    def test_worker_pool_metrics(self):
+        """Check that the spawned workers and the sizes of their tasks are observed."""
+        spawns = get_sample_value("js_worker_spawns_total")
+        tasks = get_sample_value("js_ipc_payload_bytes_count", {"direction": "task"})
+        results = get_sample_value(
+            "js_ipc_payload_bytes_count", {"direction": "result"}
+        )
+
+        pool = WorkerPool(size=1)
+        pool.submit(os.getpid).result(timeout=30)
+        pool.close()
+        pool.join()
+
+        assert get_sample_value("js_worker_spawns_total") == spawns + 1
+        assert (
+            get_sample_value("js_ipc_payload_bytes_count", {"direction": "task"})
+            == tasks + 1
+        )
+        assert (
+            get_sample_value("js_ipc_payload_bytes_count", {"direction": "result"})
+            == results + 1
+        )
@@ -1,3 +1,6 @@
+import pydantic
+import pytest
+
 from insights_content_template_renderer.data import request_data_example
 from insights_content_template_renderer.models import RendererRequest
 
@@ -10,3 +13,23 @@ def test_renderer_request():
         .component
         == "ccx_rules_ocp.external.rules.1.report"
     )
+
+
+def test_renderer_request_with_content_version():
+    data = {
+        "content_version": "version",
+        "report_data": request_data_example["report_data"],
+    }
+    req = RendererRequest.parse_obj(data)
+    assert req.content is None
+    assert req.content_version == "version"
+
+
+@pytest.mark.parametrize("content_version", [None, "version"])
+def test_renderer_request_content_or_version_required(content_version):
+    data = {"report_data": request_data_example["report_data"]}
+    if content_version is not None:
+        data["content"] = request_data_example["content"]
+        data["content_version"] = content_version
+    with pytest.raises(pydantic.ValidationError):
+        RendererRequest.parse_obj(data)
@@ -0,0 +1,164 @@
+"""
+Unit tests for native_dot.py module.
+"""
+
+import pytest
+from prometheus_client import REGISTRY
+
+from insights_content_template_renderer import utils
+from insights_content_template_renderer.native_dot import (
+    NULL,
+    NativeTemplate,
+    UnsupportedTemplateError,
+    loose_equals,
+    to_boolean,
+    to_string,
+)
+
+DATA = {
+    "nodes": [{"name": "foo1", "memory": 8.16}, {"name": "foo2", "memory": 16.0}],
+    "count": 2,
+    "name": "node",
+    "empty": [],
+    "none": None,
+}
+
+
+def compile_native(template_text):
+    prepared_text = utils.prepare_template_text(template_text)
+    js_code = utils.renderer.template(prepared_text, utils.DoT_settings)
+    return NativeTemplate(prepared_text, js_code, utils.DoT_settings)
+
+
+def render_native(template_text, data=DATA):
+    return utils.unescape_raw_text_for_python(compile_native(template_text)(data))
+
+
+@pytest.mark.parametrize(
+    "template_text,expected",
+    [
+        ("No tags, it's a\nplain text", "No tags, it's a\nplain text"),
+        ("Node{{?pydata.nodes.length>1}}s{{?}} not working", "Nodes not working"),
+        ("{{~ pydata.nodes :node }}{{=node['name']}} {{~}}", "foo1 foo2 "),
+        ("{{~ pydata.nodes :node:i }}{{=i}}={{=node.memory}},{{~}}", "0=8.16,1=16,"),
+        (
+            "{{=pydata.count}} {{=pydata.none}} {{=pydata.missing}}",
+            "2 undefined undefined",
+        ),
+        ("{{=pydata.nodes[1].name}} {{=pydata.nodes[2]}}", "foo2 undefined"),
+        (
+            "{{? pydata.count === 1}}one{{?? pydata.count == 2}}two{{??}}more{{?}}",
+            "two",
+        ),
+        (
+            "{{? !pydata.none && pydata.empty}}empty array is truthy{{?}}",
+            "empty array is truthy",
+        ),
+        ("{{= pydata.none || pydata.name }}", "node"),
+        ("{{? pydata.none == null}}nullish{{?}}", "nullish"),
+        ("{{~ pydata.empty :item }}never{{~}}{{=item}}", "undefined"),
+        ("  leading and trailing white space  ", " leading and trailing white space "),
+    ],
+)
+def test_render_native(template_text, expected):
+    """Test that the native templates are rendered the same as by the JS function."""
+    assert render_native(template_text) == expected
+
+
+@pytest.mark.parametrize(
+    "template_text",
+    [
+        "{{ var x = 1; }}{{=x}}",
+        "{{=pydata.nodes.map(node => node.name)}}",
+        "{{=undeclared}}",
+        "{{? pydata.count }}unterminated",
+        "{{~ pydata.nodes :out }}{{=out}}{{~}}",
+        "{{=pydata.count + 1}}",
+    ],
+)
+def test_unsupported_template(template_text):
+    """Test that the templates outside of the subset are rejected when compiled."""
+    with pytest.raises(UnsupportedTemplateError):
+        compile_native(template_text)
+
+
+@pytest.mark.parametrize(
+    "template_text",
+    [
+        "{{=pydata.nodes}}",
+        "{{=pydata.none.name}}",
+        "{{=pydata.name.toUpperCase}}",
+        "{{? pydata.count == '2'}}loose{{?}}",
+        "{{=pydata.toString}}",
+    ],
+)
+def test_unsupported_data(template_text):
+    """Test that the data with semantics not modelled are rejected when rendered."""
+    template = compile_native(template_text)
+    with pytest.raises(UnsupportedTemplateError):
+        template(DATA)
+
+
+def test_js_conversions():
+    """Test the conversions of the values following the JS rules."""
+    assert to_string(1.0) == "1"
+    assert to_string(1e16 - 2.0) == "9999999999999998"
+    assert to_string(float(2**60)) == "1152921504606847000"
+    assert to_string(-1e20) == "-100000000000000000000"
+    assert to_string(0.5) == "0.5"
+    assert to_string(float("nan")) == "NaN"
+    assert to_string(True) == "true"
+    assert to_string(NULL) == "null"
+    with pytest.raises(UnsupportedTemplateError):
+        to_string(1e-7)
+
+    assert to_boolean({}) is True
+    assert to_boolean(0.0) is False
+    assert to_boolean("") is False
+    assert loose_equals(None, NULL) is True
+    with pytest.raises(UnsupportedTemplateError):
+        loose_equals(0, False)
+
+
+def test_native_template_cache():
+    """Test that the compiled native templates are cached by their JS code."""
+    template_text = "Native template {{=pydata.name}}"
+    js_code = utils.compile_template(template_text)
+
+    assert isinstance(utils.native_template_cache.get(js_code), NativeTemplate)
+    assert utils.render_native_template(js_code, DATA) == "Native template node"
+    assert utils.render_native_template(js_code, {"name": []}) is None
+
+
+@pytest.mark.parametrize(
+    "template_text,static",
+    [
+        ("Resolution without any tags", True),
+        ("{{? true }}constant condition{{?}}{{= 'literal' }}", True),
+        ("{{~ pydata.nodes :node }}{{=node.name}}{{~}}", False),
+        ("Node{{?pydata.nodes.length>1}}s{{?}}", False),
+    ],
+)
+def test_static_template(template_text, static):
+    """Test that the templates not reading the data are rendered when compiled."""
+    template = compile_native(template_text)
+
+    assert template.is_static == static
+    if static:
+        assert template.static_value == template(DATA)
+
+
+def test_render_static_template():
+    """Test that the static templates are rendered without any evaluation."""
+    js_code = utils.compile_template("Static resolution, it doesn't read the data")
+
+    def get_static_count():
+        return REGISTRY.get_sample_value(
+            "rendered_templates_total", {"engine": "static"}
+        )
+
+    before = get_static_count() or 0
+    rendered = utils.render_native_template(js_code, DATA)
+
+    assert rendered == "Static resolution, it doesn't read the data"
+    assert get_static_count() == before + 1
@@ -0,0 +1,86 @@
+"""
+Unit tests for registry.py module.
+"""
+
+import copy
+import json
+
+import pydantic
+import pytest
+
+from insights_content_template_renderer.data import request_data_example
+from insights_content_template_renderer.models import Content
+from insights_content_template_renderer.registry import (
+    ContentRegistry,
+    ContentVersionNotFoundError,
+    get_content_version,
+    load_content,
+)
+
+
+def get_content(data=request_data_example):
+    return pydantic.parse_obj_as(list[Content], data["content"])
+
+
+def test_content_version_is_stable():
+    """Test that equal content gets the same version and different content does not."""
+    changed_request = copy.deepcopy(request_data_example)
+    changed_request["content"][0]["reason"] = "Changed reason"
+
+    assert get_content_version(get_content()) == get_content_version(get_content())
+    assert get_content_version(get_content()) != get_content_version(
+        get_content(changed_request)
+    )
+
+
+def test_register_precompiles_templates():
+    """Test that the registration compiles the templates of all error keys."""
+    registry = ContentRegistry()
+
+    version, index = registry.register(get_content())
+
+    assert registry.get(version) is index
+    assert ("ccx_rules_ocp.external.rules.1", "RULE_1") in index._templates
+
+
+def test_register_known_content():
+    """Test that registering the same content again returns the registered index."""
+    registry = ContentRegistry()
+
+    version, index = registry.register(get_content())
+
+    assert registry.register(get_content()) == (version, index)
+
+
+def test_get_unknown_version():
+    """Test that unknown content version raises ContentVersionNotFoundError."""
+    registry = ContentRegistry()
+
+    with pytest.raises(ContentVersionNotFoundError):
+        registry.get("unknown")
+
+
+def test_registry_is_bounded():
+    """Test that the least recently used content version is dropped."""
+    registry = ContentRegistry(size=1)
+    changed_request = copy.deepcopy(request_data_example)
+    changed_request["content"][0]["reason"] = "Changed reason"
+
+    first_version, _ = registry.register(get_content())
+    registry.register(get_content(changed_request))
+
+    with pytest.raises(ContentVersionNotFoundError):
+        registry.get(first_version)
+
+
+def test_load_content(tmp_path):
+    """Test that the content is loaded from a file or from a directory."""
+    rules = request_data_example["content"]
+    bundle = tmp_path / "content.json"
+    bundle.write_text(json.dumps(rules))
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    (rules_dir / "rule_1.json").write_text(json.dumps(rules[0]))
+
+    assert load_content(bundle) == get_content()
+    assert load_content(rules_dir) == get_content()
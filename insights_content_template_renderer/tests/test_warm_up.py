@@ -0,0 +1,56 @@
+"""
+Unit tests for warm_up.py module.
+"""
+
+import json
+from unittest.mock import patch
+
+import pydantic
+
+from insights_content_template_renderer import utils
+from insights_content_template_renderer.bundle import build_bundle
+from insights_content_template_renderer.data import request_data_example
+from insights_content_template_renderer.models import Content
+from insights_content_template_renderer.registry import content_registry
+from insights_content_template_renderer.warm_up import warm_up
+
+
+@patch("insights_content_template_renderer.warm_up.get_js_executor")
+def test_warm_up(mock_get_js_executor):
+    """Test that the warm-up starts the JS workers without preloaded content."""
+    assert warm_up("") is None
+
+    mock_get_js_executor.return_value.warm_up.assert_called_once_with([])
+
+
+@patch("insights_content_template_renderer.warm_up.get_js_executor")
+def test_warm_up_preloads_content(mock_get_js_executor, tmp_path):
+    """Test that the preloaded content is registered with its templates compiled."""
+    content = request_data_example["content"]
+    content_path = tmp_path / "content.json"
+    content_path.write_text(json.dumps(content))
+
+    version = warm_up(str(content_path))
+
+    content_index = content_registry.get(version)
+    assert len(content_index.rules) == len(content)
+    mock_get_js_executor.return_value.warm_up.assert_called_once_with(
+        content_index.get_js_codes()
+    )
+
+
+@patch("insights_content_template_renderer.warm_up.get_js_executor")
+def test_warm_up_installs_bundle(mock_get_js_executor, tmp_path):
+    """Test that the functions of the template bundle are evaluated in the workers."""
+    content = pydantic.parse_obj_as(list[Content], request_data_example["content"])
+    bundle, _ = build_bundle(content)
+    bundle_path = tmp_path / "bundle.json"
+    bundle_path.write_text(json.dumps(bundle))
+
+    with patch.dict(utils.bundled_templates, clear=True):
+        assert warm_up("", str(bundle_path)) is None
+        assert len(utils.bundled_templates) == len(bundle["templates"])
+
+    mock_get_js_executor.return_value.warm_up.assert_called_once_with(
+        [bundle["functions"][digest] for digest in bundle["js_functions"]]
+    )
@@ -0,0 +1,261 @@
+"""
+Unit tests for worker_pool.py module.
+"""
+
+import os
+import time
+
+import pytest
+
+from insights_content_template_renderer.worker_pool import WorkerExitedError, WorkerPool
+
+
+def test_submit_returns_result():
+    """Test that the result of the function is returned by the future."""
+    pool = WorkerPool(size=1)
+
+    assert pool.submit(pow, (2, 10)).result(timeout=30) == 1024
+
+    pool.close()
+    pool.join()
+
+
+def test_submit_propagates_exception():
+    """Test that an exception raised in the worker is raised by the future."""
+    pool = WorkerPool(size=1)
+
+    with pytest.raises(ValueError):
+        pool.submit(int, ("not a number",)).result(timeout=30)
+
+    pool.close()
+    pool.join()
+
+
+def test_tasks_are_dispatched_to_least_loaded_worker():
+    """Test that a busy worker does not get the next task if another one is idle."""
+    pool = WorkerPool(size=2)
+    busy_worker = pool.select_worker()
+    pool.submit(time.sleep, (1,), busy_worker)
+
+    idle_worker = pool.select_worker()
+
+    assert idle_worker is not busy_worker
+    pids = {pool.submit(os.getpid).result(timeout=30) for _ in range(2)}
+    assert idle_worker.pid in pids
+
+    pool.close()
+    pool.join()
+
+
+def test_pool_scales_up_and_down():
+    """Test that the pool spawns a worker when busy and stops it when idle."""
+    pool = WorkerPool(size=1, max_size=2, scale_up_queue_depth=1, idle_timeout=0)
+    future = pool.submit(time.sleep, (0.5,))
+
+    assert len(pool.workers) == 1
+    second_worker = pool.select_worker()
+    assert len(pool.workers) == 2
+
+    future.result(timeout=30)
+    pool.submit(os.getpid, (), second_worker).result(timeout=30)
+    time.sleep(0.1)
+    pool.select_worker()
+    assert len(pool.workers) == 1
+
+    pool.close()
+    pool.join()
+
+
+def test_worker_exit_fails_pending_tasks():
+    """Test that the tasks of an exited worker fail and a new worker is spawned."""
+    pool = WorkerPool(size=1)
+
+    with pytest.raises(WorkerExitedError):
+        pool.submit(os._exit, (1,)).result(timeout=30)
+
+    assert pool.submit(pow, (2, 3)).result(timeout=30) == 8
+
+    pool.close()
+    pool.join()
+
+
+def test_worker_exit_removes_its_reader():
+    """Test that the reader of an exited worker is not kept by the pool."""
+    pool = WorkerPool(size=1)
+    readers = list(pool._readers)
+
+    with pytest.raises(WorkerExitedError):
+        pool.submit(os._exit, (1,)).result(timeout=30)
+    readers[0].join(timeout=30)
+
+    assert readers[0] not in pool._readers
+    # The worker is spawned again when dispatching the next task
+    assert pool.submit(pow, (2, 3)).result(timeout=30) == 8
+    assert len(pool._readers) == len(pool.workers) == 1
+
+    pool.close()
+    pool.join()
+    assert pool._readers == []
+
+
+def test_worker_exit_dispatches_queued_tasks():
+    """Test that the tasks queued behind the task of an exited worker are not lost."""
+    pool = WorkerPool(size=1)
+    worker = pool.select_worker()
+    exiting = pool.submit(os._exit, (1,), worker)
+    queued = pool.submit(os.getpid, (), worker)
+
+    with pytest.raises(WorkerExitedError):
+        exiting.result(timeout=30)
+    assert queued.result(timeout=30) != worker.pid
+
+    pool.close()
+    pool.join()
+
+
+def test_cancel_running_task_kills_its_worker():
+    """Test that cancelling a running task replaces only the worker running it."""
+    pool = WorkerPool(size=2)
+    hung_worker, other_worker = pool.workers
+    hung = pool.submit(time.sleep, (30,), hung_worker)
+    queued = pool.submit(os.getpid, (), hung_worker)
+    other = pool.submit(time.sleep, (0.5,), other_worker)
+    time.sleep(0.5)
+
+    assert pool.cancel_task(hung, TimeoutError("hung")) is True
+
+    with pytest.raises(TimeoutError):
+        hung.result(timeout=30)
+    assert queued.result(timeout=30) != hung_worker.pid
+    other.result(timeout=30)
+    assert other_worker in pool.workers
+    assert hung_worker not in pool.workers
+    assert len(pool.workers) == 2
+
+    pool.close()
+    pool.join()
+
+
+def test_cancel_queued_task():
+    """Test that cancelling a queued task does not kill the worker."""
+    pool = WorkerPool(size=1)
+    worker = pool.select_worker()
+    running = pool.submit(time.sleep, (0.5,), worker)
+    queued = pool.submit(os.getpid, (), worker)
+
+    assert pool.cancel_task(queued, TimeoutError("queued")) is False
+
+    with pytest.raises(TimeoutError):
+        queued.result(timeout=30)
+    running.result(timeout=30)
+    assert pool.workers == [worker]
+
+    pool.close()
+    pool.join()
+
+
+def test_cancelled_queued_task_is_not_run(tmp_path):
+    """Test that the worker skips a cancelled queued task."""
+    pool = WorkerPool(size=1)
+    worker = pool.select_worker()
+    running = pool.submit(time.sleep, (0.5,), worker)
+    queued = pool.submit(os.mkdir, (str(tmp_path / "cancelled"),), worker)
+    following = pool.submit(os.mkdir, (str(tmp_path / "following"),), worker)
+
+    pool.cancel_task(queued, TimeoutError("queued"))
+
+    running.result(timeout=30)
+    following.result(timeout=30)
+    assert not (tmp_path / "cancelled").exists()
+    assert (tmp_path / "following").exists()
+
+    pool.close()
+    pool.join()
+
+
+def test_cancelled_tasks_of_killed_worker_are_not_run(tmp_path):
+    """
+    Test that the queued task cancelled after its worker was killed is not
+    dispatched to another worker, as when the deadline of a request passes.
+    """
+    pool = WorkerPool(size=1)
+    worker = pool.select_worker()
+    running = pool.submit(time.sleep, (30,), worker)
+    queued = pool.submit(os.mkdir, (str(tmp_path / "cancelled"),), worker)
+    time.sleep(0.5)
+
+    assert pool.cancel_task(running, TimeoutError("deadline")) is True
+    assert pool.cancel_task(queued, TimeoutError("deadline")) is False
+
+    with pytest.raises(TimeoutError):
+        queued.result(timeout=30)
+    # The queue of the new worker is empty
+    pool.submit(os.getpid).result(timeout=30)
+    time.sleep(0.5)
+    assert pool.queue_depth == 0
+    assert not (tmp_path / "cancelled").exists()
+
+    pool.close()
+    pool.join()
+
+
+def test_retire_worker_finishes_queued_tasks():
+    """Test that a retired worker runs its queued tasks before it exits."""
+    pool = WorkerPool(size=1)
+    worker = pool.select_worker()
+    running = pool.submit(time.sleep, (0.5,), worker)
+    queued = pool.submit(os.getpid, (), worker)
+
+    assert pool.retire_worker(worker) is True
+    assert pool.retire_worker(worker) is False
+
+    running.result(timeout=30)
+    assert queued.result(timeout=30) == worker.pid
+    assert pool.submit(os.getpid).result(timeout=30) != worker.pid
+    assert worker not in pool.workers
+
+    pool.close()
+    pool.join()
+
+
+def test_future_records_worker_of_task():
+    """Test that the future records the worker the task has been dispatched to."""
+    pool = WorkerPool(size=2)
+    retired_worker = pool.select_worker()
+    pool.retire_worker(retired_worker)
+
+    future = pool.submit(os.getpid, (), retired_worker)
+
+    assert future.worker is not retired_worker
+    assert future.result(timeout=30) == future.worker.pid
+
+    pool.close()
+    pool.join()
+
+
+def test_terminate_fails_running_tasks():
+    """Test that terminating the pool fails the running tasks."""
+    pool = WorkerPool(size=1)
+    future = pool.submit(time.sleep, (30,))
+
+    pool.terminate()
+
+    with pytest.raises(WorkerExitedError):
+        future.result(timeout=30)
+    with pytest.raises(ValueError):
+        pool.submit(pow, (2, 3))
+
+
+def test_queue_depth():
+    """Test that the queue depth counts queued and running tasks."""
+    pool = WorkerPool(size=1)
+    futures = [pool.submit(time.sleep, (0.2,)) for _ in range(3)]
+
+    assert pool.queue_depth == 3
+
+    for future in futures:
+        future.result(timeout=30)
+    assert pool.queue_depth == 0
+
+    pool.close()
+    pool.join()
@@ -2,11 +2,18 @@
 Unit tests for utils.py
 """
 
+import asyncio
+import copy
+import gc
+import time
+from unittest.mock import AsyncMock, patch
+
 import pydantic
 import pytest
 import pythonmonkey as pm
 
 from insights_content_template_renderer import utils
+from insights_content_template_renderer.cache import LRUCache, TTLCache
 from insights_content_template_renderer.data import request_data_example
 from insights_content_template_renderer.models import (
     Content,
@@ -14,6 +21,7 @@ from insights_content_template_renderer.models import (
     RendererRequest,
     RendererResponse,
     Report,
+    UnrenderedReport,
 )
 
 
@@ -57,6 +65,36 @@ def test_escape_raw_text_for_js():
     )
 
 
+def test_compile_template_is_cached():
+    """
+    Checks that compile_template() compiles each distinct template only once.
+    """
+    utils.template_cache.clear()
+    template_text = "Node{{?pydata.nodes.length>1}}s{{?}} not working."
+
+    js_code = utils.compile_template(template_text)
+    assert js_code.startswith("(function anonymous(pydata)")
+    assert utils.compile_template(template_text) is js_code
+
+    stats = utils.template_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+
+def test_template_digest_depends_on_settings():
+    """
+    Checks that the same template compiled with different settings gets a different digest.
+    """
+    template_text = "{{=pydata.name}}"
+    digest = utils.get_template_digest(template_text)
+
+    assert digest == utils.get_template_digest(template_text, utils.DoT_settings)
+    assert digest != utils.get_template_digest(
+        template_text, utils.DoT_settings._replace(strip=False)
+    )
+    assert digest != utils.get_template_digest("{{=pydata.other}}")
+
+
 def test_render_resolution():
     """
     Checks that the render_resolution() function renders resolution correctly.
@@ -86,6 +124,30 @@ def test_render_reason():
     assert rendered == result
 
 
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_template_function_uses_template_timeout(mock_get_js_executor):
+    """
+    Checks that the template function leaves the timeout to the JS executor,
+    so the timeouts of the templates apply.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute.return_value = "x"
+    report = Report.parse_obj(
+        request_data_example["report_data"]["reports"][
+            "5d5892d3-1f74-4ccf-91af-548dfc9767aa"
+        ]["reports"][0]
+    )
+
+    template_func = utils.get_template_function(
+        "reason", "{{=pydata.link.toUpperCase()}}", report
+    )
+
+    assert template_func(report.details) == "x"
+    executor.execute.assert_called_once()
+    assert executor.execute.call_args.kwargs["timeout"] is None
+
+
 def test_render_description():
     """
     Checks that render_reason() function renders reason correctly.
@@ -137,6 +199,65 @@ def test_render_report_missing_rule_content():
         utils.render_report(contents, report)
 
 
+def test_content_index():
+    """
+    Checks that ContentIndex finds the content and compiled templates of the report.
+    """
+    cluster_reports = request_data_example["report_data"]["reports"][
+        "5d5892d3-1f74-4ccf-91af-548dfc9767aa"
+    ]
+    report = Report.parse_obj(cluster_reports["reports"][0])
+    contents = pydantic.parse_obj_as(list[Content], request_data_example["content"])
+    index = utils.ContentIndex(contents)
+
+    assert index.get_rule_content(report) is contents[0]
+    templates = index.get_compiled_templates(report)
+    assert set(templates) == {"resolution", "reason", "description"}
+    assert templates["reason"] == utils.compile_template(
+        "Node{{?pydata.nodes.length>1}}s{{?}} not working."
+    )
+    assert index.get_compiled_templates(report) is templates
+
+
+def test_content_index_unknown_rule():
+    """
+    Checks that ContentIndex rejects reports of unknown rules and error keys.
+    """
+    contents = pydantic.parse_obj_as(list[Content], request_data_example["content"])
+    index = utils.ContentIndex(contents)
+    unknown_rule = Report(
+        type="rule", component="unknown.rule.report", key="RULE_1", details={}
+    )
+    unknown_error_key = Report(
+        type="rule",
+        component="ccx_rules_ocp.external.rules.1.report",
+        key="UNKNOWN",
+        details={},
+    )
+
+    with pytest.raises(utils.RuleNotFoundError):
+        index.get_rule_content(unknown_rule)
+    with pytest.raises(utils.RuleNotFoundError):
+        index.get_compiled_templates(unknown_rule)
+    with pytest.raises(utils.RuleNotFoundError):
+        index.get_compiled_templates(unknown_error_key)
+
+
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_skips_unknown_rules(mock_get_js_executor):
+    """
+    Checks that render_reports() does not render the reports of unknown rules.
+    """
+    executor = mock_get_js_executor.return_value
+
+    request = copy.deepcopy(request_data_example)
+    request["content"] = []
+    rendered = utils.render_reports(RendererRequest.parse_obj(request))
+
+    executor.execute_batch.assert_not_called()
+    assert rendered.reports == {}
+
+
 def test_render_reports():
     """
     Checks that render_reports() function renders all reports correctly.
@@ -157,7 +278,411 @@ def test_render_reports():
     }
     req = RendererRequest.parse_obj(request_data_example)
     rendered = utils.render_reports(req)
-    assert RendererResponse.parse_obj(rendered).dict() == result
+    assert RendererResponse.parse_obj(rendered).dict(exclude_none=True) == result
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_uses_single_batch(mock_get_js_executor):
+    """
+    Checks that render_reports() renders all templates of the request in one batch.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: [("success", "x")] * len(jobs)
+
+    req = RendererRequest.parse_obj(request_data_example)
+    rendered = utils.render_reports(req)
+
+    executor.execute_batch.assert_called_once()
+    jobs = executor.execute_batch.call_args.args[0]
+    assert len(jobs) == 3
+    report = rendered.reports["5d5892d3-1f74-4ccf-91af-548dfc9767aa"][0]
+    assert report.reason == report.resolution == report.description == "x"
+
+
+def get_request_with_identical_reports():
+    """
+    Returns the example request with three clusters, two of them with identical reports.
+    """
+    request = copy.deepcopy(request_data_example)
+    reports = request["report_data"]["reports"]
+    cluster_data = next(iter(reports.values()))
+    reports["cluster-2"] = copy.deepcopy(cluster_data)
+    reports["cluster-3"] = copy.deepcopy(cluster_data)
+    reports["cluster-3"]["reports"][0]["details"]["different"] = True
+    request["report_data"]["clusters"] += ["cluster-2", "cluster-3"]
+    return RendererRequest.parse_obj(request)
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_deduplicates_reports(mock_get_js_executor):
+    """
+    Checks that the identical reports of different clusters are rendered once.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: [
+        ("success", str(sorted(data))) for _, data in jobs
+    ]
+
+    req = get_request_with_identical_reports()
+    rendered = utils.render_reports(req)
+
+    assert len(executor.execute_batch.call_args.args[0]) == 6
+    first, second, third = (reports[0] for reports in rendered.reports.values())
+    assert first is second
+    assert third != first
+
+    with patch.object(utils, "DEDUPLICATE_REPORTS", False):
+        assert utils.render_reports(req) == rendered
+    assert len(executor.execute_batch.call_args.args[0]) == 9
+
+
+def get_request_with_backslash():
+    """
+    Returns the request with identical reports, the details of the report
+    of cluster-3 contain a backslash which cannot be unescaped.
+    """
+    req = get_request_with_identical_reports()
+    details = req.report_data.reports["cluster-3"].reports[0].details
+    details["nodes"][0]["name"] = "foo\\x"
+    return req
+
+
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+def test_render_reports_skips_report_with_backslash():
+    """
+    Checks that only the report whose rendered text cannot be unescaped is skipped.
+    """
+    rendered = utils.render_reports(get_request_with_backslash())
+
+    assert list(rendered.reports) == ["5d5892d3-1f74-4ccf-91af-548dfc9767aa"] + [
+        "cluster-2"
+    ]
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_skips_js_report_with_backslash(mock_get_js_executor):
+    """
+    Checks that the report whose text rendered by the JS worker cannot be unescaped
+    is skipped.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: [
+        ("success", data["nodes"][0]["name"]) for _, data in jobs
+    ]
+
+    rendered = utils.render_reports(get_request_with_backslash())
+
+    assert list(rendered.reports) == ["5d5892d3-1f74-4ccf-91af-548dfc9767aa"] + [
+        "cluster-2"
+    ]
+    assert rendered.reports["cluster-2"][0].reason == "foo1"
+
+
+def test_split_jobs():
+    """
+    Checks that the jobs are split into batches without splitting the reports.
+    """
+    details = [{"report": i} for i in range(10)]
+    jobs = [(field, data) for data in details for field in ("a", "b", "c")]
+
+    assert utils.split_jobs(jobs, concurrency=1, min_size=1) == [jobs]
+    batches = utils.split_jobs(jobs, concurrency=4, min_size=10)
+    assert [len(batch) for batch in batches] == [12, 9, 9]
+    batches = utils.split_jobs(jobs, concurrency=4, min_size=1)
+    assert [len(batch) for batch in batches] == [9, 6, 9, 6]
+    assert [job for batch in batches for job in batch] == jobs
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.RENDER_CONCURRENCY", 3)
+@patch("insights_content_template_renderer.utils.RENDER_BATCH_MIN_SIZE", 1)
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_in_parallel(mock_get_js_executor):
+    """
+    Checks that the templates are rendered in parallel batches in the request order.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batches.side_effect = lambda batches, deadline: [
+        [("success", str(sorted(data))) for _, data in jobs] for jobs in batches
+    ]
+
+    with patch.object(utils, "DEDUPLICATE_REPORTS", False):
+        rendered = utils.render_reports(get_request_with_identical_reports())
+
+    batches = executor.execute_batches.call_args.args[0]
+    assert [len(jobs) for jobs in batches] == [3, 3, 3]
+    executor.execute_batch.assert_not_called()
+    assert list(rendered.reports) == ["5d5892d3-1f74-4ccf-91af-548dfc9767aa"] + [
+        "cluster-2",
+        "cluster-3",
+    ]
+    assert "different" in rendered.reports["cluster-3"][0].reason
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.RENDER_CONCURRENCY", 3)
+@patch("insights_content_template_renderer.utils.RENDER_BATCH_MIN_SIZE", 1)
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_deadline(mock_get_js_executor):
+    """
+    Checks that the reports not rendered before the deadline are listed as unrendered.
+    """
+    executor = mock_get_js_executor.return_value
+    # Only the first batch finishes before the deadline
+    executor.execute_batches.side_effect = lambda batches, deadline: (
+        [[("success", "x")] * len(batches[0])] + [None] * (len(batches) - 1)
+    )
+
+    req = get_request_with_identical_reports()
+    req.timeout = 10
+    start = time.monotonic()
+    with patch.object(utils, "DEDUPLICATE_REPORTS", False):
+        rendered = utils.render_reports(req)
+
+    deadline = executor.execute_batches.call_args.kwargs["deadline"]
+    assert start + 10 <= deadline <= time.monotonic() + 10
+    assert list(rendered.reports) == ["5d5892d3-1f74-4ccf-91af-548dfc9767aa"]
+    assert rendered.unrendered == [
+        UnrenderedReport(
+            cluster=cluster,
+            rule_id="ccx_rules_ocp.external.rules.1",
+            error_key="RULE_1",
+        )
+        for cluster in ("cluster-2", "cluster-3")
+    ]
+
+
+def test_build_response_content():
+    """
+    Checks that the response is built as plain dictionaries in the format of
+    the response model and the identical reports share the rendered report.
+    """
+    req = get_request_with_identical_reports()
+    report = req.report_data.reports["cluster-2"].reports[0]
+    fields = {"resolution": 0, "reason": 1, "description": None}
+    unrendered_fields = {"resolution": 0, "reason": 2, "description": None}
+    planned_reports = [
+        ("cluster-2", report, fields),
+        ("cluster-3", report, fields),
+        ("cluster-3", report, unrendered_fields),
+    ]
+    rendered = ["resolution", "reason", None]
+
+    content = utils.build_response_content(req, planned_reports, rendered, partial=True)
+
+    rendered_report = {
+        "rule_id": "ccx_rules_ocp.external.rules.1",
+        "error_key": "RULE_1",
+        "resolution": "resolution",
+        "reason": "reason",
+        "description": "",
+    }
+    assert content == {
+        "clusters": req.report_data.clusters,
+        "reports": {"cluster-2": [rendered_report], "cluster-3": [rendered_report]},
+        "unrendered": [
+            {
+                "cluster": "cluster-3",
+                "rule_id": "ccx_rules_ocp.external.rules.1",
+                "error_key": "RULE_1",
+            }
+        ],
+    }
+    assert content["reports"]["cluster-2"][0] is content["reports"]["cluster-3"][0]
+    assert RendererResponse.parse_obj(content) == utils.build_response(
+        req, planned_reports, rendered, partial=True
+    )
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_template_error(mock_get_js_executor):
+    """
+    Checks that render_reports() raises RuntimeError if any template fails.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: (
+        [("error", "JS error")] * len(jobs)
+    )
+
+    req = RendererRequest.parse_obj(request_data_example)
+    with pytest.raises(RuntimeError):
+        utils.render_reports(req)
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_async(mock_get_js_executor):
+    """
+    Checks that render_reports_async() awaits the results of the JS executor.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch_async = AsyncMock(
+        side_effect=lambda jobs: [("success", "x")] * len(jobs)
+    )
+
+    req = RendererRequest.parse_obj(request_data_example)
+    rendered = asyncio.run(utils.render_reports_async(req))
+
+    executor.execute_batch_async.assert_awaited_once()
+    executor.execute_batch.assert_not_called()
+    report = rendered.reports["5d5892d3-1f74-4ccf-91af-548dfc9767aa"][0]
+    assert report.reason == report.resolution == report.description == "x"
+
+
+def test_render_response_content_async_does_not_block_loop():
+    """
+    Checks that the event loop keeps running while the reports of a large request
+    are planned and rendered by the native template engine.
+    """
+    data = copy.deepcopy(request_data_example)
+    report = data["report_data"]["reports"].pop("5d5892d3-1f74-4ccf-91af-548dfc9767aa")
+    for index in range(5000):
+        cluster = copy.deepcopy(report)
+        cluster["reports"][0]["details"]["nodes"][0]["name"] = f"node{index}"
+        data["report_data"]["reports"][f"cluster{index}"] = cluster
+    req = RendererRequest.parse_obj(data)
+
+    async def render():
+        gaps = []
+        rendering = asyncio.ensure_future(utils.render_response_content_async(req))
+        start = last = time.perf_counter()
+        while not rendering.done():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+        return await rendering, max(gaps), time.perf_counter() - start
+
+    # The pauses of the garbage collector stop the event loop too
+    gc.disable()
+    try:
+        content, max_gap, elapsed = asyncio.run(render())
+    finally:
+        gc.enable()
+
+    assert len(content["reports"]) == 5000
+    assert max_gap < elapsed / 4
+
+
+# The templates compiled for the JS worker only are not cached for the other tests
+@patch("insights_content_template_renderer.utils.template_cache", LRUCache(16))
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_stream(mock_get_js_executor):
+    """
+    Checks that render_reports_stream() renders each cluster in its own batch
+    and yields the clusters in the order of the request.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch_async = AsyncMock(
+        side_effect=lambda jobs: [("success", "x")] * len(jobs)
+    )
+    request_data = copy.deepcopy(request_data_example)
+    reports = request_data["report_data"]["reports"]
+    cluster_reports = next(iter(reports.values()))
+    reports["00000000-0000-0000-0000-000000000000"] = cluster_reports
+
+    async def collect():
+        req = RendererRequest.parse_obj(request_data)
+        return [cluster async for cluster in utils.render_reports_stream(req)]
+
+    rendered_clusters = asyncio.run(collect())
+
+    assert executor.execute_batch_async.await_count == 2
+    assert [cluster.cluster for cluster in rendered_clusters] == list(reports)
+    for cluster in rendered_clusters:
+        assert [report.reason for report in cluster.reports] == ["x"]
+
+
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_native_templates(mock_get_js_executor):
+    """
+    Checks that render_reports() renders the native templates in-process.
+    """
+    req = RendererRequest.parse_obj(request_data_example)
+    rendered = utils.render_reports(req)
+
+    mock_get_js_executor.return_value.execute_batch.assert_not_called()
+    report = rendered.reports["5d5892d3-1f74-4ccf-91af-548dfc9767aa"][0]
+    assert report.description == "RULE_1 description foo1"
+
+
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_reports_native_fallback(mock_get_js_executor):
+    """
+    Checks that render_reports() renders the templates outside of the native
+    subset in the JS worker.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: [("success", "x")] * len(jobs)
+
+    request = copy.deepcopy(request_data_example)
+    request["content"][0]["error_keys"]["RULE_1"]["reason"] = (
+        "{{= pydata.nodes.map(node => node.name).join() }}"
+    )
+    rendered = utils.render_reports(RendererRequest.parse_obj(request))
+
+    jobs = executor.execute_batch.call_args.args[0]
+    assert len(jobs) == 1
+    report = rendered.reports["5d5892d3-1f74-4ccf-91af-548dfc9767aa"][0]
+    assert report.reason == "x"
+    assert report.description == "RULE_1 description foo1"
+
+
+def test_native_templates_match_js():
+    """
+    Differential test checking that the native templates render the bundled
+    example data the same as the JS worker.
+    """
+    request = RendererRequest.parse_obj(request_data_example)
+    _, jobs = utils.plan_reports(request)
+
+    native = [utils.render_native_template(js_code, data) for js_code, data in jobs]
+    with patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js"):
+        js = utils.render_templates(jobs)
+
+    assert None not in native
+    assert native == js
+
+
+def test_details_digest_is_canonical():
+    """
+    Checks that equal details get the same digest regardless of the order of keys.
+    """
+    details = {"nodes": [{"name": "foo1", "role": "master"}], "link": "url"}
+    reordered = {"link": "url", "nodes": [{"role": "master", "name": "foo1"}]}
+    different = {"nodes": [{"name": "foo2", "role": "master"}], "link": "url"}
+
+    assert utils.get_details_digest(details) == utils.get_details_digest(reordered)
+    assert utils.get_details_digest(details) != utils.get_details_digest(different)
+    assert utils.get_details_digest({1: "a", "b": 2}) is None
+
+
+@patch("insights_content_template_renderer.utils.TEMPLATE_ENGINE", "js")
+@patch("insights_content_template_renderer.utils.get_js_executor")
+def test_render_cache(mock_get_js_executor):
+    """
+    Checks that the strings rendered by the JS worker are cached.
+    """
+    executor = mock_get_js_executor.return_value
+    executor.execute_batch.side_effect = lambda jobs: [("success", "x")] * len(jobs)
+    jobs = [("(js_code)", {"a": 1, "b": 2}), ("(js_code)", {"b": 2, "a": 1})]
+
+    with patch.object(utils, "render_cache", TTLCache(maxbytes=10**6)) as cache:
+        assert utils.render_templates(jobs[:1]) == ["x"]
+        assert utils.render_templates(jobs) == ["x", "x"]
+
+    # The details of the second job are equal to the first one
+    executor.execute_batch.assert_called_once_with(jobs[:1])
+    assert cache.hits == 2
 
 
 def test_escape_new_line_inside_brackets():
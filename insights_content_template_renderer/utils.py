@@ -2,24 +2,90 @@
 Provides all business logic for this service.
 """
 
+import asyncio
+import hashlib
+import json
 import logging
+import os
 import re
+import sys
+import time
 
 from insights_content_template_renderer import dot
+from insights_content_template_renderer.cache import LRUCache, TTLCache
 from insights_content_template_renderer.dot import DEFAULT_TEMPLATE_SETTINGS
-from insights_content_template_renderer.js_executor import get_js_executor
+from insights_content_template_renderer.js_executor import (
+    JS_POOL_MAX_SIZE,
+    get_code_digest,
+    get_js_executor,
+)
+from insights_content_template_renderer.metrics import (
+    cache_metrics,
+    compiled_templates,
+    render_cache_bytes,
+    render_cache_lookups,
+    rendered_templates,
+    report_deduplication_ratio,
+    unrendered_reports,
+)
 from insights_content_template_renderer.models import (
     Content,
+    RenderedCluster,
     RenderedReport,
     RendererRequest,
     RendererResponse,
     Report,
 )
+from insights_content_template_renderer.native_dot import (
+    NativeTemplate,
+    UnsupportedTemplateError,
+)
 
 DoT_settings = DEFAULT_TEMPLATE_SETTINGS
 log = logging.getLogger(__name__)
 renderer = dot.Renderer()
 
+# Maximal number of compiled templates kept in memory by each process
+TEMPLATE_CACHE_SIZE = int(os.environ.get("TEMPLATE_CACHE_SIZE", "1024"))
+template_cache = LRUCache(TEMPLATE_CACHE_SIZE)
+
+# Engine rendering the templates: "native" renders the templates written in the safe
+# subset of DoT.js in-process and the others in the JS worker, "js" renders all
+# templates in the JS worker and "verify" renders them by both engines, logs
+# the differences and returns the results of the JS worker
+TEMPLATE_ENGINE = os.environ.get("TEMPLATE_ENGINE", "native")
+
+# JS code of the templates compiled offline by their template digests,
+# see insights_content_template_renderer.bundle
+bundled_templates = {}
+
+# Native templates by the JS code of their compiled DoT.js templates
+native_template_cache = LRUCache(TEMPLATE_CACHE_SIZE)
+
+# Timeouts in seconds of the templates of the error keys overriding the default
+# timeout, as a JSON object with "<rule module>|<error key>" keys
+TEMPLATE_TIMEOUTS = json.loads(os.environ.get("TEMPLATE_TIMEOUTS", "{}"))
+
+# Maximal size in bytes of the strings rendered by the JS worker cached by each
+# process, the cache is disabled by default
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", "0"))
+# Seconds after which a cached rendered string expires
+RENDER_CACHE_TTL = float(os.environ.get("RENDER_CACHE_TTL", "300"))
+render_cache = TTLCache(RENDER_CACHE_MAX_BYTES, RENDER_CACHE_TTL)
+
+# Maximal number of batches of the templates of one request rendered by the JS
+# workers in parallel
+RENDER_CONCURRENCY = int(os.environ.get("RENDER_CONCURRENCY", str(JS_POOL_MAX_SIZE)))
+# Minimal number of templates in each of the batches rendered in parallel
+RENDER_BATCH_MIN_SIZE = int(os.environ.get("RENDER_BATCH_MIN_SIZE", "16"))
+
+# Render the identical reports of a request once
+DEDUPLICATE_REPORTS = os.environ.get("DEDUPLICATE_REPORTS", "true").lower() == "true"
+
+cache_metrics.register("template", template_cache)
+cache_metrics.register("native_template", native_template_cache)
+cache_metrics.register("render", render_cache)
+
 
 class RuleNotFoundError(Exception):
     """
@@ -86,6 +152,92 @@ def unescape_raw_text_for_python(text):
     return text.encode().decode("unicode-escape")
 
 
+# Marks the templates whose rendered text cannot be unescaped, e.g. because of
+# a backslash in the details, their reports are skipped
+RENDERING_FAILED = object()
+
+
+def unescape_rendered_text(text, js_code):
+    """
+    Unescapes the rendered text of the template.
+
+    :param text: text rendered by the template
+    :param js_code: JS code of the template
+    :return: the unescaped string or RENDERING_FAILED
+    """
+    try:
+        return unescape_raw_text_for_python(text)
+    except ValueError as exception:
+        log.debug(
+            "Failed to unescape the rendered template: %s",
+            exception,
+            extra={"js_code": js_code},
+        )
+        return RENDERING_FAILED
+
+
+def prepare_template_text(template_text):
+    """
+    Escapes the DoT.js template before its compilation by doT.
+
+    :param template_text: template in DoT.js format
+    :return: escaped template
+    """
+    return escape_new_line_inside_brackets(escape_raw_text_for_js(template_text))
+
+
+def get_template_digest(template_text, settings=None):
+    """
+    Returns the digest identifying the template compiled with the given DoT settings.
+
+    :param template_text: template in DoT.js format
+    :param settings: DoT settings used for the compilation (default: DoT_settings)
+    :return: hexadecimal SHA-256 digest
+    """
+    if settings is None:
+        settings = DoT_settings
+    digest = hashlib.sha256(repr(tuple(settings)).encode())
+    digest.update(template_text.encode())
+    return digest.hexdigest()
+
+
+def compile_template(template_text, settings=None):
+    """
+    Compiles the DoT.js template into the JS function code.
+    The compiled code is cached, so each distinct template is compiled once per process.
+    The templates of the installed bundle are not compiled by doT.
+
+    :param template_text: template in DoT.js format
+    :param settings: DoT settings used for the compilation (default: DoT_settings)
+    :return: JS code of the function rendering the template
+    """
+    if settings is None:
+        settings = DoT_settings
+    template_digest = get_template_digest(template_text, settings)
+
+    def compile_js_code():
+        prepared_text = prepare_template_text(template_text)
+        wrapped_js_code = bundled_templates.get(template_digest)
+        if wrapped_js_code is None:
+            js_code = renderer.template(prepared_text, settings)
+            wrapped_js_code = f"({js_code})"
+        else:
+            js_code = wrapped_js_code[1:-1]
+        engine = "js"
+        if TEMPLATE_ENGINE != "js":
+            try:
+                native_template = NativeTemplate(prepared_text, js_code, settings)
+            except UnsupportedTemplateError as exception:
+                log.debug("Template is rendered by the JS worker: %s", exception)
+            else:
+                native_template_cache.put(wrapped_js_code, native_template)
+                engine = "static" if native_template.is_static else "native"
+        compiled_templates.labels(engine).inc()
+        return wrapped_js_code
+
+    return template_cache.get_or_create(template_digest, compile_js_code)
+
+
 def get_template_function(template_name, template_text, report: Report):
     """
     Retrieves the DoT.js template based on the name of the field in the given content data
@@ -104,20 +256,22 @@ def get_template_function(template_name, template_text, report: Report):
             + f"and error key '{reported_error_key}'."
         )
 
-    template_text_no_newline_inside_brackets = escape_new_line_inside_brackets(
-        escape_raw_text_for_js(template_text)
-    )
-
-    js_code = renderer.template(template_text_no_newline_inside_brackets, DoT_settings)
-
-    wrapped_js_code = f"({js_code})"
+    wrapped_js_code = compile_template(template_text)
 
     # Return a callable that executes the JS in a reusable worker process
     def template_func(data):
+        # The static templates are rendered once when they are compiled
+        native_template = native_template_cache.get(wrapped_js_code)
+        if native_template is not None and native_template.is_static:
+            rendered_templates.labels("static").inc()
+            return native_template.static_value
+
+        rendered_templates.labels("js").inc()
         try:
-            # Get the JS executor and execute the template
+            # Get the JS executor and execute the template, the timeout is the one
+            # of the template (TEMPLATE_TIMEOUTS or the adaptive timeout)
             executor = get_js_executor()
-            result = executor.execute(wrapped_js_code, data, timeout=5)
+            result = executor.execute(wrapped_js_code, data, timeout=None)
             return result
 
         except TimeoutError:
@@ -132,22 +286,69 @@ def get_template_function(template_name, template_text, report: Report):
     return template_func
 
 
-def render_description(rule_content: Content, report: Report):
+def get_description_template(rule_content: Content, error_key: str):
     """
-    Renders report description.
+    Returns the template of report description.
 
     :param rule_content: dictionary with content data for reported rule
-    :param report: dictionary with report details
-    :return: string with rendered description
+    :param error_key: reported error key
+    :return: template in DoT.js format or None if the rule has no description
     """
-    reported_error_key = get_reported_error_key(report)
-    error_key_content = rule_content.error_keys[reported_error_key]
+    error_key_content = rule_content.error_keys[error_key]
 
     if (
         "description" in error_key_content["metadata"]
         and error_key_content["metadata"]["description"]
     ):
-        template_text = error_key_content["metadata"]["description"]
+        return error_key_content["metadata"]["description"]
+    return None
+
+
+def get_resolution_template(rule_content: Content, error_key: str):
+    """
+    Returns the template of report resolution.
+
+    :param rule_content: dictionary with content data for reported rule
+    :param error_key: reported error key
+    :return: template in DoT.js format
+    """
+    template_text = rule_content.resolution
+
+    error_key_content = rule_content.error_keys[error_key]
+
+    if "resolution" in error_key_content and error_key_content["resolution"]:
+        template_text = error_key_content["resolution"]
+    return template_text
+
+
+def get_reason_template(rule_content: Content, error_key: str):
+    """
+    Returns the template of report reason.
+
+    :param rule_content: dictionary with content data for reported rule
+    :param error_key: reported error key
+    :return: template in DoT.js format
+    """
+    template_text = rule_content.reason
+
+    error_key_content = rule_content.error_keys[error_key]
+
+    if "reason" in error_key_content and error_key_content["reason"]:
+        template_text = error_key_content["reason"]
+    return template_text
+
+
+def render_description(rule_content: Content, report: Report):
+    """
+    Renders report description.
+
+    :param rule_content: dictionary with content data for reported rule
+    :param report: dictionary with report details
+    :return: string with rendered description
+    """
+    template_text = get_description_template(
+        rule_content, get_reported_error_key(report)
+    )
 
     try:
         description_template = get_template_function(
@@ -166,13 +367,9 @@ def render_resolution(rule_content: Content, report: Report):
     :param report: dictionary with report details
     :return: string with rendered resolution
     """
-    template_text = rule_content.resolution
-
-    reported_error_key = get_reported_error_key(report)
-    error_key_content = rule_content.error_keys[reported_error_key]
-
-    if "resolution" in error_key_content and error_key_content["resolution"]:
-        template_text = error_key_content["resolution"]
+    template_text = get_resolution_template(
+        rule_content, get_reported_error_key(report)
+    )
 
     try:
         resolution_template = get_template_function("resolution", template_text, report)
@@ -189,13 +386,7 @@ def render_reason(rule_content: Content, report: Report):
     :param report: dictionary with report details
     :return: string with rendered reason
     """
-    template_text = rule_content.reason
-
-    reported_error_key = get_reported_error_key(report)
-    error_key_content = rule_content.error_keys[reported_error_key]
-
-    if "reason" in error_key_content and error_key_content["reason"]:
-        template_text = error_key_content["reason"]
+    template_text = get_reason_template(rule_content, get_reported_error_key(report))
 
     try:
         reason_template = get_template_function("reason", template_text, report)
@@ -204,6 +395,144 @@ def render_reason(rule_content: Content, report: Report):
     return unescape_raw_text_for_python(reason_template(report.details))
 
 
+def get_rule_content(content: list[Content], report: Report) -> Content:
+    """
+    Returns the content data of the reported rule.
+
+    :param content: list with content data for all rules
+    :param report: dictionary with report details
+    :return: content data for reported rule
+    """
+    reported_module = get_reported_module(report)
+
+    for rule in content:
+        if reported_module == rule.plugin["python_module"]:
+            return rule
+
+    msg = f"The rule content for '{reported_module}' has not been found."
+    raise RuleNotFoundError(msg)
+
+
+def get_report_templates(rule_content: Content, error_key: str) -> dict:
+    """
+    Returns the templates of all rendered fields of the reported error key.
+
+    :param rule_content: dictionary with content data for reported rule
+    :param error_key: reported error key
+    :return: dictionary with field names as keys and templates as values
+    """
+    return {
+        "resolution": get_resolution_template(rule_content, error_key),
+        "reason": get_reason_template(rule_content, error_key),
+        "description": get_description_template(rule_content, error_key),
+    }
+
+
+class ContentIndex:
+    """
+    Index of the content data by the reported module and error key.
+
+    The index is built once for all reports of a request, so each report is matched
+    with its rule content by a dictionary lookup. The templates of each error key
+    are resolved and compiled on their first use.
+    """
+
+    def __init__(self, content: list[Content]):
+        """
+        Builds the index of the rules.
+
+        :param content: list with content data for all rules
+        """
+        self.rules = {}
+        for rule in content:
+            # The first rule wins as in the linear search of get_rule_content
+            self.rules.setdefault(rule.plugin["python_module"], rule)
+        self._templates = {}
+
+    def get_rule_content(self, report: Report) -> Content:
+        """
+        Returns the content data of the reported rule.
+
+        :param report: dictionary with report details
+        :return: content data for reported rule
+        """
+        reported_module = get_reported_module(report)
+        try:
+            return self.rules[reported_module]
+        except KeyError:
+            msg = f"The rule content for '{reported_module}' has not been found."
+            raise RuleNotFoundError(msg) from None
+
+    def _compile_templates(self, rule_content: Content, module: str, error_key: str):
+        """
+        Compiles and stores the templates of the error key of the rule.
+        """
+        if error_key not in rule_content.error_keys:
+            msg = (
+                f"The content for error key '{error_key}' of rule '{module}' "
+                + "has not been found."
+            )
+            raise RuleNotFoundError(msg)
+
+        templates = {
+            field: compile_template(template_text) if template_text else None
+            for field, template_text in get_report_templates(
+                rule_content, error_key
+            ).items()
+        }
+        self._templates[(module, error_key)] = templates
+
+        timeout = TEMPLATE_TIMEOUTS.get(f"{module}|{error_key}")
+        if timeout is not None:
+            executor = get_js_executor()
+            for js_code in templates.values():
+                if js_code:
+                    executor.set_template_timeout(js_code, timeout)
+        return templates
+
+    def get_compiled_templates(self, report: Report) -> dict:
+        """
+        Returns the compiled templates of all rendered fields of the report.
+
+        :param report: dictionary with report details
+        :return: dictionary with field names as keys and JS code of the templates
+                 as values, None for the fields without template
+        """
+        module = get_reported_module(report)
+        error_key = get_reported_error_key(report)
+        templates = self._templates.get((module, error_key))
+        if templates is None:
+            templates = self._compile_templates(
+                self.get_rule_content(report), module, error_key
+            )
+        return templates
+
+    def get_js_codes(self):
+        """
+        Returns the JS code of the compiled templates rendered by the JS worker,
+        i.e. the templates without native implementation.
+
+        :return: list of JS code of the templates
+        """
+        return [
+            js_code
+            for templates in self._templates.values()
+            for js_code in templates.values()
+            if js_code and js_code not in native_template_cache
+        ]
+
+    def precompile(self):
+        """
+        Compiles the templates of all error keys of all rules in the index.
+
+        :return: number of compiled error keys
+        """
+        for module, rule_content in self.rules.items():
+            for error_key in rule_content.error_keys:
+                self._compile_templates(rule_content, module, error_key)
+        return len(self._templates)
+
+
 def render_report(content: list[Content], report: Report) -> RenderedReport:
     """
     Renders the given report.
@@ -212,59 +541,718 @@ def render_report(content: list[Content], report: Report) -> RenderedReport:
     :param report: dictionary with report details
     :return: rendered report
     """
+    rule = get_rule_content(content, report)
+    return RenderedReport(
+        rule_id=get_reported_module(report),
+        error_key=get_reported_error_key(report),
+        resolution=render_resolution(rule, report),
+        reason=render_reason(rule, report),
+        description=render_description(rule, report),
+    )
+
+
+def get_rendered_results(jobs, results):
+    """
+    Converts the results of the JS worker to the rendered strings.
+
+    :param jobs: list of (js_code, data) pairs
+    :param results: list of (status, result) pairs returned by the JS executor,
+                    None for the jobs not rendered before the deadline
+    :return: list of rendered strings in the order of the jobs, None for the jobs
+             not rendered and RENDERING_FAILED for the texts failing to unescape
+    """
+    rendered = []
+    for (js_code, _), job_result in zip(jobs, results, strict=True):
+        if job_result is None:
+            rendered.append(None)
+            continue
+        status, result = job_result
+        if status == "error":
+            log.error("Failed to execute template", extra={"js_code": js_code})
+            raise RuntimeError(f"JavaScript execution failed: {result}")
+        rendered.append(unescape_rendered_text(result, js_code))
+    return rendered
+
+
+def render_native_template(js_code, data):
+    """
+    Renders the template in-process if it is written in the safe subset of DoT.js.
+
+    :param js_code: JS code of the compiled template
+    :param data: data of the template
+    :return: rendered string, RENDERING_FAILED if its text cannot be unescaped or None
+             if the template must be rendered by the JS worker
+    """
+    template = native_template_cache.get(js_code)
+    if template is None:
+        return None
+    if template.is_static:
+        rendered_templates.labels("static").inc()
+        return unescape_rendered_text(template.static_value, js_code)
     try:
-        reported_module = get_reported_module(report)
-        reported_error_key = get_reported_error_key(report)
-    except ValueError as exception:
-        raise exception
+        rendered = unescape_rendered_text(template(data), js_code)
+    except UnsupportedTemplateError as exception:
+        log.debug("Template is rendered by the JS worker: %s", exception)
+        return None
+    rendered_templates.labels("native").inc()
+    return rendered
 
-    for rule in content:
-        if reported_module == rule.plugin["python_module"]:
-            report_result = RenderedReport(
-                rule_id=reported_module,
-                error_key=reported_error_key,
-                resolution=render_resolution(rule, report),
-                reason=render_reason(rule, report),
-                description=render_description(rule, report),
+
+def render_native_jobs(jobs):
+    """
+    Renders the jobs of the native templates in-process.
+
+    :param jobs: list of (js_code, data) pairs
+    :return: tuple with the list of rendered strings, None for the jobs not rendered
+             natively, and the list of indexes of the jobs for the JS worker
+    """
+    if TEMPLATE_ENGINE == "js":
+        return [None] * len(jobs), list(range(len(jobs)))
+
+    rendered = [render_native_template(js_code, data) for js_code, data in jobs]
+    if TEMPLATE_ENGINE == "verify":
+        return rendered, list(range(len(jobs)))
+    return rendered, [index for index, text in enumerate(rendered) if text is None]
+
+
+def get_details_digest(details):
+    """
+    Returns the digest of the canonical JSON representation of the report details.
+    The keys of the nested dictionaries are sorted, so equal details get the same
+    digest regardless of the order of their keys.
+
+    :param details: report details
+    :return: hexadecimal SHA-256 digest or None if the details are not serializable
+    """
+    try:
+        canonical = json.dumps(details, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def lookup_render_cache(jobs, js_indexes):
+    """
+    Looks up the strings rendered by the JS worker in the render cache.
+
+    :param jobs: list of (js_code, data) pairs
+    :param js_indexes: list of indexes of the jobs for the JS worker
+    :return: tuple with the list of indexes of the cached jobs, the list of their
+             cached strings, the list of indexes of the jobs still to be rendered
+             and the list of their cache keys (None if they cannot be cached)
+    """
+    if render_cache.maxbytes < 1:
+        return [], [], js_indexes, [None] * len(js_indexes)
+
+    cached_indexes, cached = [], []
+    missing_indexes, keys = [], []
+    # The fields of a report share the same details, they are digested once
+    details_digests = {}
+    for index in js_indexes:
+        js_code, data = jobs[index]
+        if id(data) not in details_digests:
+            details_digests[id(data)] = get_details_digest(data)
+        details_digest = details_digests[id(data)]
+        key = None
+        if details_digest is not None:
+            key = (get_code_digest(js_code), details_digest)
+            text = render_cache.get(key)
+            render_cache_lookups.labels("miss" if text is None else "hit").inc()
+            if text is not None:
+                cached_indexes.append(index)
+                cached.append(text)
+                continue
+        missing_indexes.append(index)
+        keys.append(key)
+    return cached_indexes, cached, missing_indexes, keys
+
+
+def store_render_cache(keys, js_rendered):
+    """
+    Stores the strings rendered by the JS worker in the render cache.
+
+    :param keys: list of cache keys returned by lookup_render_cache
+    :param js_rendered: list of strings rendered by the JS worker
+    """
+    if render_cache.maxbytes < 1:
+        return
+    for key, text in zip(keys, js_rendered, strict=True):
+        if key is not None and isinstance(text, str):
+            size = sys.getsizeof(text) + sum(sys.getsizeof(digest) for digest in key)
+            render_cache.put(key, text, size)
+    render_cache_bytes.set(render_cache.bytes)
+
+
+def merge_rendered(jobs, rendered, js_indexes, js_rendered):
+    """
+    Merges the results of the JS worker with the natively rendered strings.
+    The natively rendered strings differing from the JS results are logged.
+
+    :param jobs: list of (js_code, data) pairs
+    :param rendered: list of natively rendered strings returned by render_native_jobs
+    :param js_indexes: list of indexes of the jobs rendered by the JS worker
+    :param js_rendered: list of strings rendered by the JS worker, None for the jobs
+                        not rendered before the deadline
+    :return: list of rendered strings in the order of the jobs
+    """
+    for index, text in zip(js_indexes, js_rendered, strict=True):
+        if text is None:
+            continue
+        if rendered[index] is not None and rendered[index] != text:
+            log.warning(
+                "Native rendering differs from the JS worker",
+                extra={"js_code": jobs[index][0]},
             )
-            return report_result
+        rendered[index] = text
+    return rendered
 
-    msg = f"The rule content for '{reported_module}' has not been found."
-    raise RuleNotFoundError(msg)
 
+def split_jobs(jobs, concurrency=None, min_size=None):
+    """
+    Splits the jobs into batches of similar sizes rendered by the JS workers
+    in parallel. The jobs sharing the same data (the fields of a report) are kept
+    in one batch.
 
-def render_reports(request_data: RendererRequest) -> RendererResponse:
+    :param jobs: list of (js_code, data) pairs
+    :param concurrency: maximal number of batches (default: RENDER_CONCURRENCY)
+    :param min_size: minimal number of jobs in a batch (default: RENDER_BATCH_MIN_SIZE)
+    :return: list of the batches, the jobs of the batches are in the original order
     """
-    Renders all reports and returns dictionary with the rendered results.
+    if concurrency is None:
+        concurrency = RENDER_CONCURRENCY
+    if min_size is None:
+        min_size = RENDER_BATCH_MIN_SIZE
+    count = min(concurrency, len(jobs) // max(min_size, 1))
+    if count <= 1:
+        return [jobs]
 
-    :param request_data: dictionary retrieved from JSON body of the request
-    :return: rendered reports
+    batches = []
+    start = 0
+    for i in range(1, count):
+        end = max(round(i * len(jobs) / count), start)
+        while 0 < end < len(jobs) and jobs[end][1] is jobs[end - 1][1]:
+            end += 1
+        batches.append(jobs[start:end])
+        start = end
+    batches.append(jobs[start:])
+    return [batch for batch in batches if batch]
+
+
+def join_batch_results(batches, results):
     """
-    log.info("Loading content and report data")
+    Joins the results of the batches returned by execute_batches.
+
+    :return: list of (status, result) pairs in the order of the jobs, None for
+             the jobs of the batches not finished before the deadline
+    """
+    return [
+        result
+        for jobs, batch_results in zip(batches, results, strict=True)
+        for result in (
+            batch_results if batch_results is not None else [None] * len(jobs)
+        )
+    ]
+
+
+def execute_js_jobs(jobs, deadline=None):
+    """
+    Renders the jobs by the JS workers, split into parallel batches.
+
+    :param jobs: list of (js_code, data) pairs
+    :param deadline: value of time.monotonic after which the jobs not rendered yet
+                     are cancelled (default: no deadline)
+    :return: list of (status, result) pairs in the order of the jobs, None for
+             the cancelled jobs
+    """
+    batches = split_jobs(jobs)
+    if len(batches) == 1 and deadline is None:
+        return get_js_executor().execute_batch(jobs)
+    results = get_js_executor().execute_batches(batches, deadline=deadline)
+    return join_batch_results(batches, results)
+
+
+async def execute_js_jobs_async(jobs, deadline=None):
+    """
+    Renders the jobs by the JS workers, split into parallel batches, without
+    blocking the event loop.
+
+    :param jobs: list of (js_code, data) pairs
+    :param deadline: value of time.monotonic after which the jobs not rendered yet
+                     are cancelled (default: no deadline)
+    :return: list of (status, result) pairs in the order of the jobs, None for
+             the cancelled jobs
+    """
+    batches = split_jobs(jobs)
+    if len(batches) == 1 and deadline is None:
+        return await get_js_executor().execute_batch_async(jobs)
+    results = await get_js_executor().execute_batches_async(batches, deadline=deadline)
+    return join_batch_results(batches, results)
+
+
+def render_local_templates(jobs):
+    """
+    Renders the native templates in-process and takes the strings rendered by the
+    JS worker before from the render cache.
+
+    :param jobs: list of (js_code, data) pairs
+    :return: tuple with the list of rendered strings in the order of the jobs,
+             None for the templates left to the JS worker, the indexes of these
+             templates and their keys in the render cache
+    """
+    rendered, js_indexes = render_native_jobs(jobs)
+    cached_indexes, cached, js_indexes, keys = lookup_render_cache(jobs, js_indexes)
+    merge_rendered(jobs, rendered, cached_indexes, cached)
+    return rendered, js_indexes, keys
+
+
+def render_templates(jobs, deadline=None):
+    """
+    Renders the templates with their data, the native templates in-process and
+    the others by the JS workers in parallel batches, see split_jobs. The strings
+    rendered by the JS workers are cached if the render cache is enabled.
+
+    :param jobs: list of (js_code, data) pairs
+    :param deadline: value of time.monotonic after which the templates not rendered
+                     yet are cancelled (default: no deadline)
+    :return: list of rendered strings in the order of the jobs, None for the
+             cancelled templates and RENDERING_FAILED for the failed ones
+    """
+    rendered, js_indexes, keys = render_local_templates(jobs)
+    if not js_indexes:
+        return rendered
 
-    content = request_data.content
+    js_jobs = [jobs[index] for index in js_indexes]
+    rendered_templates.labels("js").inc(len(js_jobs))
+    try:
+        results = execute_js_jobs(js_jobs, deadline)
+    except TimeoutError:
+        log.error("Template execution timed out")
+        raise
+    js_rendered = get_rendered_results(js_jobs, results)
+    store_render_cache(keys, js_rendered)
+    return merge_rendered(jobs, rendered, js_indexes, js_rendered)
+
+
+async def render_templates_async(jobs, deadline=None):
+    """
+    Renders the templates with their data, the native templates in-process and
+    the others by the JS workers in parallel batches without blocking the event loop,
+    the native templates are rendered in a thread.
+    The strings rendered by the JS worker are cached if the render cache is enabled.
+
+    :param jobs: list of (js_code, data) pairs
+    :param deadline: value of time.monotonic after which the templates not rendered
+                     yet are cancelled (default: no deadline)
+    :return: list of rendered strings in the order of the jobs, None for the
+             cancelled templates and RENDERING_FAILED for the failed ones
+    """
+    rendered, js_indexes, keys = await asyncio.to_thread(render_local_templates, jobs)
+    if not js_indexes:
+        return rendered
+
+    js_jobs = [jobs[index] for index in js_indexes]
+    rendered_templates.labels("js").inc(len(js_jobs))
+    try:
+        results = await execute_js_jobs_async(js_jobs, deadline)
+    except TimeoutError:
+        log.error("Template execution timed out")
+        raise
+    js_rendered = get_rendered_results(js_jobs, results)
+    store_render_cache(keys, js_rendered)
+    return merge_rendered(jobs, rendered, js_indexes, js_rendered)
+
+
+def plan_reports(request_data: RendererRequest, content_index=None):
+    """
+    Finds the templates of all reports in the request.
+    The reports of unknown rules are skipped before any rendering starts.
+    The identical reports of different clusters share the same jobs and fields.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param content_index: index of the registered content referenced by the request
+                          (default: index of the content sent in the request)
+    :return: tuple with the list of planned (cluster_id, report, fields) tuples,
+             where fields map the field names to the indexes of their jobs,
+             and the list of (js_code, data) jobs
+    """
+    if content_index is None:
+        content_index = ContentIndex(request_data.content)
     report_data = request_data.report_data
-    result = RendererResponse(clusters=report_data.clusters, reports={})
 
     log.info("Iterating through the reports of each cluster")
 
+    planned_reports = []
+    jobs = []
+    unique_reports = {} if DEDUPLICATE_REPORTS else None
     for cluster_id, cluster_data in report_data.reports.items():
-        for report in cluster_data.reports:
-            try:
-                report_result = render_report(content, report)
-                result.reports.setdefault(cluster_id, []).append(report_result)
-            except (
-                ValueError,
-                RuleNotFoundError,
-                TemplateNotFoundError,
-            ) as exception:
-                log.debug(exception)
-                log.debug(
-                    "The report for rule '%s' and error key '%s' could not be processed.",
-                    get_reported_module(report),
-                    get_reported_error_key(report),
-                )
+        plan_cluster_reports(
+            content_index,
+            cluster_id,
+            cluster_data,
+            planned_reports,
+            jobs,
+            unique_reports,
+        )
+
+    if unique_reports is not None and planned_reports:
+        ratio = 1 - len(unique_reports) / len(planned_reports)
+        report_deduplication_ratio.observe(ratio)
+        log.info(
+            "Rendering %d unique of %d reports (deduplication ratio %.2f)",
+            len(unique_reports),
+            len(planned_reports),
+            ratio,
+        )
+    return planned_reports, jobs
+
+
+def get_report_key(report: Report):
+    """
+    Returns the key identifying the identical reports: the reported module,
+    the error key and the digest of the details.
+
+    :param report: dictionary with report details
+    :return: tuple or None if the details cannot be digested
+    """
+    details_digest = get_details_digest(report.details)
+    if details_digest is None:
+        return None
+    return get_reported_module(report), get_reported_error_key(report), details_digest
+
 
+def log_skipped_report(report):
+    """
+    Logs the report skipped because it could not be processed.
+    """
+    log.debug(
+        "The report for rule '%s' and error key '%s' could not be processed.",
+        get_reported_module(report),
+        get_reported_error_key(report),
+    )
+
+
+def plan_cluster_reports(
+    content_index,
+    cluster_id,
+    cluster_data,
+    planned_reports,
+    jobs,
+    unique_reports=None,
+):
+    """
+    Finds the templates of the reports of one cluster, see plan_reports.
+
+    :param content_index: index of the content
+    :param cluster_id: ID of the cluster
+    :param cluster_data: reports of the cluster
+    :param planned_reports: list the planned reports are appended to
+    :param jobs: list the (js_code, data) jobs are appended to
+    :param unique_reports: dictionary of the fields of the planned reports by their
+                           keys, the identical reports are planned with the fields
+                           of the first one without new jobs (default: no
+                           deduplication)
+    """
+    for report in cluster_data.reports:
+        key = None
+        if unique_reports is not None:
+            key = get_report_key(report)
+            fields = unique_reports.get(key)
+            if fields is not None:
+                planned_reports.append((cluster_id, report, fields))
+                continue
+
+        try:
+            templates = content_index.get_compiled_templates(report)
+        except (ValueError, RuleNotFoundError) as exception:
+            log.debug(exception)
+            log_skipped_report(report)
+            continue
+
+        # Index of the job rendering each field, None for fields without template
+        fields = {}
+        for field, js_code in templates.items():
+            if js_code:
+                fields[field] = len(jobs)
+                jobs.append((js_code, report.details))
+            else:
+                fields[field] = None
+        planned_reports.append((cluster_id, report, fields))
+        if key is not None:
+            unique_reports[key] = fields
+
+
+def is_rendering_failed(fields, rendered):
+    """
+    Checks whether any template of the report failed to render.
+
+    :param fields: indexes of the jobs of the fields, see plan_reports
+    :param rendered: list of rendered strings in the order of the jobs
+    :return: True if the report has to be skipped
+    """
+    return any(
+        job is not None and rendered[job] is RENDERING_FAILED for job in fields.values()
+    )
+
+
+def build_response_content(
+    request_data: RendererRequest, planned_reports, rendered, partial=False
+) -> dict:
+    """
+    Builds the response from the planned reports and their rendered templates
+    as plain dictionaries and lists, without validating them by the models.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param planned_reports: list of reports returned by plan_reports
+    :param rendered: list of rendered strings in the order of the jobs, None for
+                     the templates not rendered before the deadline
+    :param partial: list the reports with any template not rendered as unrendered
+                    instead of failing
+    :return: dictionary in the format of RendererResponse without the fields
+             set to None, the reports with any failed template are skipped
+    """
+    reports = {}
+    result = {"clusters": request_data.report_data.clusters, "reports": reports}
+    if partial:
+        result["unrendered"] = unrendered = []
+
+    # The identical reports share the fields and the rendered report,
+    # False marks the reports not rendered before the deadline
+    rendered_reports = {}
+    for cluster_id, report, fields in planned_reports:
+        rendered_report = rendered_reports.get(id(fields))
+        if rendered_report is None:
+            if is_rendering_failed(fields, rendered):
+                log_skipped_report(report)
+                rendered_report = RENDERING_FAILED
+            elif any(
+                job is not None and rendered[job] is None for job in fields.values()
+            ):
+                rendered_report = False
+            else:
+                rendered_report = get_rendered_report_content(report, fields, rendered)
+            rendered_reports[id(fields)] = rendered_report
+
+        if rendered_report is RENDERING_FAILED:
+            continue
+        if rendered_report is False:
+            unrendered.append(
+                {
+                    "cluster": cluster_id,
+                    "rule_id": get_reported_module(report),
+                    "error_key": get_reported_error_key(report),
+                }
+            )
+        else:
+            reports.setdefault(cluster_id, []).append(rendered_report)
+
+    if partial and unrendered:
+        unrendered_reports.inc(len(unrendered))
+        log.warning("%d reports were not rendered before the deadline", len(unrendered))
     log.info("The reports from the request have been processed")
 
     return result
+
+
+def build_response(
+    request_data: RendererRequest, planned_reports, rendered, partial=False
+) -> RendererResponse:
+    """
+    Builds the response model from the planned reports and their rendered templates,
+    see build_response_content.
+
+    :return: rendered reports
+    """
+    content = build_response_content(request_data, planned_reports, rendered, partial)
+    # The identical reports keep sharing the rendered report
+    models = {}
+    for reports in content["reports"].values():
+        for index, rendered_report in enumerate(reports):
+            model = models.get(id(rendered_report))
+            if model is None:
+                model = models[id(rendered_report)] = RenderedReport(**rendered_report)
+            reports[index] = model
+    return RendererResponse.parse_obj(content)
+
+
+def get_deadline(request_data: RendererRequest, deadline=None):
+    """
+    Returns the deadline of the request: the earlier of the given deadline and
+    the timeout of the request counted from now.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param deadline: value of time.monotonic or None
+    :return: value of time.monotonic or None if the request has no deadline
+    """
+    if request_data.timeout is not None:
+        timeout_deadline = time.monotonic() + request_data.timeout
+        deadline = (
+            timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+        )
+    return deadline
+
+
+def get_rendered_report_content(report, fields, rendered) -> dict:
+    """
+    Builds the rendered report from its rendered templates as a plain dictionary.
+
+    :param report: the report
+    :param fields: indexes of the jobs of the fields, see plan_reports
+    :param rendered: list of rendered strings in the order of the jobs
+    :return: dictionary in the format of RenderedReport
+    """
+    content = {
+        "rule_id": get_reported_module(report),
+        "error_key": get_reported_error_key(report),
+    }
+    for field, job in fields.items():
+        content[field] = "" if job is None else rendered[job]
+    return content
+
+
+def build_rendered_report(report, fields, rendered) -> RenderedReport:
+    """
+    Builds the rendered report from its rendered templates.
+
+    :param report: the report
+    :param fields: indexes of the jobs of the fields, see plan_reports
+    :param rendered: list of rendered strings in the order of the jobs
+    :return: rendered report
+    """
+    return RenderedReport(**get_rendered_report_content(report, fields, rendered))
+
+
+def render_reports(
+    request_data: RendererRequest, content_index=None, deadline=None
+) -> RendererResponse:
+    """
+    Renders all reports and returns dictionary with the rendered results.
+
+    The templates of the request are rendered by up to RENDER_CONCURRENCY JS workers
+    in parallel and the rendered reports keep the order of the request.
+
+    With a deadline (or the timeout of the request), the templates not rendered
+    by then are cancelled and their reports are listed as unrendered.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param content_index: index of the registered content referenced by the request
+    :param deadline: value of time.monotonic after which the rendering is stopped
+                     (default: the timeout of the request or no deadline)
+    :return: rendered reports
+    """
+    log.info("Loading content and report data")
+
+    deadline = get_deadline(request_data, deadline)
+    planned_reports, jobs = plan_reports(request_data, content_index)
+    rendered = render_templates(jobs, deadline)
+    return build_response(
+        request_data, planned_reports, rendered, partial=deadline is not None
+    )
+
+
+async def render_response_content_async(
+    request_data: RendererRequest, content_index=None, deadline=None
+) -> dict:
+    """
+    Renders all reports and returns the rendered results as plain dictionaries,
+    see build_response_content. The event loop is not blocked while the reports
+    are planned, rendered and built, see render_templates_async.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param content_index: index of the registered content referenced by the request
+    :param deadline: value of time.monotonic after which the rendering is stopped
+                     (default: the timeout of the request or no deadline),
+                     see render_reports
+    :return: dictionary with the rendered reports
+    """
+    log.info("Loading content and report data")
+
+    deadline = get_deadline(request_data, deadline)
+    planned_reports, jobs = await asyncio.to_thread(
+        plan_reports, request_data, content_index
+    )
+    rendered = await render_templates_async(jobs, deadline)
+    return await asyncio.to_thread(
+        build_response_content,
+        request_data,
+        planned_reports,
+        rendered,
+        partial=deadline is not None,
+    )
+
+
+async def render_reports_async(
+    request_data: RendererRequest, content_index=None, deadline=None
+) -> RendererResponse:
+    """
+    Renders all reports and returns dictionary with the rendered results.
+    The event loop is not blocked while the reports are rendered and validated.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param content_index: index of the registered content referenced by the request
+    :param deadline: value of time.monotonic after which the rendering is stopped
+                     (default: the timeout of the request or no deadline),
+                     see render_reports
+    :return: rendered reports
+    """
+    content = await render_response_content_async(request_data, content_index, deadline)
+    return await asyncio.to_thread(RendererResponse.parse_obj, content)
+
+
+async def render_cluster_async(
+    content_index, cluster_id, cluster_data
+) -> RenderedCluster:
+    """
+    Renders the reports of one cluster.
+
+    :param content_index: index of the content
+    :param cluster_id: ID of the cluster
+    :param cluster_data: reports of the cluster
+    :return: rendered reports of the cluster
+    """
+    planned_reports, jobs = [], []
+    plan_cluster_reports(content_index, cluster_id, cluster_data, planned_reports, jobs)
+    rendered = await render_templates_async(jobs)
+    return RenderedCluster(
+        cluster=cluster_id,
+        reports=[
+            build_rendered_report(report, fields, rendered)
+            for _, report, fields in planned_reports
+            if not is_rendering_failed(fields, rendered)
+        ],
+    )
+
+
+async def render_reports_stream(request_data: RendererRequest, content_index=None):
+    """
+    Renders the reports cluster by cluster and yields the rendered reports of each
+    cluster as soon as they are done, so only the reports of two clusters are held
+    in memory at once.
+
+    The next cluster is rendered while the rendered reports of the previous one are
+    being sent.
+
+    :param request_data: dictionary retrieved from JSON body of the request
+    :param content_index: index of the registered content referenced by the request
+    :return: async generator of the rendered reports of each cluster
+    """
+    if content_index is None:
+        content_index = ContentIndex(request_data.content)
+
+    log.info("Streaming the rendered reports of each cluster")
+
+    pending = []
+    try:
+        for cluster_id, cluster_data in request_data.report_data.reports.items():
+            pending.append(
+                asyncio.ensure_future(
+                    render_cluster_async(content_index, cluster_id, cluster_data)
+                )
+            )
+            if len(pending) > 1:
+                yield await pending.pop(0)
+        while pending:
+            yield await pending.pop(0)
+    finally:
+        # The client has disconnected or the rendering of a cluster has failed
+        for task in pending:
+            task.cancel()
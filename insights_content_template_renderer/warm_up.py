@@ -0,0 +1,55 @@
+"""
+Prepares the service for the first requests when the application starts.
+
+Without the warm-up, the first request pays for the spawn of the JS workers,
+the import of PythonMonkey and the compilation of its templates, and it can
+easily exceed the template timeout after a deployment.
+"""
+
+import logging
+import os
+
+from insights_content_template_renderer.bundle import install_bundle, load_bundle
+from insights_content_template_renderer.data import request_data_example
+from insights_content_template_renderer.js_executor import get_js_executor
+from insights_content_template_renderer.models import RendererRequest
+from insights_content_template_renderer.registry import content_registry, load_content
+from insights_content_template_renderer.utils import render_reports
+
+log = logging.getLogger(__name__)
+
+# Start the JS workers and render the example request when the application starts
+WARM_UP_ON_STARTUP = os.environ.get("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+# File or directory with the content registered and compiled on the startup
+PRELOAD_CONTENT_PATH = os.environ.get("PRELOAD_CONTENT_PATH", "")
+
+# Bundle of the templates compiled offline, see insights_content_template_renderer.bundle
+TEMPLATE_BUNDLE_PATH = os.environ.get("TEMPLATE_BUNDLE_PATH", "")
+
+
+def warm_up(content_path=PRELOAD_CONTENT_PATH, bundle_path=TEMPLATE_BUNDLE_PATH):
+    """
+    Installs the template bundle, registers the preloaded content, starts the JS
+    workers with their templates evaluated and renders the example request.
+
+    :param content_path: file or directory with the content to be preloaded,
+                         nothing is preloaded if it is empty
+    :param bundle_path: file with the template bundle, nothing is installed
+                        if it is empty
+    :return: version of the preloaded content or None
+    """
+    version = None
+    js_codes = []
+    if bundle_path:
+        # Installed first, so the preloaded content is not compiled by doT
+        js_codes = install_bundle(load_bundle(bundle_path))
+    if content_path:
+        version, content_index = content_registry.register(load_content(content_path))
+        js_codes += content_index.get_js_codes()
+        log.info("Preloaded content version %s from %s", version, content_path)
+
+    get_js_executor().warm_up(js_codes)
+    render_reports(RendererRequest.parse_obj(request_data_example))
+    log.info("Warm-up finished")
+    return version
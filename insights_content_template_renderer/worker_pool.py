@@ -0,0 +1,430 @@
+"""
+Process pool with a separate task queue for each worker process.
+
+Unlike multiprocessing.Pool, the pool knows which worker runs each task. Tasks are
+dispatched to the least loaded worker, so the workers can keep per-process state
+(like the cache of evaluated JS functions) that the parent process can rely on.
+The number of workers can grow up to the configured maximum when the queues get
+long and shrink back when the additional workers are idle.
+
+A worker which exits unexpectedly is detected as soon as its result pipe is closed,
+or a worker running a hung task can be killed by cancelling the task. In both cases
+only the task running in the worker fails, the tasks queued behind it are dispatched
+to other workers and the worker is replaced. The IDs of the cancelled queued tasks
+are sent to the worker by a separate pipe, so the worker skips them.
+"""
+
+import contextlib
+import itertools
+import logging
+import multiprocessing as mp
+import pickle
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from insights_content_template_renderer.metrics import (
+    js_ipc_payload_bytes,
+    js_worker_spawns,
+)
+
+log = logging.getLogger(__name__)
+
+
+class WorkerExitedError(RuntimeError):
+    """
+    Exception raised for the tasks of a worker process that has exited unexpectedly.
+    """
+
+
+def _worker_main(task_queue, result_conn, cancel_conn):
+    """
+    Main loop of the worker process.
+
+    Runs the tasks from the queue one by one and sends their results back to the
+    parent process until it receives None. The cancelled tasks are skipped.
+
+    :param task_queue: queue with (task_id, pickled (func, args) tuple) tuples
+    :param result_conn: connection for sending (task_id, success, value) tuples
+    :param cancel_conn: connection receiving the IDs of the cancelled tasks
+    """
+    cancelled = set()
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, payload = task
+        while cancel_conn.poll():
+            cancelled.add(cancel_conn.recv())
+        if cancelled:
+            # The IDs of the tasks increase in the order of the queue, so the lower
+            # ones cannot come any more
+            skipped = task_id in cancelled
+            cancelled = {other_id for other_id in cancelled if other_id > task_id}
+            if skipped:
+                continue
+        func, args = pickle.loads(payload)
+        try:
+            result_conn.send((task_id, True, func(*args)))
+        except Exception as exc:
+            result_conn.send((task_id, False, exc))
+    result_conn.close()
+
+
+def resolve_future(future, success, value):
+    """
+    Sets the result or the exception of the future unless it was cancelled.
+    """
+    try:
+        if success:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+    except InvalidStateError:
+        pass
+
+
+class PoolWorker:
+    """
+    Worker process of the pool with its own task queue.
+    """
+
+    def __init__(self, ctx, index):
+        """
+        Spawn the worker process.
+
+        :param ctx: multiprocessing context used to create the process
+        :param index: sequence number of the worker used in its name
+        """
+        self.index = index
+        self.task_queue = ctx.Queue()
+        self.result_conn, child_conn = ctx.Pipe(duplex=False)
+        child_cancel_conn, self.cancel_conn = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.task_queue, child_conn, child_cancel_conn),
+            name=f"Worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        # Only the worker writes results, closing the parent's copy of the write end
+        # makes the reads fail as soon as the worker exits
+        child_conn.close()
+        child_cancel_conn.close()
+        # (future, func, args) of the tasks sent to the worker by their IDs,
+        # in the order of sending, so the first one is the running task
+        self.pending = {}
+        self.last_active = time.monotonic()
+        self.retiring = False
+        self.killed = False
+
+    @property
+    def load(self):
+        """Number of tasks queued or running in the worker."""
+        return len(self.pending)
+
+    @property
+    def pid(self):
+        """Process ID of the worker."""
+        return self.process.pid
+
+
+class WorkerPool:
+    """
+    Pool of spawned worker processes with least-loaded dispatch.
+
+    The pool starts with `size` workers. If `max_size` is greater than `size`,
+    another worker is spawned when the least loaded worker has at least
+    `scale_up_queue_depth` queued tasks, and the additional workers are stopped
+    after being idle for `idle_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        size=1,
+        max_size=None,
+        scale_up_queue_depth=2,
+        idle_timeout=60,
+        context="spawn",
+    ):
+        """
+        Initialize the pool and spawn its minimal number of workers.
+
+        :param size: minimal number of worker processes
+        :param max_size: maximal number of worker processes (default: size)
+        :param scale_up_queue_depth: queue depth of the least loaded worker
+                                     triggering a spawn of another worker
+        :param idle_timeout: seconds after which an idle additional worker is stopped
+        :param context: multiprocessing start method
+        """
+        self.size = max(size, 1)
+        self.max_size = max(max_size or self.size, self.size)
+        self.scale_up_queue_depth = scale_up_queue_depth
+        self.idle_timeout = idle_timeout
+        self._ctx = mp.get_context(context)
+        self._lock = threading.RLock()
+        self._workers = []
+        self._readers = []
+        self._indexes = itertools.count(1)
+        self._task_ids = itertools.count()
+        self._running = True
+
+        with self._lock:
+            for _ in range(self.size):
+                self._spawn_worker()
+
+    @property
+    def workers(self):
+        """List of the active workers."""
+        with self._lock:
+            return list(self._workers)
+
+    @property
+    def queue_depth(self):
+        """Number of tasks queued or running in all workers."""
+        with self._lock:
+            return sum(worker.load for worker in self._workers)
+
+    def _spawn_worker(self):
+        worker = PoolWorker(self._ctx, next(self._indexes))
+        reader = threading.Thread(
+            target=self._read_results,
+            args=(worker,),
+            name=f"WorkerReader-{worker.index}",
+            daemon=True,
+        )
+        self._workers.append(worker)
+        self._readers.append(reader)
+        reader.start()
+        js_worker_spawns.inc()
+        log.info("Spawned JavaScript worker process %s", worker.pid)
+        return worker
+
+    def _retire_worker(self, worker):
+        worker.retiring = True
+        self._workers.remove(worker)
+        worker.task_queue.put(None)
+
+    def _scale(self):
+        """
+        Spawns the minimal number of workers and stops the idle additional ones.
+        """
+        while len(self._workers) < self.size:
+            self._spawn_worker()
+
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if len(self._workers) <= self.size:
+                break
+            if worker.load == 0 and now - worker.last_active > self.idle_timeout:
+                self._retire_worker(worker)
+                log.info("Stopping idle JavaScript worker process %s", worker.pid)
+
+    def retire_worker(self, worker):
+        """
+        Stop dispatching tasks to the worker and let it exit after finishing
+        the queued ones. A new worker is spawned instead of it when needed.
+
+        :param worker: worker to be stopped
+        :return: True if the worker was active
+        """
+        with self._lock:
+            if worker not in self._workers:
+                return False
+            self._retire_worker(worker)
+            return True
+
+    def select_worker(self):
+        """
+        Returns the least loaded worker, spawning another one if all are busy
+        and the pool has not reached its maximal size.
+
+        :return: the selected worker
+        """
+        with self._lock:
+            if not self._running:
+                raise ValueError("Pool not running")
+            self._scale()
+            worker = min(self._workers, key=lambda worker: worker.load)
+            if (
+                worker.load >= self.scale_up_queue_depth
+                and len(self._workers) < self.max_size
+            ):
+                worker = self._spawn_worker()
+            return worker
+
+    def submit(self, func, args=(), worker=None):
+        """
+        Queue the function call in a worker process.
+
+        :param func: function to be called in the worker, it must be picklable
+        :param args: arguments of the function
+        :param worker: worker running the task (default: the least loaded worker)
+        :return: future with the result of the function, its worker attribute is
+                 the worker the task has been dispatched to (another one than
+                 the given worker if that one has been stopped in the meantime)
+        """
+        future = Future()
+        self._dispatch(future, func, args, worker)
+        return future
+
+    def _dispatch(self, future, func, args, worker=None):
+        # The task is pickled here instead of in the feeder thread of the queue,
+        # so its size is known and the pickling errors are raised to the caller.
+        # The queue pickles only the bytes then. The pickling does not hold the lock,
+        # so the other threads can dispatch their tasks meanwhile.
+        payload = pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if not self._running:
+                raise ValueError("Pool not running")
+            if future.done():
+                # The task has been cancelled before it was dispatched again
+                return
+            if worker is None or worker not in self._workers:
+                worker = self.select_worker()
+            # The IDs increase in the order of each worker queue, see _worker_main
+            task_id = next(self._task_ids)
+            future.worker = worker
+            worker.pending[task_id] = (future, func, args)
+            worker.last_active = time.monotonic()
+            worker.task_queue.put((task_id, payload))
+        js_ipc_payload_bytes.labels("task").observe(len(payload))
+
+    def cancel_task(self, future, exception):
+        """
+        Fail the task with the exception. A queued task is dropped and its worker
+        skips it, a running task is stopped by killing its worker. The other tasks
+        queued in the killed worker are dispatched to other workers and the worker
+        is replaced.
+
+        :param future: future returned by submit
+        :param exception: exception set as the result of the task
+        :return: True if the worker running the task has been killed
+        """
+        killed_worker = None
+        with self._lock:
+            for worker in self._workers:
+                for position, (task_id, task) in enumerate(worker.pending.items()):
+                    if task[0] is future:
+                        del worker.pending[task_id]
+                        if position == 0:
+                            killed_worker = worker
+                        else:
+                            with contextlib.suppress(OSError):
+                                worker.cancel_conn.send(task_id)
+                        break
+                else:
+                    continue
+                break
+            if killed_worker is not None:
+                # No task is dispatched to the worker any more
+                killed_worker.killed = True
+                self._workers.remove(killed_worker)
+            # The task queued in a killed worker is not dispatched again once
+            # its future is resolved
+            resolve_future(future, False, exception)
+
+        if killed_worker is not None:
+            log.warning(
+                "Killing JavaScript worker process %s running a hung task",
+                killed_worker.pid,
+            )
+            killed_worker.process.kill()
+        return killed_worker is not None
+
+    def _read_results(self, worker):
+        """
+        Resolves the futures of the worker's tasks until the worker exits.
+        """
+        while True:
+            try:
+                result = worker.result_conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            js_ipc_payload_bytes.labels("result").observe(len(result))
+            task_id, success, value = pickle.loads(result)
+            with self._lock:
+                task = worker.pending.pop(task_id, None)
+                worker.last_active = time.monotonic()
+            if task is not None:
+                resolve_future(task[0], success, value)
+
+        worker.process.join()
+        worker.result_conn.close()
+        worker.task_queue.close()
+        worker.cancel_conn.close()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            pending = list(worker.pending.values())
+            worker.pending.clear()
+            running = self._running
+
+        exitcode = worker.process.exitcode
+        if not worker.killed and (pending or (running and not worker.retiring)):
+            log.error(
+                "JavaScript worker process %s exited with code %s", worker.pid, exitcode
+            )
+        if pending and not worker.killed:
+            # The running task has most likely made the worker exit
+            future, _, _ = pending.pop(0)
+            resolve_future(
+                future,
+                False,
+                WorkerExitedError(
+                    f"JavaScript worker process exited with code {exitcode}"
+                ),
+            )
+        # The workers are spawned again when dispatching the tasks
+        for future, func, args in pending:
+            try:
+                self._dispatch(future, func, args)
+            except ValueError:
+                # The pool has been closed or terminated
+                resolve_future(
+                    future,
+                    False,
+                    WorkerExitedError(
+                        f"JavaScript worker process exited with code {exitcode}"
+                    ),
+                )
+
+        with self._lock:
+            self._readers.remove(threading.current_thread())
+
+    def close(self):
+        """
+        Stop accepting new tasks and let the workers exit after finishing
+        the queued ones.
+        """
+        with self._lock:
+            self._running = False
+            for worker in self._workers:
+                worker.retiring = True
+                worker.task_queue.put(None)
+
+    def join(self):
+        """
+        Wait for the worker processes to exit. Must be called after close or terminate.
+        """
+        # The readers remove themselves when their workers exit, the workers spawned
+        # for the redispatched tasks add new ones
+        while True:
+            with self._lock:
+                readers = [reader for reader in self._readers if reader.is_alive()]
+            if not readers:
+                return
+            for reader in readers:
+                reader.join()
+
+    def terminate(self):
+        """
+        Stop the worker processes immediately, failing their pending tasks.
+        """
+        with self._lock:
+            self._running = False
+            workers = list(self._workers)
+        for worker in workers:
+            worker.task_queue.cancel_join_thread()
+            worker.process.terminate()
+        self.join()